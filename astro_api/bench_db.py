@@ -0,0 +1,123 @@
+"""Synthetic benchmark of the hot API queries at growing table sizes.
+
+    python -m astro_api.bench_db --sizes 10000 100000 1000000
+
+Fills a throwaway database with N profiles/charts (plus chat messages and
+jobs), then times each hot query. With the indexes from migration 5 the
+per-query latency should stay flat as N grows; drop them with --no-indexes
+to see the full-scan baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, Dict
+
+from astro_api import db
+
+BATCH = 50_000
+INDEXES = (
+    "idx_profiles_lookup",
+    "idx_charts_profile_created",
+    "idx_charts_created",
+    "idx_chat_messages_chart",
+    "idx_jobs_chart_kind",
+    "idx_jobs_status",
+)
+
+
+def _fill(conn, start: int, stop: int) -> None:
+    base = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for batch_start in range(start, stop, BATCH):
+        ids = range(batch_start + 1, min(stop, batch_start + BATCH) + 1)
+        conn.executemany(
+            "INSERT INTO profiles (id, telegram_user_id, birth_date, birth_time, time_unknown, place_query, lat, lng, tz_str) "
+            "VALUES (?, ?, ?, '12:00:00', 0, ?, 55.75, 37.61, 'Europe/Moscow')",
+            ((i, i % 200_000, f"19{i % 100:02d}-01-01", f"City {i % 5000}") for i in ids),
+        )
+        conn.executemany(
+            "INSERT INTO charts (id, profile_id, chart_json, summary, created_at) VALUES (?, ?, '{}', 'summary', ?)",
+            ((i, i, (base + timedelta(seconds=i)).isoformat()) for i in ids),
+        )
+        conn.executemany(
+            "INSERT INTO chat_messages (chart_id, question, answer, created_at) VALUES (?, 'q', 'a', '')",
+            ((i,) for i in ids if i % 10 == 0),
+        )
+        conn.executemany(
+            "INSERT INTO jobs (kind, chart_id, status, created_at, updated_at) VALUES ('insights', ?, 'done', '', '')",
+            ((i,) for i in ids if i % 10 == 0),
+        )
+        conn.commit()
+
+
+def _queries(n: int) -> Dict[str, Callable]:
+    def pick() -> int:
+        return random.randint(1, n)
+
+    return {
+        "find_profile": lambda c: db.find_profile(
+            c,
+            telegram_user_id=(i := pick()) % 200_000,
+            birth_date=f"19{i % 100:02d}-01-01",
+            birth_time="12:00:00",
+            time_unknown=False,
+            place_query=f"City {i % 5000}",
+            lat=55.75,
+            lng=37.61,
+            tz_str="Europe/Moscow",
+        ),
+        "get_latest_chart_for_profile": lambda c: db.get_latest_chart_for_profile(c, pick()),
+        "list_recent_charts": lambda c: db.list_recent_charts(c, 3),
+        "list_chat_messages": lambda c: db.list_chat_messages(c, chart_id=pick() // 10 * 10),
+        "list_jobs_for_chart": lambda c: db.list_jobs_for_chart(c, pick() // 10 * 10),
+    }
+
+
+def _measure(conn, query: Callable, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        query(conn)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark hot API queries on synthetic data")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=200, help="runs per query (median is reported)")
+    parser.add_argument("--no-indexes", action="store_true", help="drop the indexes to see the baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DB_PATH = Path(tmp) / "bench.db"
+        conn = db.get_connection()
+        db.init_db(conn)
+        if args.no_indexes:
+            for index in INDEXES:
+                conn.execute(f"DROP INDEX IF EXISTS {index}")
+        filled = 0
+        results: Dict[str, list] = {}
+        for size in sorted(args.sizes):
+            _fill(conn, filled, size)
+            filled = size
+            conn.execute("ANALYZE")
+            for name, query in _queries(size).items():
+                results.setdefault(name, []).append(_measure(conn, query, args.repeat))
+        conn.close()
+
+    sizes = sorted(args.sizes)
+    print(f"{'query':32}" + "".join(f"{size:>14,}" for size in sizes))
+    for name, timings in results.items():
+        print(f"{name:32}" + "".join(f"{ms:>12.3f}ms" for ms in timings))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,172 @@
+"""Content-addressed cache of natal chart computations shared across users.
+
+The key depends only on what the ephemeris sees (UTC instant, rounded
+coordinates, timezone, house system, active points, kerykeion version), so two
+users with the same birth moment and place share one computation. Entries are
+stored without user-specific parts (name, place label, entered date/time) and
+are personalized on every hit.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from importlib import metadata
+from threading import Lock
+from typing import Optional
+
+from astro_api import config, db
+from astro_bot import natal_engine, timezones
+
+KEY_VERSION = 1
+COORD_PRECISION = 4
+CONTEXT_TITLE = 'Chart for "{name}"'
+
+_memory: "OrderedDict[str, _Entry]" = OrderedDict()
+_memory_lock = Lock()
+
+
+@dataclass
+class _Entry:
+    payload: dict
+    summary_body: str
+    context_body: str
+
+
+@dataclass
+class CachedChart:
+    payload: dict
+    summary: str
+    context_text: str
+
+
+def _kerykeion_version() -> str:
+    try:
+        return metadata.version("kerykeion")
+    except metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def cache_key(birth_date: dt.date, birth_time: Optional[dt.time], location: natal_engine.LocationResult) -> str:
+    """Canonical hash of the ephemeris inputs."""
+    # build_subject uses 12:00 local time when birth time is unknown
+    local = dt.datetime.combine(birth_date, birth_time or dt.time(12, 0))
+    canonical = {
+        "v": KEY_VERSION,
+        "utc": timezones.to_utc(location.tz_str, local).replace(second=0, microsecond=0).isoformat(),
+        "lat": round(location.lat, COORD_PRECISION),
+        "lng": round(location.lng, COORD_PRECISION),
+        "tz": location.tz_str,
+        "houses": natal_engine.HOUSES_SYSTEM_IDENTIFIER,
+        "points": list(natal_engine.ACTIVE_POINTS),
+        "kerykeion": _kerykeion_version(),
+    }
+    raw = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, entry: _Entry) -> None:
+    maxsize = config.get_chart_cache_size()
+    if maxsize <= 0:
+        return
+    with _memory_lock:
+        _memory[key] = entry
+        _memory.move_to_end(key)
+        while len(_memory) > maxsize:
+            _memory.popitem(last=False)
+
+
+def _personalize(
+    entry: _Entry,
+    *,
+    name: str,
+    location: natal_engine.LocationResult,
+    birth_date: dt.date,
+    birth_time: Optional[dt.time],
+) -> CachedChart:
+    payload = dict(entry.payload)
+    payload["subject"] = {**entry.payload["subject"], "name": name}
+    # aspects name their owner too; the stored ones carry the first caller's identifier
+    payload["aspects"] = [
+        {**aspect, "p1_owner": name, "p2_owner": name} if isinstance(aspect, dict) else aspect
+        for aspect in entry.payload.get("aspects") or []
+    ]
+    payload["location"] = {
+        "display_name": location.display_name,
+        "lat": location.lat,
+        "lng": location.lng,
+        "tz_str": location.tz_str,
+    }
+    payload["birth_date"] = birth_date.isoformat()
+    payload["birth_time"] = birth_time.isoformat() if birth_time else None
+    return CachedChart(
+        payload=payload,
+        summary=natal_engine.build_summary_header(location, birth_date, birth_time) + entry.summary_body,
+        context_text=CONTEXT_TITLE.format(name=name) + entry.context_body,
+    )
+
+
+def get(
+    conn,
+    key: str,
+    *,
+    name: str,
+    location: natal_engine.LocationResult,
+    birth_date: dt.date,
+    birth_time: Optional[dt.time],
+) -> Optional[CachedChart]:
+    """Return a personalized cached chart (memory first, then SQLite) or None."""
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+    if entry is None:
+        row = db.get_cached_chart(conn, key)
+        if not row:
+            return None
+        entry = _Entry(
+            payload=json.loads(row["payload_json"]),
+            summary_body=row["summary_body"],
+            context_body=row["context_body"],
+        )
+        _remember(key, entry)
+    return _personalize(entry, name=name, location=location, birth_date=birth_date, birth_time=birth_time)
+
+
+def put(
+    conn,
+    key: str,
+    chart: natal_engine.NatalChart,
+    *,
+    name: str,
+    location: natal_engine.LocationResult,
+    birth_date: dt.date,
+    birth_time: Optional[dt.time],
+) -> None:
+    """Store a freshly computed chart; silently skips if its texts have an unexpected shape."""
+    header = natal_engine.build_summary_header(location, birth_date, birth_time)
+    title = CONTEXT_TITLE.format(name=name)
+    if not chart.summary.startswith(header) or not chart.context_text.startswith(title):
+        return
+    entry = _Entry(
+        payload=chart.payload,
+        summary_body=chart.summary[len(header):],
+        context_body=chart.context_text[len(title):],
+    )
+    db.upsert_cached_chart(
+        conn,
+        key=key,
+        payload_json=json.dumps(entry.payload, ensure_ascii=False),
+        summary_body=entry.summary_body,
+        context_body=entry.context_body,
+    )
+    _remember(key, entry)
+
+
+def clear_memory() -> None:
+    """Drop the in-memory tier (SQLite tier is kept)."""
+    with _memory_lock:
+        _memory.clear()
@@ -0,0 +1,440 @@
+"""Compact storage format for charts.chart_json and compatibility_runs.synastry_json.
+
+A stored value is `MAGIC + version byte + zlib(msgpack(record))`. The record
+keeps per point its name, absolute longitude, house, retrograde flag, speed
+and declination (sign, degree in sign, quality, element and emoji are derived
+from the longitude); the subject's other fields as they are; per
+aspect the two points, aspect, orbit, exact degrees, diff and movement; for a
+synastry the projected house of every point and cusp in house_comparison.
+Decoders expand a record back to the pydantic-dump shape the API has always
+returned, so decoded subjects still validate as AstrologicalSubjectModel.
+
+Rows written before this format (plain JSON text) are still read as is;
+`python -m astro_api.chart_store` converts them in place (and fills
+chart_positions for charts stored before that table existed).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import sqlite3
+import zlib
+from typing import Any, List, Optional, Tuple
+
+import msgpack
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"ACS"
+FORMAT_VERSION = 1
+COMPRESS_LEVEL = 6
+# angles are stored as integer micro-degrees: exact to 0.0036", and ints pack and compress well
+ANGLE_SCALE = 1_000_000
+
+SIGNS = ("Ari", "Tau", "Gem", "Can", "Leo", "Vir", "Lib", "Sco", "Sag", "Cap", "Aqu", "Pis")
+QUALITIES = ("Cardinal", "Fixed", "Mutable")
+ELEMENTS = ("Fire", "Earth", "Air", "Water")
+SIGN_EMOJIS = ("♈️", "♉️", "♊️", "♋️", "♌️", "♍️", "♎️", "♏️", "♐️", "♑️", "♒️", "♓️")
+HOUSES = (
+    "First_House",
+    "Second_House",
+    "Third_House",
+    "Fourth_House",
+    "Fifth_House",
+    "Sixth_House",
+    "Seventh_House",
+    "Eighth_House",
+    "Ninth_House",
+    "Tenth_House",
+    "Eleventh_House",
+    "Twelfth_House",
+)
+
+# subject-level scalars worth keeping (the rest is derivable or unused)
+SUBJECT_FIELDS = (
+    "name",
+    "lat",
+    "lng",
+    "tz_str",
+    "iso_formatted_local_datetime",
+    "iso_formatted_utc_datetime",
+    "julian_day",
+    "year",
+    "month",
+    "day",
+    "hour",
+    "minute",
+    "zodiac_type",
+    "houses_system_identifier",
+    "houses_system_name",
+)
+
+
+class ChartFormatError(ValueError):
+    """Stored value is neither JSON nor a known compact record."""
+
+
+def is_compact(value: Any) -> bool:
+    return isinstance(value, (bytes, bytearray, memoryview)) and bytes(value[: len(MAGIC)]) == MAGIC
+
+
+def _pack(record: dict) -> bytes:
+    raw = msgpack.packb(record, use_bin_type=True)
+    return MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(raw, COMPRESS_LEVEL)
+
+
+def _unpack(value) -> dict:
+    value = bytes(value)
+    version = value[len(MAGIC)]
+    if version != FORMAT_VERSION:
+        raise ChartFormatError(f"unsupported chart format version {version}")
+    return msgpack.unpackb(zlib.decompress(value[len(MAGIC) + 1:]), raw=False)
+
+
+def _angle(value: Optional[float]) -> Optional[int]:
+    return None if value is None else round(float(value) * ANGLE_SCALE)
+
+
+def _degrees(value: Optional[int]) -> Optional[float]:
+    return None if value is None else value / ANGLE_SCALE
+
+
+def _is_point(value: Any) -> bool:
+    return isinstance(value, dict) and "abs_pos" in value and "name" in value
+
+
+def _encode_subject(subject: dict) -> dict:
+    points = []
+    extra = {}
+    for key, value in subject.items():
+        if not _is_point(value):
+            if isinstance(value, dict) and "name" in value:
+                raise ChartFormatError(f"point {key} has no abs_pos")
+            if key not in SUBJECT_FIELDS and key != "lunar_phase":
+                extra[key] = value
+            continue
+        if key != value["name"].lower():
+            raise ChartFormatError(f"unexpected point key {key}")
+        points.append(
+            [
+                value["name"],
+                _angle(value["abs_pos"]),
+                value.get("house"),
+                value.get("retrograde"),
+                _angle(value.get("speed")),
+                _angle(value.get("declination")),
+            ]
+        )
+    if not points:
+        raise ChartFormatError("subject has no points")
+    return {
+        "f": [subject.get(field) for field in SUBJECT_FIELDS],
+        "p": points,
+        "lp": subject.get("lunar_phase"),
+        "x": extra,
+    }
+
+
+def _expand_point(
+    name: str,
+    abs_pos: float,
+    house: Optional[str],
+    retrograde: Optional[bool],
+    speed: Optional[float] = None,
+    declination: Optional[float] = None,
+) -> dict:
+    sign_num = int(abs_pos // 30) % 12
+    return {
+        "name": name,
+        "quality": QUALITIES[sign_num % 3],
+        "element": ELEMENTS[sign_num % 4],
+        "sign": SIGNS[sign_num],
+        "sign_num": sign_num,
+        "position": abs_pos - sign_num * 30,
+        "abs_pos": abs_pos,
+        "emoji": SIGN_EMOJIS[sign_num],
+        "point_type": "House" if name.endswith("_House") else "AstrologicalPoint",
+        "house": house,
+        "retrograde": retrograde,
+        "speed": speed,
+        "declination": declination,
+    }
+
+
+def _decode_subject(record: dict) -> dict:
+    subject = dict(zip(SUBJECT_FIELDS, record["f"]))
+    subject.update(record.get("x") or {})
+    # records written before speed/declination were kept have 4 columns per point
+    for name, abs_pos, house, retrograde, *motion in record["p"]:
+        speed, declination = (motion + [None, None])[:2]
+        subject[name.lower()] = _expand_point(
+            name, _degrees(abs_pos), house, retrograde, _degrees(speed), _degrees(declination)
+        )
+    if record.get("lp") is not None:
+        subject["lunar_phase"] = record["lp"]
+    return subject
+
+
+def _encode_aspects(aspects: list) -> list:
+    return [
+        [
+            a["p1_name"],
+            a["p2_name"],
+            a["aspect"],
+            _angle(a["orbit"]),
+            a.get("aspect_degrees"),
+            _angle(a.get("diff")),
+            a.get("aspect_movement"),
+        ]
+        for a in aspects
+    ]
+
+
+def _decode_aspects(rows: list, first: dict, second: dict) -> list:
+    aspects = []
+    for p1, p2, aspect, orbit, degrees, diff, movement in rows:
+        point1 = first.get(p1.lower()) or {}
+        point2 = second.get(p2.lower()) or {}
+        aspects.append(
+            {
+                "p1_name": p1,
+                "p1_owner": first.get("name"),
+                "p1_abs_pos": point1.get("abs_pos"),
+                "p2_name": p2,
+                "p2_owner": second.get("name"),
+                "p2_abs_pos": point2.get("abs_pos"),
+                "aspect": aspect,
+                "orbit": _degrees(orbit),
+                "aspect_degrees": degrees,
+                "diff": _degrees(diff),
+                "aspect_movement": movement,
+            }
+        )
+    return aspects
+
+
+def encode_chart(payload: dict) -> bytes:
+    """Natal payload (build_chart_payload shape) -> compact bytes."""
+    location = payload.get("location") or {}
+    return _pack(
+        {
+            "k": "natal",
+            "s": _encode_subject(payload["subject"]),
+            "a": _encode_aspects(payload.get("aspects") or []),
+            "loc": [location.get("display_name"), location.get("lat"), location.get("lng"), location.get("tz_str")],
+            "bd": payload.get("birth_date"),
+            "bt": payload.get("birth_time"),
+        }
+    )
+
+
+def decode_chart(value) -> Optional[dict]:
+    """Stored charts.chart_json (compact bytes or legacy JSON text) -> API payload dict."""
+    if value is None or value == "":
+        return None
+    if not is_compact(value):
+        return json.loads(value) if isinstance(value, (str, bytes)) else value
+    record = _unpack(value)
+    subject = _decode_subject(record["s"])
+    display_name, lat, lng, tz_str = record["loc"]
+    return {
+        "subject": subject,
+        "aspects": _decode_aspects(record["a"], subject, subject),
+        "location": {"display_name": display_name, "lat": lat, "lng": lng, "tz_str": tz_str},
+        "birth_date": record["bd"],
+        "birth_time": record["bt"],
+    }
+
+
+def chart_positions(payload: Optional[dict]) -> List[tuple]:
+    """Rows for the chart_positions table: (point, sign, abs_pos, house number, retrograde).
+
+    Houses are left NULL when the birth time is unknown (they were computed for noon).
+    """
+    subject = (payload or {}).get("subject") or {}
+    time_known = bool((payload or {}).get("birth_time"))
+    rows = []
+    for value in subject.values():
+        if not isinstance(value, dict) or not value.get("name") or not value.get("sign"):
+            continue
+        house = value.get("house")
+        house_num = HOUSES.index(house) + 1 if time_known and house in HOUSES else None
+        retrograde = value.get("retrograde")
+        rows.append(
+            (value["name"], value["sign"], value.get("abs_pos"), house_num, None if retrograde is None else int(retrograde))
+        )
+    return rows
+
+
+# house_comparison lists: (key, owner of the points, owner of the houses they fall in)
+HOUSE_COMPARISON_LISTS = (
+    ("first_points_in_second_houses", "first_subject", "second_subject"),
+    ("second_points_in_first_houses", "second_subject", "first_subject"),
+    ("first_cusps_in_second_houses", "first_subject", "second_subject"),
+    ("second_cusps_in_first_houses", "second_subject", "first_subject"),
+)
+
+
+def _encode_house_comparison(comparison: Optional[dict]) -> Optional[list]:
+    """Per list: point, owner and projected house number and name; degree, sign and names come from the subjects."""
+    if not comparison:
+        return None
+    return [
+        [
+            [
+                item["point_name"],
+                item.get("point_owner_house_number"),
+                item.get("point_owner_house_name"),
+                item.get("projected_house_number"),
+                item.get("projected_house_name"),
+            ]
+            for item in comparison.get(key) or []
+        ]
+        for key, _, _ in HOUSE_COMPARISON_LISTS
+    ]
+
+
+def _decode_house_comparison(rows: Optional[list], subjects: dict) -> Optional[dict]:
+    if rows is None:
+        return None
+    comparison = {
+        "first_subject_name": subjects["first_subject"].get("name"),
+        "second_subject_name": subjects["second_subject"].get("name"),
+    }
+    for (key, owner, projected), items in zip(HOUSE_COMPARISON_LISTS, rows):
+        owner_subject = subjects[owner]
+        comparison[key] = []
+        for point_name, owner_house, owner_house_name, projected_house, projected_house_name in items:
+            point = owner_subject.get(point_name.lower()) or {}
+            comparison[key].append(
+                {
+                    "point_name": point_name,
+                    "point_degree": point.get("position"),
+                    "point_sign": point.get("sign"),
+                    "point_owner_name": owner_subject.get("name"),
+                    "point_owner_house_number": owner_house,
+                    "point_owner_house_name": owner_house_name,
+                    "projected_house_number": projected_house,
+                    "projected_house_name": projected_house_name,
+                    "projected_house_owner_name": subjects[projected].get("name"),
+                }
+            )
+    return comparison
+
+
+def encode_synastry(synastry: dict) -> bytes:
+    """Synastry dict (first/second subject, aspects, house_comparison, overlays) -> compact bytes."""
+    return _pack(
+        {
+            "k": "synastry",
+            "s1": _encode_subject(synastry["first_subject"]),
+            "s2": _encode_subject(synastry["second_subject"]),
+            "a": _encode_aspects(synastry.get("aspects") or []),
+            "hc": _encode_house_comparison(synastry.get("house_comparison")),
+            "ov": synastry.get("overlays"),
+        }
+    )
+
+
+def decode_synastry(value) -> Optional[dict]:
+    """Stored compatibility_runs.synastry_json -> dict in the stored-JSON shape."""
+    if value is None or value == "":
+        return None
+    if not is_compact(value):
+        return json.loads(value) if isinstance(value, (str, bytes)) else value
+    record = _unpack(value)
+    first = _decode_subject(record["s1"])
+    second = _decode_subject(record["s2"])
+    return {
+        "first_subject": first,
+        "second_subject": second,
+        "aspects": _decode_aspects(record["a"], first, second),
+        "house_comparison": _decode_house_comparison(
+            record.get("hc"), {"first_subject": first, "second_subject": second}
+        ),
+        "overlays": record.get("ov"),
+    }
+
+
+def _as_text(value, decode, decoded: Optional[dict]) -> Optional[str]:
+    if value is None or value == "":
+        return None
+    if not is_compact(value):
+        return bytes(value).decode("utf-8") if isinstance(value, (bytes, bytearray, memoryview)) else value
+    return json.dumps(decode(value) if decoded is None else decoded, ensure_ascii=False)
+
+
+def chart_text(value, decoded: Optional[dict] = None) -> Optional[str]:
+    """Stored charts.chart_json -> the JSON text GET /api/natal/{id} has always returned.
+
+    Legacy rows are returned as stored; pass `decoded` to skip decoding a compact row twice.
+    """
+    return _as_text(value, decode_chart, decoded)
+
+
+def synastry_text(value, decoded: Optional[dict] = None) -> Optional[str]:
+    """Stored compatibility_runs.synastry_json -> the JSON text GET /api/compatibility/{id} has always returned."""
+    return _as_text(value, decode_synastry, decoded)
+
+
+def _convert(conn: sqlite3.Connection, table: str, column: str, encode, batch_size: int) -> Tuple[int, int]:
+    converted = skipped = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f"SELECT id, {column} FROM {table} WHERE id > ? AND typeof({column}) = 'text' ORDER BY id LIMIT ?",
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return converted, skipped
+        updates = []
+        for row_id, raw in rows:
+            last_id = row_id
+            try:
+                updates.append((encode(json.loads(raw)), row_id))
+            except (ValueError, KeyError, TypeError) as exc:
+                skipped += 1
+                logger.warning("%s.%s id=%s left as JSON: %s", table, column, row_id, exc)
+        conn.executemany(f"UPDATE {table} SET {column} = ? WHERE id = ?", updates)
+        conn.commit()
+        converted += len(updates)
+
+
+def migrate_rows(conn: sqlite3.Connection, batch_size: int = 500) -> dict:
+    """Convert legacy JSON rows to the compact format; rows that don't fit the schema are kept."""
+    charts = _convert(conn, "charts", "chart_json", encode_chart, batch_size)
+    synastry = _convert(conn, "compatibility_runs", "synastry_json", encode_synastry, batch_size)
+    return {
+        "charts_converted": charts[0],
+        "charts_skipped": charts[1],
+        "synastry_converted": synastry[0],
+        "synastry_skipped": synastry[1],
+    }
+
+
+def main() -> int:
+    from astro_api import db  # pylint: disable=import-outside-toplevel
+
+    parser = argparse.ArgumentParser(
+        description="Convert stored charts/synastry JSON to the compact format and backfill chart_positions"
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM afterwards to return freed pages to the OS")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    conn = db.get_connection()
+    db.init_db(conn)
+    counts = migrate_rows(conn, args.batch_size)
+    counts["positions_backfilled"] = db.backfill_chart_positions(conn, args.batch_size)
+    print(json.dumps(counts))
+    if args.vacuum:
+        conn.execute("VACUUM")
+    conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
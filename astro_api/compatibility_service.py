@@ -6,15 +6,8 @@ import json
 from pathlib import Path
 from typing import Optional
 
-from kerykeion import ChartDataFactory, ChartDrawer
-
-from astro_api import db, config
-from astro_bot import natal_engine
-
-
-def resolve_location(conn, query: str) -> natal_engine.LocationResult:
-    """Reuse natal_service resolve logic (with cache)."""
-    return natal_engine.resolve_location(query, conn)
+from astro_api import chart_store, db, config, execution
+from astro_bot import geocoder, natal_engine, wheel_janitor, wheel_store
 
 
 def build_top_aspects(aspects, limit: int = 20, key_limit: int = 5):
@@ -61,7 +54,85 @@ def build_house_overlays(house_comparison):
     return overlays
 
 
-def calculate_compatibility(
+def compute_synastry(
+    self_name: str,
+    self_date,
+    self_time,
+    self_loc: natal_engine.LocationResult,
+    partner_date,
+    partner_time,
+    partner_loc: natal_engine.LocationResult,
+    charts_dir: Path,
+):
+    """Build both subjects, synastry data and wheel; runs in a chart_engine worker."""
+    from kerykeion import ChartDataFactory
+
+    self_subject = natal_engine.build_subject(
+        name=self_name,
+        birth_date=self_date,
+        birth_time=self_time,
+        location=self_loc,
+    )
+    partner_subject = natal_engine.build_subject(
+        name="partner",
+        birth_date=partner_date,
+        birth_time=partner_time,
+        location=partner_loc,
+    )
+    synastry_data = ChartDataFactory.create_synastry_chart_data(
+        self_subject,
+        partner_subject,
+        include_house_comparison=True,
+        include_relationship_score=True,
+    )
+    return synastry_data, draw_synastry(synastry_data, charts_dir)
+
+
+def synastry_wheel_key(first, second) -> str:
+    """Content key of a synastry wheel; subject names are drawn, so they are part of it."""
+    return wheel_store.wheel_key(
+        "synastry",
+        wheel_store.subject_key(first, with_name=True),
+        wheel_store.subject_key(second, with_name=True),
+    )
+
+
+def draw_synastry(synastry_data, charts_dir: Path) -> Path:
+    """Render the synastry wheel into the wheel store, skipping it if already drawn."""
+    from kerykeion import ChartDrawer
+
+    return wheel_store.ensure_svg(
+        charts_dir,
+        synastry_wheel_key(synastry_data.first_subject, synastry_data.second_subject),
+        lambda: ChartDrawer(chart_data=synastry_data, theme=wheel_store.THEME),
+    )
+
+
+def synastry_data_from_json(synastry: dict):
+    """Rebuild synastry chart data from stored subjects (no ephemeris calls)."""
+    from kerykeion import ChartDataFactory
+    from kerykeion.schemas.kr_models import AstrologicalSubjectModel
+
+    first = AstrologicalSubjectModel.model_validate(synastry["first_subject"])
+    second = AstrologicalSubjectModel.model_validate(synastry["second_subject"])
+    return ChartDataFactory.create_synastry_chart_data(
+        first,
+        second,
+        include_house_comparison=True,
+        include_relationship_score=True,
+    )
+
+
+def render_synastry_svg(synastry: dict, charts_dir: Path) -> Path:
+    """Re-render a stored synastry wheel; runs in a chart_engine worker."""
+    key = synastry_wheel_key(synastry["first_subject"], synastry["second_subject"])
+    existing = wheel_store.wheel_path(charts_dir, key)
+    if existing.exists():
+        return existing
+    return draw_synastry(synastry_data_from_json(synastry), charts_dir)
+
+
+async def calculate_compatibility(
     *,
     conn,
     user_id: Optional[str],
@@ -73,9 +144,8 @@ def calculate_compatibility(
     partner_place: str,
     charts_dir: Optional[Path] = None,
 ) -> dict:
-    charts_dir = charts_dir or (config.get_webapp_dist_dir().parent / "charts")
-    charts_dir.mkdir(parents=True, exist_ok=True)
-    natal_engine.cleanup_old_svgs(charts_dir)
+    """Geocode both places, compute the synastry and store it (blocking steps on execution stages)."""
+    charts_dir = charts_dir or config.get_charts_dir()
 
     # Parse inputs
     self_date = natal_engine.parse_birth_date(self_birth_date)
@@ -83,34 +153,59 @@ def calculate_compatibility(
     partner_date = natal_engine.parse_birth_date(partner_birth_date)
     partner_time = natal_engine.parse_birth_time(partner_birth_time)
 
-    self_loc = natal_engine.resolve_location(self_place, conn)
-    partner_loc = natal_engine.resolve_location(partner_place, conn)
-
-    # Build subjects under lock (Swiss Ephemeris is global)
-    with natal_engine.natal_lock:
-        self_subject = natal_engine.build_subject(
-            name=user_id or "self",
-            birth_date=self_date,
-            birth_time=self_time,
-            location=self_loc,
-        )
-        partner_subject = natal_engine.build_subject(
-            name="partner",
-            birth_date=partner_date,
-            birth_time=partner_time,
-            location=partner_loc,
-        )
-        synastry_data = ChartDataFactory.create_synastry_chart_data(
-            self_subject,
-            partner_subject,
-            include_house_comparison=True,
-            include_relationship_score=True,
-        )
-        drawer = ChartDrawer(chart_data=synastry_data)
-        filename = f"compat_{self_subject.julian_day}_{partner_subject.julian_day}"
-        drawer.save_svg(charts_dir, filename=filename)
-        svg_path = charts_dir / f"{filename}.svg"
+    await execution.db.run(_prepare_charts_dir, charts_dir)
+    self_loc = await execution.geo.run(geocoder.resolve, conn, self_place)
+    partner_loc = await execution.geo.run(geocoder.resolve, conn, partner_place)
+
+    # Each chart_engine worker has its own Swiss Ephemeris state
+    synastry_data, svg_path = await execution.chart.run(
+        compute_synastry,
+        user_id or "self",
+        self_date,
+        self_time,
+        self_loc,
+        partner_date,
+        partner_time,
+        partner_loc,
+        charts_dir,
+    )
+    return await execution.db.run(
+        _save_compatibility,
+        conn,
+        user_id=user_id,
+        self_date=self_date,
+        self_time=self_time,
+        self_place=self_place,
+        self_loc=self_loc,
+        partner_date=partner_date,
+        partner_time=partner_time,
+        partner_place=partner_place,
+        partner_loc=partner_loc,
+        synastry_data=synastry_data,
+        svg_path=svg_path,
+    )
+
+
+def _prepare_charts_dir(charts_dir: Path) -> None:
+    charts_dir.mkdir(parents=True, exist_ok=True)
+
 
+def _save_compatibility(
+    conn,
+    *,
+    user_id: Optional[str],
+    self_date,
+    self_time,
+    self_place: str,
+    self_loc: natal_engine.LocationResult,
+    partner_date,
+    partner_time,
+    partner_place: str,
+    partner_loc: natal_engine.LocationResult,
+    synastry_data,
+    svg_path: Path,
+) -> dict:
+    """Store both profiles and the compatibility run; returns the API result."""
     top_aspects, key_aspects = build_top_aspects(synastry_data.aspects)
     overlays = build_house_overlays(synastry_data.house_comparison)
     score = None
@@ -121,6 +216,19 @@ def calculate_compatibility(
             "description": getattr(rs, "score_description", None),
         }
 
+    self_profile_id = db.insert_profile(
+        conn,
+        telegram_user_id=int(user_id) if user_id and user_id.isdigit() else None,
+        label="Я",
+        birth_date=self_date.isoformat(),
+        birth_time=self_time.isoformat() if self_time else None,
+        time_unknown=self_time is None,
+        place_query=self_place,
+        lat=self_loc.lat,
+        lng=self_loc.lng,
+        tz_str=self_loc.tz_str,
+    )
+
     # Partner profile
     partner_profile_id = db.insert_profile(
         conn,
@@ -135,13 +243,14 @@ def calculate_compatibility(
         tz_str=partner_loc.tz_str,
     )
 
-    synastry_json = json.dumps(
+    synastry_json = chart_store.encode_synastry(
         {
+            "first_subject": synastry_data.first_subject.model_dump(),
+            "second_subject": synastry_data.second_subject.model_dump(),
             "aspects": [a.model_dump() for a in synastry_data.aspects],
             "house_comparison": synastry_data.house_comparison.model_dump() if synastry_data.house_comparison else None,
             "overlays": overlays,
-        },
-        ensure_ascii=False,
+        }
     )
     score_json = json.dumps(score, ensure_ascii=False) if score else None
     top_aspects_json = json.dumps({"top": top_aspects, "key": key_aspects}, ensure_ascii=False)
@@ -149,13 +258,14 @@ def calculate_compatibility(
     comp_id = db.insert_compatibility(
         conn,
         user_id=user_id,
-        self_profile_id=None,
+        self_profile_id=self_profile_id,
         partner_profile_id=partner_profile_id,
         synastry_json=synastry_json,
         score_json=score_json,
         top_aspects_json=top_aspects_json,
         wheel_path=str(svg_path),
     )
+    wheel_janitor.track(conn, svg_path)
 
     return {
         "id": comp_id,
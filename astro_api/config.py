@@ -29,6 +29,11 @@ def get_webapp_dist_dir() -> Path:
     return get_repo_root() / "webapp" / "dist"
 
 
+def get_charts_dir() -> Path:
+    """Directory for rendered wheel SVGs (next to webapp/dist)."""
+    return get_webapp_dist_dir().parent / "charts"
+
+
 def get_static_root_fallback() -> Path:
     """Fallback location for temporary HTML when dist is missing."""
     return get_repo_root()
@@ -69,3 +74,54 @@ def get_init_data_max_age_seconds() -> int:
         return int(raw)
     except ValueError:
         return 86400
+
+
+def get_chart_cache_size() -> int:
+    """How many computed charts to keep in the in-memory LRU. Default: 512."""
+    raw = os.getenv("CHART_CACHE_SIZE")
+    if raw is None:
+        return 512
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return 512
+
+
+def _get_int(env_name: str, default: int, minimum: int = 0) -> int:
+    raw = os.getenv(env_name)
+    if raw is None:
+        return default
+    try:
+        return max(minimum, int(raw))
+    except ValueError:
+        return default
+
+
+def get_db_pool_size() -> int:
+    """How many idle SQLite connections the API keeps. Default: 8."""
+    return _get_int("DB_POOL_SIZE", 8, minimum=1)
+
+
+def get_db_mmap_size() -> int:
+    """SQLite mmap_size in bytes (0 disables memory-mapped I/O). Default: 256 MiB."""
+    return _get_int("DB_MMAP_SIZE", 256 * 1024 * 1024)
+
+
+def get_db_cache_size_kib() -> int:
+    """SQLite page cache per connection, KiB. Default: 16 MiB."""
+    return _get_int("DB_CACHE_SIZE_KIB", 16 * 1024, minimum=1)
+
+
+def get_job_lease_seconds() -> float:
+    """How long a claimed background job stays leased without renewal. Default: 60 s."""
+    return float(_get_int("JOB_LEASE_SECONDS", 60, minimum=3))
+
+
+def get_stage_workers(stage: str, default: int) -> int:
+    """Concurrent calls of an execution stage (API_<STAGE>_WORKERS), see astro_api.execution."""
+    return _get_int(f"API_{stage.upper()}_WORKERS", default, minimum=1)
+
+
+def get_stage_queue(stage: str, default: int) -> int:
+    """Calls allowed to wait for a stage worker before 503 (API_<STAGE>_QUEUE)."""
+    return _get_int(f"API_{stage.upper()}_QUEUE", default)
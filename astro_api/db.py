@@ -3,10 +3,16 @@
 from __future__ import annotations
 
 import sqlite3
+import time
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from pathlib import Path
+from queue import Empty, Full, LifoQueue
+from threading import Lock
+from typing import AsyncIterator, Iterable, Iterator, Optional
 
-from astro_api import config
+from astro_api import chart_store, config
+from astro_bot import geocoder, migrations, wheel_janitor
 
 
 DB_PATH = config.get_repo_root() / "data" / "astroglass.db"
@@ -16,16 +22,116 @@ def ensure_data_dir() -> None:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
 
 
-def get_connection() -> sqlite3.Connection:
-    """Get SQLite connection (thread-safe for our usage)."""
-    ensure_data_dir()
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+BUSY_TIMEOUT_SECONDS = 5.0
+
+
+def _configure(conn: sqlite3.Connection) -> None:
+    # WAL: readers don't wait for the writer; NORMAL is durable enough in WAL mode
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA mmap_size={config.get_db_mmap_size()}")
+    conn.execute(f"PRAGMA cache_size=-{config.get_db_cache_size_kib()}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+
+
+def get_connection(path: Optional[Path] = None) -> sqlite3.Connection:
+    """Get SQLite connection to path (default: DB_PATH); thread-safe for our usage."""
+    path = path or DB_PATH
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT_SECONDS)
     conn.row_factory = sqlite3.Row
+    _configure(conn)
     return conn
 
 
-def init_db(conn: sqlite3.Connection) -> None:
-    """Create tables if missing."""
+class ConnectionPool:
+    """Idle SQLite connections to `path` reused across requests.
+
+    `size` bounds the idle connections kept after release, not the open ones:
+    the pool never blocks, and if all connections are busy a new one is
+    opened. There is deliberately no cap on open connections - acquiring
+    happens on the event loop (the get_db dependency), where waiting for a
+    free connection would stall every request. Concurrency is bounded by the
+    callers instead: the execution `db` stage, the job workers and the
+    request limit of the server. The schema is initialized once, when the
+    pool is created.
+    """
+
+    def __init__(self, path: Path, size: int):
+        self.path = path
+        self.size = size
+        self._idle: "LifoQueue[sqlite3.Connection]" = LifoQueue(maxsize=size)
+        conn = get_connection(path)
+        init_db(conn)
+        self._release(conn)
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except Empty:
+            return get_connection(self.path)
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except Full:
+            conn.close()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except Empty:
+                return
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = Lock()
+
+
+def open_pool() -> ConnectionPool:
+    """Create the pool (lifespan); also used lazily, and reopened if DB_PATH changed."""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DB_PATH:
+            if _pool is not None:
+                _pool.close()
+            _pool = ConnectionPool(DB_PATH, config.get_db_pool_size())
+        return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+def get_pool() -> ConnectionPool:
+    pool = _pool
+    if pool is None or pool.path != DB_PATH:
+        pool = open_pool()
+    return pool
+
+
+async def get_db() -> AsyncIterator[sqlite3.Connection]:
+    """FastAPI dependency: a pooled connection for the duration of the request."""
+    with get_pool().connection() as conn:
+        yield conn
+
+
+def _create_base_tables(conn: sqlite3.Connection) -> None:
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS users (
@@ -95,27 +201,13 @@ def init_db(conn: sqlite3.Connection) -> None:
         );
         """
     )
-    conn.commit()
-    _migrate_schema(conn)
-
-
-def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
-    rows = conn.execute(f"PRAGMA table_info({table})").fetchall()
-    return any(row[1].lower() == column.lower() for row in rows)
-
-
-def _migrate_schema(conn: sqlite3.Connection) -> None:
-    """Lightweight migrations for existing installs."""
-    # charts.summary
-    if not _column_exists(conn, "charts", "summary"):
-        conn.execute("ALTER TABLE charts ADD COLUMN summary TEXT;")
-    # charts.created_at
-    if not _column_exists(conn, "charts", "created_at"):
-        conn.execute("ALTER TABLE charts ADD COLUMN created_at TEXT;")
-    # charts.llm_summary
-    if not _column_exists(conn, "charts", "llm_summary"):
-        conn.execute("ALTER TABLE charts ADD COLUMN llm_summary TEXT;")
-    # compatibility_runs
+
+
+def _add_legacy_chart_columns(conn: sqlite3.Connection) -> None:
+    # installs created before these columns existed
+    for column in ("summary", "created_at", "llm_summary"):
+        if not migrations.column_exists(conn, "charts", column):
+            conn.execute(f"ALTER TABLE charts ADD COLUMN {column} TEXT;")
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS compatibility_runs (
@@ -131,7 +223,103 @@ def _migrate_schema(conn: sqlite3.Connection) -> None:
         );
         """
     )
-    conn.commit()
+
+
+def _create_chart_cache(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chart_cache (
+            key TEXT PRIMARY KEY,
+            payload_json TEXT NOT NULL,
+            summary_body TEXT NOT NULL,
+            context_body TEXT NOT NULL,
+            created_at TEXT
+        );
+        """
+    )
+
+
+def _create_jobs(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            chart_id INTEGER,
+            payload_json TEXT,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at TEXT,
+            updated_at TEXT,
+            FOREIGN KEY(chart_id) REFERENCES charts(id)
+        );
+        """
+    )
+
+
+def _create_indexes(conn: sqlite3.Connection) -> None:
+    # find_profile: the leading columns are selective enough, the rest is filtered in the row
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_profiles_lookup "
+        "ON profiles(telegram_user_id, birth_date, birth_time, place_query)"
+    )
+    # get_latest_chart_for_profile
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_charts_profile_created ON charts(profile_id, created_at)")
+    # list_recent_charts
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_charts_created ON charts(created_at)")
+    # list_chat_messages
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chat_messages_chart ON chat_messages(chart_id, id)")
+    # list_jobs_for_chart / claim_next_job
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_chart_kind ON jobs(chart_id, kind)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, id)")
+
+
+def _create_chart_positions(conn: sqlite3.Connection) -> None:
+    # one row per chart point; filled by insert_chart, old charts by backfill_chart_positions
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS chart_positions (
+            chart_id INTEGER NOT NULL,
+            point TEXT NOT NULL,
+            sign TEXT NOT NULL,
+            abs_pos REAL,
+            house INTEGER,
+            retrograde INTEGER,
+            PRIMARY KEY (chart_id, point),
+            FOREIGN KEY(chart_id) REFERENCES charts(id) ON DELETE CASCADE
+        ) WITHOUT ROWID;
+        """
+    )
+    # "Sun in Aries" / sign distribution of a point (the index also covers house)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chart_positions_sign ON chart_positions(point, sign, house)")
+    # "Moon in the 7th house" / house distribution of a point
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_chart_positions_house ON chart_positions(point, house)")
+
+
+def _add_job_leases(conn: sqlite3.Connection) -> None:
+    # a running job belongs to the worker holding an unexpired lease; see claim_next_job
+    conn.execute("ALTER TABLE jobs ADD COLUMN lease_owner TEXT")
+    conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+
+
+MIGRATIONS = [
+    migrations.Migration(1, "base tables", _create_base_tables),
+    migrations.Migration(2, "charts columns, compatibility_runs", _add_legacy_chart_columns),
+    migrations.Migration(3, "chart_cache", _create_chart_cache),
+    migrations.Migration(4, "jobs", _create_jobs),
+    migrations.Migration(5, "indexes for hot queries", _create_indexes),
+    migrations.Migration(6, "chart_positions", _create_chart_positions),
+    migrations.Migration(7, "geocoder places and aliases (replaces geo_cache)", geocoder.create_tables),
+    migrations.Migration(8, "wheel_files for the SVG janitor", wheel_janitor.create_tables),
+    migrations.Migration(9, "job leases", _add_job_leases),
+]
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Bring the schema up to date (run once at startup, never per request)."""
+    migrations.migrate(conn, MIGRATIONS)
 
 
 def upsert_user(conn: sqlite3.Connection, user: dict) -> None:
@@ -165,37 +353,31 @@ def upsert_user(conn: sqlite3.Connection, user: dict) -> None:
     conn.commit()
 
 
-def get_cached_location(conn: sqlite3.Connection, query: str):
-    """Get cached geo result."""
+def get_cached_chart(conn: sqlite3.Connection, key: str):
+    """Get content-addressed chart computation."""
     return conn.execute(
-        "SELECT query, lat, lng, tz_str, display_name FROM geo_cache WHERE query = ?",
-        (query,),
+        "SELECT key, payload_json, summary_body, context_body FROM chart_cache WHERE key = ?",
+        (key,),
     ).fetchone()
 
 
-def upsert_cached_location(
+def upsert_cached_chart(
     conn: sqlite3.Connection,
     *,
-    query: str,
-    lat: float,
-    lng: float,
-    tz_str: str,
-    display_name: str,
+    key: str,
+    payload_json: str,
+    summary_body: str,
+    context_body: str,
 ) -> None:
-    """Upsert geo result."""
+    """Store chart computation by its content key."""
     now = datetime.now(timezone.utc).isoformat()
     conn.execute(
         """
-        INSERT INTO geo_cache (query, lat, lng, tz_str, display_name, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-        ON CONFLICT(query) DO UPDATE SET
-            lat=excluded.lat,
-            lng=excluded.lng,
-            tz_str=excluded.tz_str,
-            display_name=excluded.display_name,
-            updated_at=excluded.updated_at
+        INSERT INTO chart_cache (key, payload_json, summary_body, context_body, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(key) DO NOTHING
         """,
-        (query, lat, lng, tz_str, display_name, now),
+        (key, payload_json, summary_body, context_body, now),
     )
     conn.commit()
 
@@ -245,11 +427,13 @@ def insert_chart(
     conn: sqlite3.Connection,
     *,
     profile_id: int,
-    chart_json: str,
-    wheel_path: str,
+    chart_json: str | bytes,
+    wheel_path: str | None,
     summary: str | None,
     llm_summary: str | None = None,
+    positions: Iterable[tuple] = (),
 ) -> int:
+    """Insert a chart and its chart_positions rows (see chart_store.chart_positions) in one transaction."""
     now = datetime.now(timezone.utc).isoformat()
     cur = conn.execute(
         """
@@ -258,17 +442,65 @@ def insert_chart(
         """,
         (profile_id, chart_json, wheel_path, summary, llm_summary, now),
     )
+    _insert_positions(conn, cur.lastrowid, positions)
     conn.commit()
     return cur.lastrowid
 
 
+def _insert_positions(conn: sqlite3.Connection, chart_id: int, positions: Iterable[tuple]) -> None:
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO chart_positions (chart_id, point, sign, abs_pos, house, retrograde)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        ((chart_id, *position) for position in positions),
+    )
+
+
+def backfill_chart_positions(conn: sqlite3.Connection, batch_size: int = 500) -> int:
+    """Fill chart_positions for charts stored before the table existed; returns charts processed."""
+    done = 0
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            """
+            SELECT id, chart_json FROM charts c
+            WHERE id > ? AND NOT EXISTS (SELECT 1 FROM chart_positions p WHERE p.chart_id = c.id)
+            ORDER BY id LIMIT ?
+            """,
+            (last_id, batch_size),
+        ).fetchall()
+        if not rows:
+            return done
+        for row in rows:
+            last_id = row["id"]
+            try:
+                payload = chart_store.decode_chart(row["chart_json"])
+            except ValueError:
+                continue
+            _insert_positions(conn, row["id"], chart_store.chart_positions(payload))
+        conn.commit()
+        done += len(rows)
+
+
+def set_chart_llm_summary(conn: sqlite3.Connection, chart_id: int, llm_summary: str | None) -> None:
+    conn.execute("UPDATE charts SET llm_summary = ? WHERE id = ?", (llm_summary, chart_id))
+    conn.commit()
+
+
+def set_chart_wheel_path(conn: sqlite3.Connection, chart_id: int, wheel_path: str | None) -> None:
+    """Remember where the chart wheel was rendered."""
+    conn.execute("UPDATE charts SET wheel_path = ? WHERE id = ?", (wheel_path, chart_id))
+    conn.commit()
+
+
 def insert_compatibility(
     conn: sqlite3.Connection,
     *,
     user_id: str | None,
     self_profile_id: int | None,
     partner_profile_id: int | None,
-    synastry_json: str,
+    synastry_json: str | bytes,
     score_json: str | None,
     top_aspects_json: str | None,
     wheel_path: str | None,
@@ -288,10 +520,20 @@ def insert_compatibility(
     return cur.lastrowid
 
 
+def set_compatibility_wheel_path(conn: sqlite3.Connection, comp_id: int, wheel_path: str | None) -> None:
+    """Remember where the synastry wheel was rendered."""
+    conn.execute("UPDATE compatibility_runs SET wheel_path = ? WHERE id = ?", (wheel_path, comp_id))
+    conn.commit()
+
+
 def get_compatibility(conn: sqlite3.Connection, comp_id: int):
     return conn.execute("SELECT * FROM compatibility_runs WHERE id = ?", (comp_id,)).fetchone()
 
 
+def get_profile(conn: sqlite3.Connection, profile_id: int):
+    return conn.execute("SELECT * FROM profiles WHERE id = ?", (profile_id,)).fetchone()
+
+
 def get_chart(conn: sqlite3.Connection, chart_id: int):
     return conn.execute("SELECT * FROM charts WHERE id = ?", (chart_id,)).fetchone()
 
@@ -312,7 +554,7 @@ def find_profile(
         """
         SELECT * FROM profiles
         WHERE
-            (telegram_user_id IS ? OR telegram_user_id = ?)
+            telegram_user_id IS ?
             AND birth_date = ?
             AND birth_time IS ?
             AND time_unknown = ?
@@ -322,7 +564,6 @@ def find_profile(
             AND tz_str = ?
         """,
         (
-            telegram_user_id,
             telegram_user_id,
             birth_date,
             birth_time,
@@ -381,3 +622,149 @@ def list_chat_messages(conn: sqlite3.Connection, *, chart_id: int, limit: int =
         """,
         (chart_id, limit),
     ).fetchall()
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_ERROR = "error"
+
+
+def _position_filter(point: str, sign: str | None, house: int | None, retrograde: bool | None) -> tuple[str, list]:
+    clauses, params = ["point = ?"], [point]
+    for column, value in (("sign", sign), ("house", house), ("retrograde", retrograde)):
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            params.append(int(value) if column == "retrograde" else value)
+    return " AND ".join(clauses), params
+
+
+def count_charts_with_position(
+    conn: sqlite3.Connection,
+    *,
+    point: str,
+    sign: str | None = None,
+    house: int | None = None,
+    retrograde: bool | None = None,
+) -> int:
+    """How many charts have e.g. point="Sun", sign="Ari" or point="Moon", house=7."""
+    where, params = _position_filter(point, sign, house, retrograde)
+    return conn.execute(f"SELECT COUNT(*) FROM chart_positions WHERE {where}", params).fetchone()[0]
+
+
+def list_charts_with_position(
+    conn: sqlite3.Connection,
+    *,
+    point: str,
+    sign: str | None = None,
+    house: int | None = None,
+    retrograde: bool | None = None,
+    limit: int = 100,
+) -> list[int]:
+    where, params = _position_filter(point, sign, house, retrograde)
+    rows = conn.execute(f"SELECT chart_id FROM chart_positions WHERE {where} LIMIT ?", (*params, limit)).fetchall()
+    return [row[0] for row in rows]
+
+
+def position_distribution(conn: sqlite3.Connection, *, point: str, by: str = "sign") -> dict:
+    """{sign: count} or {house: count} for one point (charts with unknown house are skipped)."""
+    if by not in ("sign", "house"):
+        raise ValueError(f"unsupported grouping {by!r}")
+    rows = conn.execute(
+        f"SELECT {by}, COUNT(*) FROM chart_positions WHERE point = ? AND {by} IS NOT NULL GROUP BY {by}",
+        (point,),
+    ).fetchall()
+    return {row[0]: row[1] for row in rows}
+
+
+def insert_job(conn: sqlite3.Connection, *, kind: str, chart_id: int | None, payload_json: str | None) -> int:
+    """Queue a background job."""
+    now = datetime.now(timezone.utc).isoformat()
+    cur = conn.execute(
+        """
+        INSERT INTO jobs (kind, chart_id, payload_json, status, created_at, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        (kind, chart_id, payload_json, JOB_QUEUED, now, now),
+    )
+    conn.commit()
+    return cur.lastrowid
+
+
+def claim_next_job(conn: sqlite3.Connection, *, owner: str, lease_seconds: float):
+    """Atomically take the oldest claimable job and lease it to owner (or return None).
+
+    Claimable: queued, or running with an expired lease (its worker died or
+    stopped renewing). Running jobs without a lease predate leases and count
+    as expired.
+    """
+    now_ts = time.time()
+    now = datetime.now(timezone.utc).isoformat()
+    row = conn.execute(
+        """
+        UPDATE jobs
+        SET status = ?, attempts = attempts + 1, updated_at = ?, lease_owner = ?, lease_expires_at = ?
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE status = ? OR (status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?))
+            ORDER BY id LIMIT 1
+        )
+        RETURNING *
+        """,
+        (JOB_RUNNING, now, owner, now_ts + lease_seconds, JOB_QUEUED, JOB_RUNNING, now_ts),
+    ).fetchone()
+    conn.commit()
+    return row
+
+
+def renew_job_lease(conn: sqlite3.Connection, job_id: int, *, owner: str, lease_seconds: float) -> bool:
+    """Extend the lease; False if the job is no longer ours (lease expired and re-claimed)."""
+    cur = conn.execute(
+        "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = ? AND lease_owner = ?",
+        (time.time() + lease_seconds, job_id, JOB_RUNNING, owner),
+    )
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def finish_job(
+    conn: sqlite3.Connection,
+    job_id: int,
+    *,
+    status: str,
+    result: str | None = None,
+    error: str | None = None,
+    owner: str | None = None,
+) -> bool:
+    """Set the final (or re-queued) status and drop the lease.
+
+    With owner, only a job still leased to owner is updated; returns whether it was.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    sql = (
+        "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ?, lease_owner = NULL, lease_expires_at = NULL "
+        "WHERE id = ?"
+    )
+    params: tuple = (status, result, error, now, job_id)
+    if owner is not None:
+        sql += " AND lease_owner = ?"
+        params += (owner,)
+    cur = conn.execute(sql, params)
+    conn.commit()
+    return cur.rowcount == 1
+
+
+def get_job(conn: sqlite3.Connection, job_id: int):
+    return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def list_jobs_for_chart(conn: sqlite3.Connection, chart_id: int):
+    """Latest job of each kind for the chart."""
+    return conn.execute(
+        """
+        SELECT * FROM jobs
+        WHERE id IN (SELECT MAX(id) FROM jobs WHERE chart_id = ? GROUP BY kind)
+        ORDER BY id
+        """,
+        (chart_id,),
+    ).fetchall()
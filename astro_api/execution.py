@@ -0,0 +1,158 @@
+"""Where blocking work of the API handlers runs.
+
+Each stage has a fixed number of workers and a bounded waiting line:
+
+- geo: geocoding (async HTTP to OpenCage), only admission is limited;
+- db: synchronous SQLite/CPU sections of the handlers in a thread pool;
+- chart: ephemeris and wheel rendering in the chart_engine process pool;
+- llm: OpenAI calls, likewise async.
+
+When a stage already has workers + queue calls in flight, new calls fail fast
+with StageOverloaded; the API answers 503 with Retry-After instead of letting
+latency pile up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+
+from astro_api import config
+from astro_bot import chart_engine
+from astro_bot import config as bot_config
+
+# smoothing of the observed call duration used for Retry-After
+EWMA_WEIGHT = 0.2
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+class StageOverloaded(Exception):
+    """The stage queue is full; retry after `retry_after` seconds."""
+
+    def __init__(self, stage: str, retry_after: int):
+        super().__init__(f"{stage} stage is overloaded, retry in {retry_after}s")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class Stage:
+    """A concurrency limit plus a bounded queue in front of an executor.
+
+    mode: "thread" (own ThreadPoolExecutor), "process" (chart_engine) or
+    "async" (the coroutine runs in the event loop; only admission is limited).
+    """
+
+    def __init__(self, name: str, *, mode: str, workers: int, queue: int):
+        self.name = name
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.queue = max(0, queue)
+        self._lock = Lock()
+        self._in_flight = 0
+        self._avg_seconds: Optional[float] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphores: Dict[asyncio.AbstractEventLoop, asyncio.Semaphore] = {}
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def retry_after(self) -> int:
+        """Seconds until a worker is likely free: average call time x queued calls per worker."""
+        avg = self._avg_seconds or 1.0
+        waves = (self._in_flight + 1) / self.workers
+        return max(1, min(MAX_RETRY_AFTER_SECONDS, math.ceil(avg * waves)))
+
+    def _admit(self) -> None:
+        with self._lock:
+            if self._in_flight >= self.workers + self.queue:
+                raise StageOverloaded(self.name, self.retry_after())
+            self._in_flight += 1
+
+    def _done(self, seconds: float) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if self._avg_seconds is None:
+                self._avg_seconds = seconds
+            else:
+                self._avg_seconds += EWMA_WEIGHT * (seconds - self._avg_seconds)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"api-{self.name}")
+            return self._executor
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            semaphore = self._semaphores.get(loop)
+            if semaphore is None:
+                # loops of finished test clients / asyncio.run calls are dropped here
+                self._semaphores = {l: s for l, s in self._semaphores.items() if not l.is_closed()}
+                semaphore = self._semaphores[loop] = asyncio.Semaphore(self.workers)
+            return semaphore
+
+    def _submit(self, fn: Callable[..., Any], args: tuple, kwargs: dict, started: float) -> Future:
+        if self.mode == "thread":
+            future = self._get_executor().submit(fn, *args, **kwargs)
+        else:
+            future = chart_engine.get_engine().submit(fn, *args, **kwargs)
+        # the worker keeps going if the awaiting request is cancelled: it counts until it finishes
+        future.add_done_callback(lambda _: self._done(time.monotonic() - started))
+        return future
+
+    async def run(self, fn: Callable[..., Any], /, *args, **kwargs) -> Any:
+        """Run fn on the stage; raises StageOverloaded immediately if the queue is full."""
+        self._admit()
+        started = time.monotonic()
+        submitted = False
+        try:
+            if self.mode == "thread":
+                future = self._submit(fn, args, kwargs, started)
+                submitted = True
+                return await asyncio.wrap_future(future)
+            async with self._semaphore():
+                if self.mode == "process":
+                    future = self._submit(fn, args, kwargs, started)
+                    submitted = True
+                    return await asyncio.wrap_future(future)
+                return await fn(*args, **kwargs)
+        finally:
+            if not submitted:
+                self._done(time.monotonic() - started)
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "queue": self.queue, "in_flight": self._in_flight}
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+geo = Stage("geo", mode="async", workers=config.get_stage_workers("geo", 8), queue=config.get_stage_queue("geo", 32))
+db = Stage("db", mode="thread", workers=config.get_stage_workers("db", 4), queue=config.get_stage_queue("db", 64))
+chart = Stage(
+    "chart",
+    mode="process",
+    workers=config.get_stage_workers("chart", bot_config.get_engine_workers()),
+    queue=config.get_stage_queue("chart", 16),
+)
+llm = Stage("llm", mode="async", workers=config.get_stage_workers("llm", 16), queue=config.get_stage_queue("llm", 64))
+
+STAGES = (geo, db, chart, llm)
+
+
+def stats() -> dict:
+    return {stage.name: stage.stats() for stage in STAGES}
+
+
+def shutdown() -> None:
+    for stage in STAGES:
+        stage.shutdown()
@@ -0,0 +1,57 @@
+"""Conditional GET helpers: strong ETags, If-None-Match and Cache-Control.
+
+ETags are computed from data the handler already has in hand (raw DB
+columns, the wheel's content key), so a matching If-None-Match is answered
+with 304 before anything is decoded or read from disk.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Any, Iterable, Optional
+
+from fastapi import Response
+from fastapi.responses import JSONResponse
+
+# stored resources change only when background jobs finish: always revalidate
+REVALIDATE = "private, no-cache"
+# versioned URLs (?v=<content key>) never change
+IMMUTABLE = "private, max-age=31536000, immutable"
+
+
+def make_etag(*parts: Any) -> str:
+    """Strong ETag over the given values (bytes are hashed as-is)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if part is None:
+            raw = b"\x00"
+        elif isinstance(part, (bytes, bytearray, memoryview)):
+            raw = bytes(part)
+        else:
+            raw = str(part).encode("utf-8")
+        digest.update(len(raw).to_bytes(8, "little"))
+        digest.update(raw)
+    return f'"{digest.hexdigest()}"'
+
+
+def matching_etag(if_none_match: Optional[str], etags: Iterable[str]) -> Optional[str]:
+    """The first of etags that If-None-Match matches (weak comparison, * matches anything)."""
+    if not if_none_match:
+        return None
+    etags = list(etags)
+    candidates = {tag.strip() for tag in if_none_match.split(",")}
+    if "*" in candidates:
+        return etags[0] if etags else None
+    candidates = {tag[2:] if tag.startswith("W/") else tag for tag in candidates}
+    return next((etag for etag in etags if etag in candidates), None)
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE, vary: Optional[str] = None) -> Response:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if vary:
+        headers["Vary"] = vary
+    return Response(status_code=304, headers=headers)
+
+
+def cached_json(content: Any, etag: str, cache_control: str = REVALIDATE) -> JSONResponse:
+    return JSONResponse(content=content, headers={"ETag": etag, "Cache-Control": cache_control})
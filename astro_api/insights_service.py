@@ -90,7 +90,16 @@ def build_prompt(context_text: str) -> str:
     )
 
 
-def generate_insights(context_text: str) -> dict:
+def build_question_prompt(context_text: str, question: str) -> str:
+    return (
+        "Ты профессиональный астролог. Ответь на вопрос пользователя, опираясь только на данные натальной карты.\n"
+        "Не придумывай новые позиции, используй факты ниже.\n\n"
+        f"Натальная карта:\n{context_text}\n\n"
+        f"Вопрос: {question}\nОтвет:"
+    )
+
+
+async def generate_insights(context_text: str) -> dict:
     """Ask OpenAI for insights with the prepared context."""
-    answer = openai_client.ask_gpt(build_prompt(context_text), role="астролог")
+    answer = await openai_client.ask_gpt(build_prompt(context_text), role="астролог")
     return {"insights_text": answer}
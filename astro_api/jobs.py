@@ -0,0 +1,246 @@
+"""Background jobs (LLM summary, insights) for stored charts.
+
+Jobs live in the SQLite `jobs` table, so a restart loses nothing. Several API
+processes may share the table: a worker leases the job it claims for
+JOB_LEASE_SECONDS and renews the lease while the handler runs. A `running`
+job is taken over only once its lease has expired (its process died), so
+starting another process never re-runs - and re-bills - a live job. Worker
+tasks run in the API event loop; they are woken right after enqueue and also
+poll the table, so jobs queued by another process are picked up too. Their
+SQLite calls run in threads (asyncio.to_thread): with the busy timeout a
+write can wait seconds for another process's lock.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from astro_api import config, db, insights_service, natal_service
+from astro_bot import openai_client
+
+logger = logging.getLogger(__name__)
+
+KIND_LLM_SUMMARY = "llm_summary"
+KIND_INSIGHTS = "insights"
+CHART_JOB_KINDS = (KIND_LLM_SUMMARY, KIND_INSIGHTS)
+FINISHED_STATUSES = {db.JOB_DONE, db.JOB_ERROR}
+
+MAX_ATTEMPTS = 2
+POLL_SECONDS = 5.0
+DEFAULT_WORKERS = 2
+# how long stop() waits for workers to hand their jobs back
+STOP_TIMEOUT_SECONDS = 10.0
+
+Handler = Callable[[object, dict], Awaitable[Optional[str]]]
+
+
+async def _run_llm_summary(conn, payload: dict) -> str:
+    prompt = natal_service.build_summary_prompt(payload["context_text"])
+    llm_summary = await openai_client.ask_gpt(prompt, role="астролог")
+    await asyncio.to_thread(db.set_chart_llm_summary, conn, payload["chart_id"], llm_summary)
+    return llm_summary
+
+
+async def _run_insights(conn, payload: dict) -> str:
+    insights = await insights_service.generate_insights(payload["context_text"])
+    return insights.get("insights_text")
+
+
+HANDLERS: Dict[str, Handler] = {
+    KIND_LLM_SUMMARY: _run_llm_summary,
+    KIND_INSIGHTS: _run_insights,
+}
+
+
+class JobQueue:
+    """asyncio workers over the persisted jobs table."""
+
+    def __init__(self, workers: int = DEFAULT_WORKERS):
+        self.workers = workers
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+        self._calls: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._changed: Optional[asyncio.Condition] = None
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._changed = asyncio.Condition()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+
+    async def stop(self, timeout: float = STOP_TIMEOUT_SECONDS) -> None:
+        """Stop the workers; a job in progress goes back to the queue. Waits at most timeout."""
+        tasks, self._tasks = self._tasks, []
+        if not tasks:
+            return
+        # workers check the flag between jobs; only running handlers are cancelled, so a
+        # claim in flight is never cut off between leasing the job and handing it back
+        self._stop.set()
+        self._wake.set()
+        for call in list(self._calls):
+            call.cancel()
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        if pending:
+            logger.warning("%d job worker(s) did not stop within %.0fs", len(pending), timeout)
+            for task in pending:
+                task.cancel()
+
+    def notify(self) -> None:
+        """Wake idle workers (a job was queued); callable from the db stage threads too."""
+        if self._wake is None or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wake.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def wait_for_update(self, timeout: float) -> None:
+        """Block until some job finishes in this process, or timeout."""
+        if self._changed is None:
+            await asyncio.sleep(timeout)
+            return
+        async with self._changed:
+            try:
+                async with asyncio.timeout(timeout):
+                    await self._changed.wait()
+            except TimeoutError:
+                pass
+
+    async def _idle(self) -> None:
+        """Wait until a job is queued, stop() is called or POLL_SECONDS pass."""
+        try:
+            async with asyncio.timeout(POLL_SECONDS):
+                await self._wake.wait()
+        except TimeoutError:
+            pass
+        if not self._stop.is_set():
+            self._wake.clear()
+
+    async def _worker(self, index: int) -> None:
+        # dedicated connections per worker (not taken from the request pool); the lease
+        # renewal gets its own so it never shares a transaction with the handler
+        conn = await asyncio.to_thread(db.get_connection)
+        lease_conn = await asyncio.to_thread(db.get_connection)
+        try:
+            while not self._stop.is_set():
+                job = await asyncio.to_thread(
+                    db.claim_next_job, conn, owner=self.owner, lease_seconds=config.get_job_lease_seconds()
+                )
+                if job is None:
+                    await self._idle()
+                    continue
+                await self._run(conn, lease_conn, job)
+        finally:
+            conn.close()
+            lease_conn.close()
+
+    async def _renew_lease(self, conn, job_id: int) -> None:
+        """Keep the lease alive while the handler runs (renewed at a third of its length)."""
+        lease = config.get_job_lease_seconds()
+        while True:
+            await asyncio.sleep(lease / 3)
+            renewed = await asyncio.to_thread(db.renew_job_lease, conn, job_id, owner=self.owner, lease_seconds=lease)
+            if not renewed:
+                logger.warning("Lost the lease on job %s", job_id)
+                return
+
+    async def _run(self, conn, lease_conn, job) -> None:
+        if self._stop.is_set():
+            # claimed while stop() was called: not started, hand it back
+            await asyncio.to_thread(db.finish_job, conn, job["id"], status=db.JOB_QUEUED, owner=self.owner)
+            return
+        handler = HANDLERS.get(job["kind"])
+        renewal = asyncio.create_task(self._renew_lease(lease_conn, job["id"]))
+        try:
+            if handler is None:
+                raise ValueError(f"unknown job kind {job['kind']}")
+            payload = json.loads(job["payload_json"] or "{}")
+            call = asyncio.create_task(handler(conn, payload))
+            self._calls.add(call)
+            try:
+                result = await call
+            finally:
+                self._calls.discard(call)
+        except asyncio.CancelledError:
+            # shutdown: hand it back to the queue right away instead of waiting for the lease
+            await asyncio.to_thread(db.finish_job, conn, job["id"], status=db.JOB_QUEUED, owner=self.owner)
+            if asyncio.current_task().cancelling():
+                raise
+            return
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.warning("Job %s (%s) failed: %s", job["id"], job["kind"], exc)
+            status = db.JOB_QUEUED if job["attempts"] < MAX_ATTEMPTS else db.JOB_ERROR
+            await asyncio.to_thread(db.finish_job, conn, job["id"], status=status, error=str(exc), owner=self.owner)
+        else:
+            await asyncio.to_thread(db.finish_job, conn, job["id"], status=db.JOB_DONE, result=result, owner=self.owner)
+        finally:
+            renewal.cancel()
+            await asyncio.gather(renewal, return_exceptions=True)
+        async with self._changed:
+            self._changed.notify_all()
+
+
+queue = JobQueue()
+
+
+def enqueue(conn, kind: str, chart_id: Optional[int], payload: dict) -> int:
+    job_id = db.insert_job(conn, kind=kind, chart_id=chart_id, payload_json=json.dumps(payload, ensure_ascii=False))
+    queue.notify()
+    return job_id
+
+
+def enqueue_chart_jobs(conn, chart_id: int, context_text: str) -> None:
+    """Queue llm_summary and insights for a chart, unless already queued/done."""
+    if not config.get_openai_api_key():
+        return
+    latest = {row["kind"]: row for row in db.list_jobs_for_chart(conn, chart_id)}
+    chart = db.get_chart(conn, chart_id)
+    for kind in CHART_JOB_KINDS:
+        job = latest.get(kind)
+        if job is not None and job["status"] != db.JOB_ERROR:
+            continue
+        if kind == KIND_LLM_SUMMARY and chart is not None and chart["llm_summary"]:
+            continue
+        enqueue(conn, kind, chart_id, {"chart_id": chart_id, "context_text": context_text})
+
+
+def describe_jobs(conn, chart_id: int) -> List[dict]:
+    """Job status list for API responses."""
+    return [
+        {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "result": row["result"],
+            "error": row["error"] if row["status"] == db.JOB_ERROR else None,
+            "updated_at": row["updated_at"],
+        }
+        for row in db.list_jobs_for_chart(conn, chart_id)
+    ]
+
+
+def latest_result(conn, chart_id: int, kind: str) -> Optional[str]:
+    for row in db.list_jobs_for_chart(conn, chart_id):
+        if row["kind"] == kind and row["status"] == db.JOB_DONE:
+            return row["result"]
+    return None
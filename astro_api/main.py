@@ -8,18 +8,24 @@ from contextlib import asynccontextmanager
 from pathlib import Path
 from typing import Optional
 
-from fastapi import FastAPI, Header, Request
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
+from fastapi import Depends, FastAPI, Header, Request
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from astro_api import config, db
+from astro_api import chart_store
+from astro_api import execution
+from astro_api import http_cache
 from astro_api import natal_service
+from astro_api import place_index
 from astro_api import insights_service
+from astro_api import jobs
+from astro_api import wheels
 from astro_api import compatibility_service
 from astro_api.telegram_webapp_auth import validate_init_data, InitDataError
 from astro_bot import openai_client
 from astro_bot import config as bot_config
-from astro_bot import natal_engine
+from astro_bot import chart_engine, geocoder, llm_cache, warmup, wheel_janitor
 
 logger = logging.getLogger(__name__)
 
@@ -28,20 +34,37 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI):
     # startup
     mount_static_if_available(app)
-    conn = db.get_connection()
-    db.init_db(conn)
-    try:
-        charts_dir = config.get_webapp_dist_dir().parent / "charts"
-        natal_engine.cleanup_old_svgs(charts_dir)
-    except Exception:  # pylint: disable=broad-except
-        logger.warning("Failed to cleanup old charts")
+    db.open_pool()
+    await jobs.queue.start()
+    janitor = wheel_janitor.WheelJanitor(db.get_connection, config.get_charts_dir())
+    janitor.start()
+    # kerykeion/timezonefinder load lazily; preload them while already serving
+    warmup_task = warmup.warm_up_in_background()
     yield
-    # shutdown — nothing special for now
+    # shutdown
+    await warmup.stop_warm_up(warmup_task)
+    await jobs.queue.stop()
+    await janitor.stop()
+    chart_engine.shutdown_engine()
+    await openai_client.aclose()
+    await geocoder.aclose()
+    execution.shutdown()
+    db.close_pool()
 
 
 app = FastAPI(title="AstroGlass API", lifespan=lifespan)
 
 
+@app.exception_handler(execution.StageOverloaded)
+async def stage_overloaded(request: Request, exc: execution.StageOverloaded):
+    """A full execution stage answers fast instead of queueing without bound."""
+    return JSONResponse(
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+        content={"ok": False, "error": {"code": "overloaded", "message": str(exc), "retry_after": exc.retry_after}},
+    )
+
+
 @app.get("/api/health")
 async def health():
     """Simple healthcheck."""
@@ -59,6 +82,8 @@ async def debug_info():
             "openai_configured": bool(config.get_openai_api_key()),
             "telegram_token_set": bool(config.get_telegram_bot_token()),
             "dist_available": bool(dist_dir and index_html and dist_dir.exists() and index_html.exists()),
+            "llm_cache": llm_cache.cache.stats(),
+            "stages": execution.stats(),
         },
     }
 
@@ -121,7 +146,7 @@ def get_init_data_from_request(request: Request, auth_header: Optional[str]) ->
 
 
 @app.post("/api/auth/whoami")
-async def whoami(request: Request, authorization: Optional[str] = Header(None)):
+async def whoami(request: Request, authorization: Optional[str] = Header(None), conn=Depends(db.get_db)):
     """Validate Telegram initData and return user info."""
     bot_token = config.get_telegram_bot_token()
     if not bot_token:
@@ -159,8 +184,6 @@ async def whoami(request: Request, authorization: Optional[str] = Header(None)):
         return JSONResponse(status_code=500, content={"ok": False, "error": {"code": "internal_error", "message": "Failed to validate initData"}})
 
     # Upsert user into API DB
-    conn = db.get_connection()
-    db.init_db(conn)
     user_data = validated.get("user") or {}
     if user_data.get("id"):
         db.upsert_user(conn, user_data)
@@ -174,14 +197,14 @@ async def whoami(request: Request, authorization: Optional[str] = Header(None)):
 
 
 @app.get("/api/geo/search")
-async def geo_search(q: Optional[str] = None):
+async def geo_search(q: Optional[str] = None, conn=Depends(db.get_db)):
     """Geocoding endpoint with cache."""
     if not q:
         return JSONResponse(status_code=400, content={"ok": False, "error": {"code": "missing_query", "message": "q is required"}})
-    conn = db.get_connection()
-    db.init_db(conn)
     try:
-        location = natal_service.resolve_location(conn, q)
+        location = await execution.geo.run(natal_service.resolve_location, conn, q)
+    except execution.StageOverloaded:
+        raise
     except Exception as exc:  # pylint: disable=broad-except
         return JSONResponse(status_code=500, content={"ok": False, "error": {"code": "geo_error", "message": str(exc)}})
     return {
@@ -196,8 +219,26 @@ async def geo_search(q: Optional[str] = None):
     }
 
 
+@app.get("/api/geo/suggest")
+async def geo_suggest(q: Optional[str] = None, limit: int = place_index.DEFAULT_LIMIT, conn=Depends(db.get_db)):
+    """Prefix autocomplete over cached places and the offline gazetteer (no geocoding)."""
+    if not q:
+        return JSONResponse(status_code=400, content={"ok": False, "error": {"code": "missing_query", "message": "q is required"}})
+    index = place_index.get_index(db.DB_PATH)
+    await execution.db.run(index.refresh, conn)
+    limit = max(1, min(limit, place_index.MAX_LIMIT))
+    return {"ok": True, "query": q, "suggestions": index.suggest(q, limit)}
+
+
+def queue_chart_jobs(conn, result: dict) -> list:
+    """Queue the LLM jobs of a freshly calculated chart and describe them (runs on the db stage)."""
+    context_text = result["context_text"] or insights_service.build_context_from_chart(result["chart"])
+    jobs.enqueue_chart_jobs(conn, result["chart_id"], context_text or result["summary"])
+    return jobs.describe_jobs(conn, result["chart_id"])
+
+
 @app.post("/api/natal/calc")
-async def natal_calc(payload: dict):
+async def natal_calc(payload: dict, conn=Depends(db.get_db)):
     """Calculate natal chart and return ids + summary."""
     required = ["birth_date", "place"]
     for key in required:
@@ -210,25 +251,27 @@ async def natal_calc(payload: dict):
     telegram_user_id = payload.get("telegram_user_id")
     label = payload.get("label")
 
-    conn = db.get_connection()
-    db.init_db(conn)
     try:
-        result = natal_service.calculate_natal_chart(
-            conn=conn,
+        result = await natal_service.calculate_natal_chart(
             birth_date_str=birth_date,
             birth_time_str=birth_time,
             place_query=place,
             user_identifier=str(telegram_user_id or "guest"),
-            charts_dir=config.get_webapp_dist_dir().parent / "charts",
+            charts_dir=config.get_charts_dir(),
             telegram_user_id=telegram_user_id,
             label=label,
         )
+    except execution.StageOverloaded:
+        raise
     except Exception as exc:  # pylint: disable=broad-except
         return JSONResponse(
             status_code=500,
             content={"ok": False, "error": {"code": "calc_error", "message": str(exc)}},
         )
 
+    # LLM texts are produced by background jobs; the Mini App polls /jobs or listens to /jobs/stream
+    chart_jobs = await execution.db.run(queue_chart_jobs, conn, result)
+
     wheel_url = f"/api/natal/{result['chart_id']}/wheel.svg"
     return {
         "ok": True,
@@ -237,44 +280,101 @@ async def natal_calc(payload: dict):
         "summary": result["summary"],
         "llm_summary": result.get("llm_summary"),
         "wheel_url": wheel_url,
+        "jobs_url": f"/api/natal/{result['chart_id']}/jobs",
+        "jobs": chart_jobs,
         "chart": result["chart"],
         "location": result["location"],
     }
 
 
 @app.get("/api/natal/{chart_id}")
-async def get_chart(chart_id: int):
-    """Return stored chart JSON."""
-    conn = db.get_connection()
-    db.init_db(conn)
+async def get_chart(chart_id: int, if_none_match: Optional[str] = Header(None), conn=Depends(db.get_db)):
+    """Return stored chart JSON.
+
+    The ETag covers the raw stored columns and job states, so a revalidation
+    is answered with 304 without decoding chart_json.
+    """
     row = db.get_chart(conn, chart_id)
     if not row:
         return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "chart not found"}})
-    return {
-        "ok": True,
-        "chart": row["chart_json"],
-        "wheel_url": f"/api/natal/{chart_id}/wheel.svg",
-        "summary": row["summary"],
-        "created_at": row["created_at"],
-        "llm_summary": row["llm_summary"],
-    }
+    etag = http_cache.make_etag(
+        row["chart_json"],
+        row["summary"],
+        row["created_at"],
+        row["llm_summary"],
+        row["wheel_path"],
+        *((job["id"], job["status"], job["updated_at"]) for job in db.list_jobs_for_chart(conn, chart_id)),
+    )
+    if http_cache.matching_etag(if_none_match, [etag]):
+        return http_cache.not_modified(etag)
+    return http_cache.cached_json(
+        {
+            "ok": True,
+            "chart": chart_store.chart_text(row["chart_json"]),
+            "wheel_url": wheels.wheel_url(f"/api/natal/{chart_id}/wheel.svg", row["wheel_path"]),
+            "summary": row["summary"],
+            "created_at": row["created_at"],
+            "llm_summary": row["llm_summary"],
+            "jobs": jobs.describe_jobs(conn, chart_id),
+        },
+        etag,
+    )
+
+
+@app.get("/api/natal/{chart_id}/jobs")
+async def get_chart_jobs(chart_id: int, conn=Depends(db.get_db)):
+    """Status (and results) of the chart's background jobs, for polling."""
+    if not db.get_chart(conn, chart_id):
+        return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "chart not found"}})
+    return {"ok": True, "jobs": jobs.describe_jobs(conn, chart_id)}
+
+
+@app.get("/api/natal/{chart_id}/jobs/stream")
+async def stream_chart_jobs(chart_id: int, conn=Depends(db.get_db)):
+    """SSE push of job status: a `jobs` event on every change, `done` when all jobs finished."""
+    if not db.get_chart(conn, chart_id):
+        return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "chart not found"}})
+
+    async def events():
+        # the stream outlives the request, so it holds its own pooled connection
+        with db.get_pool().connection() as stream_conn:
+            last = None
+            while True:
+                current = jobs.describe_jobs(stream_conn, chart_id)
+                if current != last:
+                    yield sse_event("jobs", {"jobs": current})
+                    last = current
+                if all(job["status"] in jobs.FINISHED_STATUSES for job in current):
+                    yield sse_event("done", {"ok": True})
+                    return
+                await jobs.queue.wait_for_update(jobs.POLL_SECONDS)
+
+    return sse_response(events())
 
 
 @app.get("/api/natal/{chart_id}/wheel.svg")
-async def get_wheel(chart_id: int):
-    conn = db.get_connection()
-    db.init_db(conn)
-    row = db.get_chart(conn, chart_id)
-    if not row or not row["wheel_path"]:
+async def get_wheel(
+    chart_id: int,
+    v: Optional[str] = None,
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    conn=Depends(db.get_db),
+):
+    row = await execution.db.run(db.get_chart, conn, chart_id)
+    if not row:
+        return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "wheel not found"}})
+    cached = wheels.not_modified(row["wheel_path"], if_none_match, v)
+    if cached is not None:
+        return cached
+    # Rendered on first access and re-rendered if the file was cleaned up
+    wheel_path = await wheels.ensure_natal_wheel(row, config.get_charts_dir())
+    if wheel_path is None:
         return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "wheel not found"}})
-    wheel_path = Path(row["wheel_path"])
-    if not wheel_path.exists():
-        return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "wheel file missing"}})
-    return FileResponse(wheel_path, media_type="image/svg+xml")
+    return wheels.wheel_response(wheel_path, accept_encoding, v)
 
 
 @app.post("/api/compatibility/calc")
-async def compatibility_calc(payload: dict):
+async def compatibility_calc(payload: dict, conn=Depends(db.get_db)):
     """Calculate synastry (compatibility) between two birth data sets."""
     required = ["self_birth_date", "self_place", "partner_birth_date", "partner_place"]
     for key in required:
@@ -289,10 +389,8 @@ async def compatibility_calc(payload: dict):
     partner_place = payload.get("partner_place")
     telegram_user_id = payload.get("telegram_user_id")
 
-    conn = db.get_connection()
-    db.init_db(conn)
     try:
-        result = compatibility_service.calculate_compatibility(
+        result = await compatibility_service.calculate_compatibility(
             conn=conn,
             user_id=str(telegram_user_id) if telegram_user_id else None,
             self_birth_date=self_birth_date,
@@ -301,8 +399,10 @@ async def compatibility_calc(payload: dict):
             partner_birth_date=partner_birth_date,
             partner_birth_time=partner_birth_time,
             partner_place=partner_place,
-            charts_dir=config.get_webapp_dist_dir().parent / "charts",
+            charts_dir=config.get_charts_dir(),
         )
+    except execution.StageOverloaded:
+        raise
     except Exception as exc:  # pylint: disable=broad-except
         return JSONResponse(status_code=500, content={"ok": False, "error": {"code": "compat_error", "message": str(exc)}})
 
@@ -313,76 +413,148 @@ async def compatibility_calc(payload: dict):
         "top_aspects": result["top_aspects"],
         "key_aspects": result["key_aspects"],
         "overlays": result.get("overlays"),
-        "wheel_url": f"/api/compatibility/{result['id']}/wheel.svg",
+        "wheel_url": wheels.wheel_url(f"/api/compatibility/{result['id']}/wheel.svg", result["wheel_path"]),
     }
 
 
 @app.get("/api/compatibility/{comp_id}")
-async def get_compatibility(comp_id: int):
-    conn = db.get_connection()
-    db.init_db(conn)
+async def get_compatibility(comp_id: int, if_none_match: Optional[str] = Header(None), conn=Depends(db.get_db)):
     row = db.get_compatibility(conn, comp_id)
     if not row:
         return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "compatibility not found"}})
-    overlays = None
-    if row["synastry_json"]:
-        try:
-            overlays = json.loads(row["synastry_json"]).get("overlays")
-        except Exception:  # pylint: disable=broad-except
-            overlays = None
-    return {
-        "ok": True,
-        "synastry": row["synastry_json"],
-        "score": row["score_json"],
-        "top_aspects": row["top_aspects_json"],
-        "overlays": overlays,
-        "wheel_url": f"/api/compatibility/{comp_id}/wheel.svg",
-    }
+    etag = http_cache.make_etag(row["synastry_json"], row["score_json"], row["top_aspects_json"], row["wheel_path"])
+    if http_cache.matching_etag(if_none_match, [etag]):
+        return http_cache.not_modified(etag)
+    synastry = None
+    try:
+        synastry = chart_store.decode_synastry(row["synastry_json"])
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Failed to parse synastry_json for compatibility_id=%s", comp_id)
+    return http_cache.cached_json(
+        {
+            "ok": True,
+            # the stored JSON text, as this endpoint has always returned it
+            "synastry": chart_store.synastry_text(row["synastry_json"], synastry) if synastry else None,
+            "score": row["score_json"],
+            "top_aspects": row["top_aspects_json"],
+            "overlays": synastry.get("overlays") if synastry else None,
+            "wheel_url": wheels.wheel_url(f"/api/compatibility/{comp_id}/wheel.svg", row["wheel_path"]),
+        },
+        etag,
+    )
 
 
 @app.get("/api/compatibility/{comp_id}/wheel.svg")
-async def get_compatibility_wheel(comp_id: int):
-    conn = db.get_connection()
-    db.init_db(conn)
-    row = db.get_compatibility(conn, comp_id)
-    if not row or not row["wheel_path"]:
+async def get_compatibility_wheel(
+    comp_id: int,
+    v: Optional[str] = None,
+    accept_encoding: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+    conn=Depends(db.get_db),
+):
+    row = await execution.db.run(db.get_compatibility, conn, comp_id)
+    if not row:
+        return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "wheel not found"}})
+    cached = wheels.not_modified(row["wheel_path"], if_none_match, v)
+    if cached is not None:
+        return cached
+    wheel_path = await wheels.ensure_compatibility_wheel(row, config.get_charts_dir())
+    if wheel_path is None:
         return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "wheel not found"}})
-    wheel_path = Path(row["wheel_path"])
-    if not wheel_path.exists():
-        return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "wheel missing"}})
-    return FileResponse(wheel_path, media_type="image/svg+xml")
+    return wheels.wheel_response(wheel_path, accept_encoding, v)
+
+
+def chart_context_text(row) -> str:
+    """Plain-text chart context for prompts (falls back to the stored summary)."""
+    chart_payload = None
+    if row["chart_json"]:
+        try:
+            chart_payload = chart_store.decode_chart(row["chart_json"])
+        except Exception:  # pylint: disable=broad-except
+            logger.warning("Failed to parse chart_json for chart_id=%s", row["id"])
+    context_text = insights_service.build_context_from_chart(chart_payload)
+    return context_text or row["summary"] or "Натальная карта"
+
+
+def save_answer_and_history(conn, chart_id: int, question: str, answer: str) -> list[dict]:
+    """Persist Q/A and return the last 3 messages (oldest first)."""
+    try:
+        db.insert_chat_message(conn, chart_id=chart_id, question=question, answer=answer)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Failed to persist chat message for chart_id=%s", chart_id)
+
+    history_rows = db.list_chat_messages(conn, chart_id=chart_id, limit=20) or []
+    history_rows = history_rows[:3] if history_rows else []
+    return [
+        {"question": r["question"], "answer": r["answer"], "created_at": r["created_at"]}
+        for r in reversed(history_rows)
+    ]
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events) -> StreamingResponse:
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/api/insights/{chart_id}")
-async def get_insights(chart_id: int):
+async def get_insights(chart_id: int, conn=Depends(db.get_db)):
     """Generate insights for chart via OpenAI."""
     if not config.get_openai_api_key():
         return JSONResponse(status_code=500, content={"ok": False, "error": {"code": "server_misconfigured", "message": "OPENAI_API_KEY not set"}})
-    conn = db.get_connection()
-    db.init_db(conn)
-    row = db.get_chart(conn, chart_id)
+    row = await execution.db.run(db.get_chart, conn, chart_id)
     if not row or not row["chart_json"]:
         return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "chart not found"}})
-    chart_payload = None
-    if row["chart_json"]:
-        try:
-            chart_payload = json.loads(row["chart_json"]) if isinstance(row["chart_json"], str) else row["chart_json"]
-        except Exception:  # pylint: disable=broad-except
-            logger.warning("Failed to parse chart_json for chart_id=%s", chart_id)
 
-    context_text = insights_service.build_context_from_chart(chart_payload)
-    if not context_text:
-        context_text = row["summary"] or "Натальная карта"
+    ready = await execution.db.run(jobs.latest_result, conn, chart_id, jobs.KIND_INSIGHTS)
+    if ready:
+        return {"ok": True, "insights": ready}
+
+    context_text = await execution.db.run(chart_context_text, row)
     try:
-        insights = insights_service.generate_insights(context_text)
+        insights = await execution.llm.run(insights_service.generate_insights, context_text)
+    except execution.StageOverloaded:
+        raise
     except Exception as exc:  # pylint: disable=broad-except
         return JSONResponse(status_code=500, content={"ok": False, "error": {"code": "insight_error", "message": str(exc)}})
     return {"ok": True, "insights": insights.get("insights_text")}
 
 
-@app.post("/api/ask")
-async def ask_question(payload: dict):
-    """Answer a user question based on stored chart context."""
+@app.get("/api/insights/{chart_id}/stream")
+async def stream_insights(chart_id: int, conn=Depends(db.get_db)):
+    """SSE variant of insights: `delta` events with text pieces, then `done` (or `error`)."""
+    if not config.get_openai_api_key():
+        return JSONResponse(status_code=500, content={"ok": False, "error": {"code": "server_misconfigured", "message": "OPENAI_API_KEY not set"}})
+    row = await execution.db.run(db.get_chart, conn, chart_id)
+    if not row or not row["chart_json"]:
+        return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "chart not found"}})
+
+    context_text = await execution.db.run(chart_context_text, row)
+    prompt = insights_service.build_prompt(context_text)
+
+    async def events():
+        parts = []
+        try:
+            async for delta in openai_client.stream_gpt(prompt, role="астролог"):
+                parts.append(delta)
+                yield sse_event("delta", {"text": delta})
+        except Exception as exc:  # pylint: disable=broad-except
+            yield sse_event("error", {"code": "insight_error", "message": str(exc)})
+            return
+        yield sse_event("done", {"ok": True, "insights": "".join(parts).strip()})
+
+    return sse_response(events())
+
+
+def _validate_ask_payload(conn, payload: dict):
+    """Return (chart_id, question, row) or an error JSONResponse."""
     if not config.get_openai_api_key():
         return JSONResponse(status_code=500, content={"ok": False, "error": {"code": "server_misconfigured", "message": "OPENAI_API_KEY not set"}})
     question = payload.get("question")
@@ -390,54 +562,65 @@ async def ask_question(payload: dict):
     if not question or not chart_id:
         return JSONResponse(status_code=400, content={"ok": False, "error": {"code": "missing_field", "message": "chart_id and question are required"}})
 
-    conn = db.get_connection()
-    db.init_db(conn)
     row = db.get_chart(conn, int(chart_id))
     if not row or not row["chart_json"]:
         return JSONResponse(status_code=404, content={"ok": False, "error": {"code": "not_found", "message": "chart not found"}})
+    return int(chart_id), question, row
 
-    chart_payload = None
-    if row["chart_json"]:
-        try:
-            chart_payload = json.loads(row["chart_json"]) if isinstance(row["chart_json"], str) else row["chart_json"]
-        except Exception:  # pylint: disable=broad-except
-            chart_payload = None
 
-    context_text = insights_service.build_context_from_chart(chart_payload)
-    if not context_text:
-        context_text = row["summary"] or "Натальная карта"
-
-    prompt = (
-        "Ты профессиональный астролог. Ответь на вопрос пользователя, опираясь только на данные натальной карты.\n"
-        "Не придумывай новые позиции, используй факты ниже.\n\n"
-        f"Натальная карта:\n{context_text}\n\n"
-        f"Вопрос: {question}\nОтвет:"
-    )
+@app.post("/api/ask")
+async def ask_question(payload: dict, conn=Depends(db.get_db)):
+    """Answer a user question based on stored chart context."""
+    checked = await execution.db.run(_validate_ask_payload, conn, payload)
+    if isinstance(checked, JSONResponse):
+        return checked
+    chart_id, question, row = checked
+
+    context_text = await execution.db.run(chart_context_text, row)
+    prompt = insights_service.build_question_prompt(context_text, question)
     try:
-        answer = openai_client.ask_gpt(prompt, role="астролог")
+        answer = await execution.llm.run(openai_client.ask_gpt, prompt, role="астролог")
+    except execution.StageOverloaded:
+        raise
     except Exception as exc:  # pylint: disable=broad-except
         return JSONResponse(status_code=500, content={"ok": False, "error": {"code": "ask_error", "message": str(exc)}})
 
-    try:
-        db.insert_chat_message(conn, chart_id=int(chart_id), question=question, answer=answer)
-    except Exception:  # pylint: disable=broad-except
-        logger.warning("Failed to persist chat message for chart_id=%s", chart_id)
-
-    history_rows = db.list_chat_messages(conn, chart_id=int(chart_id), limit=20) or []
-    history_rows = history_rows[:3] if history_rows else []
-    history = [
-        {"question": r["question"], "answer": r["answer"], "created_at": r["created_at"]}
-        for r in reversed(history_rows)
-    ]
+    history = await execution.db.run(save_answer_and_history, conn, chart_id, question, answer)
     return {"ok": True, "answer": answer, "history": history}
 
 
+@app.post("/api/ask/stream")
+async def ask_question_stream(payload: dict, conn=Depends(db.get_db)):
+    """SSE variant of /api/ask; the full answer is persisted once the stream ends."""
+    checked = await execution.db.run(_validate_ask_payload, conn, payload)
+    if isinstance(checked, JSONResponse):
+        return checked
+    chart_id, question, row = checked
+
+    context_text = await execution.db.run(chart_context_text, row)
+    prompt = insights_service.build_question_prompt(context_text, question)
+
+    async def events():
+        parts = []
+        try:
+            async for delta in openai_client.stream_gpt(prompt, role="астролог"):
+                parts.append(delta)
+                yield sse_event("delta", {"text": delta})
+        except Exception as exc:  # pylint: disable=broad-except
+            yield sse_event("error", {"code": "ask_error", "message": str(exc)})
+            return
+        answer = "".join(parts).strip()
+        with db.get_pool().connection() as stream_conn:
+            history = await execution.db.run(save_answer_and_history, stream_conn, chart_id, question, answer)
+        yield sse_event("done", {"ok": True, "answer": answer, "history": history})
+
+    return sse_response(events())
+
+
 @app.get("/api/charts/recent")
-async def get_recent_charts(limit: int = 3):
+async def get_recent_charts(limit: int = 3, conn=Depends(db.get_db)):
     """Return recent charts for quick reopen."""
     limit = max(1, min(limit, 10))
-    conn = db.get_connection()
-    db.init_db(conn)
     rows = db.list_recent_charts(conn, limit=limit)
     charts = []
     for r in rows or []:
@@ -447,7 +630,7 @@ async def get_recent_charts(limit: int = 3):
         chart_payload = None
         if r["chart_json"]:
             try:
-                chart_payload = json.loads(r["chart_json"]) if isinstance(r["chart_json"], str) else r["chart_json"]
+                chart_payload = chart_store.decode_chart(r["chart_json"])
                 birth_date = chart_payload.get("birth_date")
                 birth_time = chart_payload.get("birth_time")
                 place_display = chart_payload.get("location", {}).get("display_name")
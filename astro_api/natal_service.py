@@ -2,64 +2,103 @@
 
 from __future__ import annotations
 
-import json
+import datetime as dt
 from pathlib import Path
 from typing import Optional
 
-from kerykeion import ChartDataFactory, to_context
+from astro_api import chart_cache, chart_store, db, execution
+from astro_bot import geocoder, natal_engine
+from astro_bot.single_flight import AsyncSingleFlight
 
-from astro_api import db, config
-from astro_bot import natal_engine
-from astro_bot import openai_client
+_calculations = AsyncSingleFlight()
 
 
-def resolve_location(conn, query: str) -> natal_engine.LocationResult:
-    """Resolve location with cache; use OpenCage if not cached."""
-    norm_query = query.strip()
-    if not norm_query:
-        raise natal_engine.NatalError("Место рождения не задано.")
-    cached = db.get_cached_location(conn, norm_query)
-    if cached:
-        return natal_engine.LocationResult(
-            query=norm_query,
-            display_name=cached["display_name"] or norm_query,
-            lat=cached["lat"],
-            lng=cached["lng"],
-            tz_str=cached["tz_str"],
-        )
-    location = natal_engine.geocode_opencage_required(norm_query)
-    db.upsert_cached_location(
+async def resolve_location(conn, query: str) -> natal_engine.LocationResult:
+    """Geocode via the shared geocoder (normalized keys, aliases, negative cache)."""
+    return await geocoder.resolve(conn, query)
+
+
+def build_summary_prompt(context_text: str) -> str:
+    """Prompt for the beginner-friendly llm_summary of a chart."""
+    return (
+        "Ты профессиональный астролог. Объясни натальную карту простым языком для новичка. "
+        "Сделай 5–7 коротких пунктов: основные черты, сильные стороны, зоны роста. "
+        "Избегай жаргона, не пиши градусы/аспекты. Каждый пункт закончи строкой 'Основано на: ...' "
+        "со ссылкой на факт (Солнце в X, Луна в Y, дом, аспект). "
+        "В конце сделай самопроверку одной строкой: 'Проверка: все пункты опираются на перечисленные факты, без выдумок'. "
+        "Используй только факты из контекста ниже.\n\n"
+        f"{context_text}"
+    )
+
+
+def _location_dict(location: natal_engine.LocationResult) -> dict:
+    return {
+        "display_name": location.display_name,
+        "lat": location.lat,
+        "lng": location.lng,
+        "tz_str": location.tz_str,
+    }
+
+
+def _find_existing_chart(conn, *, telegram_user_id, birth_date, birth_time, place_query, location) -> Optional[dict]:
+    """Result of an earlier calculation with the same input, or None."""
+    existing_profile = db.find_profile(
         conn,
-        query=norm_query,
+        telegram_user_id=telegram_user_id,
+        birth_date=birth_date.isoformat(),
+        birth_time=birth_time.isoformat() if birth_time else None,
+        time_unknown=birth_time is None,
+        place_query=place_query,
         lat=location.lat,
         lng=location.lng,
         tz_str=location.tz_str,
-        display_name=location.display_name,
     )
-    return location
-
-
-def build_chart_payload(chart_data, location: natal_engine.LocationResult, birth_date, birth_time):
-    """Prepare chart JSON payload."""
-    subject_dump = chart_data.subject.model_dump()
-    aspects_dump = [a.model_dump() for a in chart_data.aspects]
+    if not existing_profile:
+        return None
+    chart_row = db.get_latest_chart_for_profile(conn, existing_profile["id"])
+    if not chart_row:
+        return None
     return {
-        "subject": subject_dump,
-        "aspects": aspects_dump,
-        "location": {
-            "display_name": location.display_name,
-            "lat": location.lat,
-            "lng": location.lng,
-            "tz_str": location.tz_str,
-        },
-        "birth_date": birth_date.isoformat(),
-        "birth_time": birth_time.isoformat() if birth_time else None,
+        "chart_id": chart_row["id"],
+        "profile_id": existing_profile["id"],
+        "summary": chart_row["summary"] or "",
+        "llm_summary": chart_row["llm_summary"] if "llm_summary" in chart_row.keys() else None,
+        "context_text": "",
+        "wheel_path": chart_row["wheel_path"],
+        "chart": chart_store.decode_chart(chart_row["chart_json"]),
+        "location": _location_dict(location),
     }
 
 
-def calculate_natal_chart(
+def _save_chart(
+    conn, *, telegram_user_id, label, birth_date, birth_time, place_query, location, chart_payload, summary
+) -> tuple[int, int]:
+    """Insert profile and chart; returns (profile_id, chart_id)."""
+    profile_id = db.insert_profile(
+        conn,
+        telegram_user_id=telegram_user_id,
+        label=label,
+        birth_date=birth_date.isoformat(),
+        birth_time=birth_time.isoformat() if birth_time else None,
+        time_unknown=birth_time is None,
+        place_query=place_query,
+        lat=location.lat,
+        lng=location.lng,
+        tz_str=location.tz_str,
+    )
+    chart_id = db.insert_chart(
+        conn,
+        profile_id=profile_id,
+        chart_json=chart_store.encode_chart(chart_payload),
+        wheel_path=None,
+        summary=summary,
+        positions=chart_store.chart_positions(chart_payload),
+    )
+    return profile_id, chart_id
+
+
+async def calculate_natal_chart(
     *,
-    conn,
     birth_date_str: str,
     birth_time_str: Optional[str],
     place_query: str,
@@ -68,111 +107,121 @@ def calculate_natal_chart(
     telegram_user_id: Optional[int] = None,
     label: Optional[str] = None,
 ) -> dict:
-    """Full cycle: parse, geocode, compute, save profile+chart, return data."""
-    charts_dir = charts_dir or natal_engine.config.get_charts_dir()
-    natal_engine.cleanup_old_svgs(charts_dir)
+    """Full cycle: parse, geocode, compute, save profile+chart, return data.
 
+    Identical concurrent requests (a double tap in the Mini App) share one
+    calculation and one stored profile/chart. The shared work runs on its own
+    pooled connection, so it is not cut short if the first caller goes away.
+    charts_dir is unused: the wheel is rendered lazily on first GET.
+    """
     birth_date = natal_engine.parse_birth_date(birth_date_str)
     birth_time = natal_engine.parse_birth_time(birth_time_str)
-    location = resolve_location(conn, place_query)
+    place_query = " ".join(place_query.split())
+    key = (telegram_user_id, user_identifier, label, birth_date, birth_time, place_query)
 
-    # Check for existing profile/chart
-    existing_profile = db.find_profile(
+    async def _shared() -> dict:
+        with db.get_pool().connection() as conn:
+            return await _calculate(
+                conn,
+                birth_date=birth_date,
+                birth_time=birth_time,
+                place_query=place_query,
+                user_identifier=user_identifier,
+                telegram_user_id=telegram_user_id,
+                label=label,
+            )
+
+    return await _calculations.do(key, _shared)
+
+
+async def _calculate(
+    conn,
+    *,
+    birth_date: dt.date,
+    birth_time: Optional[dt.time],
+    place_query: str,
+    user_identifier: str,
+    telegram_user_id: Optional[int],
+    label: Optional[str],
+) -> dict:
+    """One calculation on conn.
+
+    Blocking steps run on the execution stages (geo, db, chart), so the event
+    loop stays free; a full stage raises execution.StageOverloaded.
+    """
+    location = await execution.geo.run(resolve_location, conn, place_query)
+
+    existing = await execution.db.run(
+        _find_existing_chart,
         conn,
         telegram_user_id=telegram_user_id,
-        birth_date=birth_date.isoformat(),
-        birth_time=birth_time.isoformat() if birth_time else None,
-        time_unknown=birth_time is None,
+        birth_date=birth_date,
+        birth_time=birth_time,
         place_query=place_query,
-        lat=location.lat,
-        lng=location.lng,
-        tz_str=location.tz_str,
+        location=location,
     )
-    if existing_profile:
-        chart_row = db.get_latest_chart_for_profile(conn, existing_profile["id"])
-        if chart_row:
-            return {
-                "chart_id": chart_row["id"],
-                "profile_id": existing_profile["id"],
-                "summary": chart_row["summary"] or "",
-                "llm_summary": chart_row["llm_summary"] if "llm_summary" in chart_row.keys() else None,
-                "context_text": "",
-                "wheel_path": chart_row["wheel_path"],
-                "chart": json.loads(chart_row["chart_json"]),
-                "location": {
-                    "display_name": location.display_name,
-                    "lat": location.lat,
-                    "lng": location.lng,
-                    "tz_str": location.tz_str,
-                },
-            }
-
-    # Build subject and chart data under lock inside natal_engine
-    subject = natal_engine.build_subject(
+    if existing:
+        return existing
+
+    # Same birth moment and place computed before (by anyone) -> no ephemeris work
+    cache_key = chart_cache.cache_key(birth_date, birth_time, location)
+    cached = await execution.db.run(
+        chart_cache.get,
+        conn,
+        cache_key,
         name=user_identifier,
+        location=location,
         birth_date=birth_date,
         birth_time=birth_time,
-        location=location,
-    )
-    chart_data = ChartDataFactory.create_natal_chart_data(subject)
-    summary = natal_engine.build_summary(subject, chart_data.aspects, location, birth_date, birth_time)
-    context_text = to_context(subject)
-    svg_path = natal_engine.render_svg(
-        subject, charts_dir, f"natal_{user_identifier}_{chart_data.subject.julian_day}"
     )
-
-    llm_summary = None
-    if config.get_openai_api_key():
-        prompt = (
-            "Ты профессиональный астролог. Объясни натальную карту простым языком для новичка. "
-            "Сделай 5–7 коротких пунктов: основные черты, сильные стороны, зоны роста. "
-            "Избегай жаргона, не пиши градусы/аспекты. Каждый пункт закончи строкой 'Основано на: ...' "
-            "со ссылкой на факт (Солнце в X, Луна в Y, дом, аспект). "
-            "В конце сделай самопроверку одной строкой: 'Проверка: все пункты опираются на перечисленные факты, без выдумок'. "
-            "Используй только факты из контекста ниже.\n\n"
-            f"{context_text}"
+    if cached:
+        chart_payload = cached.payload
+        summary = cached.summary
+        context_text = cached.context_text
+    else:
+        # Ephemeris in a chart_engine worker; the wheel is rendered lazily on first GET
+        chart = await execution.chart.run(
+            natal_engine.compute_natal,
+            user_identifier,
+            birth_date,
+            birth_time,
+            location,
+        )
+        await execution.db.run(
+            chart_cache.put,
+            conn,
+            cache_key,
+            chart,
+            name=user_identifier,
+            location=location,
+            birth_date=birth_date,
+            birth_time=birth_time,
         )
-        try:
-            llm_summary = openai_client.ask_gpt(prompt, role="астролог")
-        except Exception:
-            llm_summary = None
+        chart_payload = chart.payload
+        summary = chart.summary
+        context_text = chart.context_text
 
-    profile_id = db.insert_profile(
+    profile_id, chart_id = await execution.db.run(
+        _save_chart,
         conn,
         telegram_user_id=telegram_user_id,
         label=label,
-        birth_date=birth_date.isoformat(),
-        birth_time=birth_time.isoformat() if birth_time else None,
-        time_unknown=birth_time is None,
+        birth_date=birth_date,
+        birth_time=birth_time,
         place_query=place_query,
-        lat=location.lat,
-        lng=location.lng,
-        tz_str=location.tz_str,
-    )
-
-    chart_payload = build_chart_payload(chart_data, location, birth_date, birth_time)
-    chart_json = json.dumps(chart_payload, ensure_ascii=False)
-    chart_id = db.insert_chart(
-        conn,
-        profile_id=profile_id,
-        chart_json=chart_json,
-        wheel_path=str(svg_path),
+        location=location,
+        chart_payload=chart_payload,
         summary=summary,
-        llm_summary=llm_summary,
     )
 
     return {
         "chart_id": chart_id,
         "profile_id": profile_id,
         "summary": summary,
-        "llm_summary": llm_summary,
+        # generated by the llm_summary background job (see astro_api.jobs)
+        "llm_summary": None,
         "context_text": context_text,
-        "wheel_path": str(svg_path),
+        "wheel_path": None,
         "chart": chart_payload,
-        "location": {
-            "display_name": location.display_name,
-            "lat": location.lat,
-            "lng": location.lng,
-            "tz_str": location.tz_str,
-        },
+        "location": _location_dict(location),
     }
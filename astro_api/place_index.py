@@ -0,0 +1,130 @@
+"""In-memory prefix index for place autocomplete (/api/geo/suggest).
+
+Two sources are searched:
+
+- places users have already geocoded: every key in geo_aliases is held in a
+  sorted list next to its place. The list is loaded once and then topped up
+  with aliases whose rowid is above the last one seen. The geocoder writes
+  aliases with INSERT OR REPLACE, so every write gets a new rowid;
+- the offline gazetteer, which is already sorted by key and memory-mapped.
+
+Lookups are bisects over sorted keys and never leave the process.
+"""
+
+from __future__ import annotations
+
+import bisect
+import sqlite3
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from astro_bot import geocoder
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+# gazetteer keys inspected per query before ranking by population
+SCAN_LIMIT = 400
+# the same place from different sources: coordinates within ~5 km
+DEDUP_DEGREES = 0.05
+
+Suggestion = Dict[str, object]
+
+
+class PlaceIndex:
+    """Sorted keys of cached places plus the gazetteer; safe to share between threads."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._keys: List[str] = []
+        self._places: List[Suggestion] = []
+        self._last_rowid = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def refresh(self, conn: sqlite3.Connection) -> int:
+        """Load aliases written since the last refresh; returns how many were added."""
+        rows = conn.execute(
+            """
+            SELECT a.rowid, a.key, p.display_name, p.lat, p.lng, p.tz_str
+            FROM geo_aliases a JOIN geo_places p ON p.id = a.place_id
+            WHERE a.rowid > ?
+            ORDER BY a.rowid
+            """,
+            (self._last_rowid,),
+        ).fetchall()
+        if not rows:
+            return 0
+        with self._lock:
+            for rowid, key, display_name, lat, lng, tz_str in rows:
+                if rowid <= self._last_rowid:
+                    continue
+                place = {"display_name": display_name, "lat": lat, "lng": lng, "tz_str": tz_str}
+                index = bisect.bisect_left(self._keys, key)
+                if index < len(self._keys) and self._keys[index] == key:
+                    self._places[index] = place
+                else:
+                    self._keys.insert(index, key)
+                    self._places.insert(index, place)
+                self._last_rowid = rowid
+        return len(rows)
+
+    def _cached(self, prefix: str, limit: int) -> List[Tuple[str, Suggestion]]:
+        with self._lock:
+            index = bisect.bisect_left(self._keys, prefix)
+            found = []
+            while index < len(self._keys) and len(found) < limit and self._keys[index].startswith(prefix):
+                found.append((self._keys[index], self._places[index]))
+                index += 1
+        return found
+
+    def suggest(self, query: str, limit: int = DEFAULT_LIMIT) -> List[Suggestion]:
+        """Ranked places whose name starts with the query.
+
+        Exact names first, then places users have already picked, then
+        gazetteer cities by population.
+        """
+        prefix = geocoder.normalize_query(query)
+        if not prefix:
+            return []
+        ranked: List[Tuple[tuple, Suggestion]] = []
+        for key, place in self._cached(prefix, SCAN_LIMIT):
+            ranked.append(((key != prefix, 0, 0, key), place))
+        offline = geocoder.offline_index()
+        if offline is not None:
+            for key, place in offline.prefix(prefix, SCAN_LIMIT):
+                item = {
+                    "display_name": place.display_name,
+                    "lat": place.lat,
+                    "lng": place.lng,
+                    "tz_str": place.tz_str,
+                }
+                ranked.append(((key != prefix, 1, -place.population, key), item))
+        ranked.sort(key=lambda pair: pair[0])
+
+        suggestions: List[Suggestion] = []
+        for _, place in ranked:
+            if any(
+                abs(place["lat"] - kept["lat"]) < DEDUP_DEGREES and abs(place["lng"] - kept["lng"]) < DEDUP_DEGREES
+                for kept in suggestions
+            ):
+                continue
+            suggestions.append(place)
+            if len(suggestions) >= limit:
+                break
+        return suggestions
+
+
+_index: Optional[PlaceIndex] = None
+_index_path: Optional[Path] = None
+_index_lock = Lock()
+
+
+def get_index(db_path: Path) -> PlaceIndex:
+    """Process-wide index for the database at db_path (rebuilt when the path changes)."""
+    global _index, _index_path
+    with _index_lock:
+        if _index is None or _index_path != db_path:
+            _index, _index_path = PlaceIndex(), db_path
+        return _index
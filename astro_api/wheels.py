@@ -0,0 +1,249 @@
+"""Wheel (SVG) files for stored charts.
+
+The database is the system of record; files on disk are only a cache. A wheel
+is rendered on first access and re-rendered whenever its file is gone
+(e.g. evicted by the wheel janitor) from the stored chart: both legacy JSON
+dumps and compact chart_store rows decode to subjects the drawer accepts, so
+no ephemeris is computed. Only a row that can't be drawn falls back to a full
+recalculation from its birth data or the stored profiles.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi.responses import FileResponse
+
+from astro_api import chart_store, compatibility_service, config, db, execution, http_cache
+from astro_bot import natal_engine, wheel_janitor, wheel_store
+from astro_bot.single_flight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+_renders = AsyncSingleFlight()
+
+
+async def single_flight(key: str, factory: Callable[[], Awaitable[Optional[Path]]]) -> Optional[Path]:
+    """Run factory once per key; concurrent callers await the same result."""
+    return await _renders.do(key, factory)
+
+
+def _load(decode: Callable, raw) -> Optional[dict]:
+    try:
+        data = decode(raw)
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _existing(wheel_path: Optional[str]) -> Optional[Path]:
+    if not wheel_path:
+        return None
+    path = Path(wheel_path)
+    if not path.exists():
+        return None
+    wheel_janitor.touch(path)
+    return path
+
+
+def _birth_data_from_payload(payload: dict):
+    """(birth_date, birth_time, location) from a decoded chart payload, or None."""
+    location = payload.get("location") or {}
+    if not payload.get("birth_date") or location.get("lat") is None or location.get("lng") is None:
+        return None
+    location = natal_engine.LocationResult(
+        query=location.get("display_name") or "",
+        display_name=location.get("display_name") or "",
+        lat=location["lat"],
+        lng=location["lng"],
+        tz_str=location.get("tz_str"),
+    )
+    birth_time = dt.time.fromisoformat(payload["birth_time"]) if payload.get("birth_time") else None
+    return dt.date.fromisoformat(payload["birth_date"]), birth_time, location
+
+
+def _birth_data_from_profile(profile):
+    """(birth_date, birth_time, location) from a profiles row."""
+    location = natal_engine.LocationResult(
+        query=profile["place_query"] or "",
+        display_name=profile["place_query"] or "",
+        lat=profile["lat"],
+        lng=profile["lng"],
+        tz_str=profile["tz_str"],
+    )
+    birth_time = dt.time.fromisoformat(profile["birth_time"]) if profile["birth_time"] else None
+    return dt.date.fromisoformat(profile["birth_date"]), birth_time, location
+
+
+async def ensure_natal_wheel(row, charts_dir: Optional[Path] = None) -> Optional[Path]:
+    """Return the chart wheel, rendering it if it was never drawn or its file is gone.
+
+    Returns None if neither chart_json nor the profile can rebuild the chart.
+    The render takes its own pooled connection: single flight shields it, so it
+    may still be writing after the request (and its connection) is gone.
+    """
+    existing = _existing(row["wheel_path"])
+    if existing:
+        return existing
+    charts_dir = charts_dir or config.get_charts_dir()
+    chart_id = row["id"]
+
+    async def _render() -> Optional[Path]:
+        with db.get_pool().connection() as conn:
+            wheel_path = None
+            payload = _load(chart_store.decode_chart, row["chart_json"])
+            if payload and isinstance(payload.get("subject"), dict):
+                try:
+                    wheel_path = await execution.chart.run(natal_engine.render_payload_svg, payload, charts_dir)
+                except execution.StageOverloaded:
+                    raise
+                except Exception:  # pylint: disable=broad-except
+                    logger.warning("chart_json of chart_id=%s can't be rendered, trying profile", chart_id)
+            if wheel_path is None:
+                birth_data = _birth_data_from_payload(payload) if payload else None
+                name = str((payload or {}).get("subject", {}).get("name") or "guest")
+                if birth_data is None:
+                    profile = db.get_profile(conn, row["profile_id"]) if row["profile_id"] else None
+                    if not profile:
+                        return None
+                    birth_data = _birth_data_from_profile(profile)
+                    name = str(profile["telegram_user_id"] or "guest")
+                birth_date, birth_time, location = birth_data
+                try:
+                    chart = await execution.chart.run(
+                        natal_engine.compute_natal, name, birth_date, birth_time, location, charts_dir
+                    )
+                except execution.StageOverloaded:
+                    raise
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to render wheel for chart_id=%s", chart_id)
+                    return None
+                wheel_path = chart.svg_path
+            db.set_chart_wheel_path(conn, chart_id, str(wheel_path))
+            wheel_janitor.track(conn, wheel_path)
+            return wheel_path
+
+    return await single_flight(f"natal:{chart_id}", _render)
+
+
+async def ensure_compatibility_wheel(row, charts_dir: Optional[Path] = None) -> Optional[Path]:
+    """Same as ensure_natal_wheel for compatibility_runs rows."""
+    existing = _existing(row["wheel_path"])
+    if existing:
+        return existing
+    charts_dir = charts_dir or config.get_charts_dir()
+    comp_id = row["id"]
+
+    async def _render() -> Optional[Path]:
+        with db.get_pool().connection() as conn:
+            wheel_path = None
+            synastry = _load(chart_store.decode_synastry, row["synastry_json"])
+            if synastry and synastry.get("first_subject") and synastry.get("second_subject"):
+                try:
+                    wheel_path = await execution.chart.run(compatibility_service.render_synastry_svg, synastry, charts_dir)
+                except execution.StageOverloaded:
+                    raise
+                except Exception:  # pylint: disable=broad-except
+                    logger.warning("synastry_json of compatibility_id=%s can't be rendered, trying profiles", comp_id)
+            if wheel_path is None:
+                self_profile = db.get_profile(conn, row["self_profile_id"]) if row["self_profile_id"] else None
+                partner_profile = db.get_profile(conn, row["partner_profile_id"]) if row["partner_profile_id"] else None
+                if not self_profile or not partner_profile:
+                    return None
+                try:
+                    _, wheel_path = await execution.chart.run(
+                        compatibility_service.compute_synastry,
+                        row["user_id"] or "self",
+                        *_birth_data_from_profile(self_profile),
+                        *_birth_data_from_profile(partner_profile),
+                        charts_dir,
+                    )
+                except execution.StageOverloaded:
+                    raise
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Failed to render wheel for compatibility_id=%s", comp_id)
+                    return None
+            db.set_compatibility_wheel_path(conn, comp_id, str(wheel_path))
+            wheel_janitor.track(conn, wheel_path)
+            return wheel_path
+
+    return await single_flight(f"compat:{comp_id}", _render)
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Accept-Encoding -> {coding: q}."""
+    accepted: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: Optional[str], svg_path: Path) -> Optional[str]:
+    """Best precompressed variant the client accepts and we have on disk (br > gzip)."""
+    accepted = parse_accept_encoding(accept_encoding)
+    for encoding in ("br", "gzip"):
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > 0 and wheel_store.variant_path(svg_path, encoding).exists():
+            return encoding
+    return None
+
+
+def wheel_url(base: str, wheel_path: Optional[str]) -> str:
+    """Wheel URL, versioned with the content key once the wheel is in the store."""
+    key = wheel_store.key_from_path(wheel_path)
+    return f"{base}?v={key}" if key else base
+
+
+def wheel_etag(key: str, encoding: Optional[str] = None) -> str:
+    """Strong ETag per representation: same content key, different bytes per encoding."""
+    return f'"{key}-{encoding}"' if encoding else f'"{key}"'
+
+
+def _cache_control(key: Optional[str], version: Optional[str]) -> str:
+    return http_cache.IMMUTABLE if key and version == key else http_cache.REVALIDATE
+
+
+def not_modified(wheel_path: Optional[str], if_none_match: Optional[str], version: Optional[str]):
+    """304 for a stored wheel the client already has, decided from the row alone (no disk access).
+
+    All representations of one key carry the same SVG, so any of its ETags matches.
+    """
+    key = wheel_store.key_from_path(wheel_path)
+    if key is None:
+        return None
+    etags = [wheel_etag(key, encoding) for encoding in (None, *wheel_store.ENCODING_SUFFIXES)]
+    etag = http_cache.matching_etag(if_none_match, etags)
+    if etag is None:
+        return None
+    return http_cache.not_modified(etag, _cache_control(key, version), vary="Accept-Encoding")
+
+
+def wheel_response(svg_path: Path, accept_encoding: Optional[str], version: Optional[str] = None) -> FileResponse:
+    """Serve the wheel, precompressed if the client accepts it.
+
+    Content-addressed wheels get a strong ETag and, on versioned URLs,
+    an immutable Cache-Control; legacy files keep Starlette's stat-based ETag.
+    """
+    encoding = choose_encoding(accept_encoding, svg_path)
+    key = wheel_store.key_from_path(svg_path)
+    headers = {"Vary": "Accept-Encoding", "Cache-Control": _cache_control(key, version)}
+    if key:
+        headers["ETag"] = wheel_etag(key, encoding)
+    if encoding is None:
+        return FileResponse(svg_path, media_type="image/svg+xml", headers=headers)
+    headers["Content-Encoding"] = encoding
+    return FileResponse(wheel_store.variant_path(svg_path, encoding), media_type="image/svg+xml", headers=headers)
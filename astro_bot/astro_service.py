@@ -7,7 +7,7 @@ from typing import Optional
 from astro_bot import openai_client
 
 
-def generate_natal_report(
+async def generate_natal_report(
     *,
     birth_date: str,
     birth_time: Optional[str],
@@ -20,4 +20,4 @@ def generate_natal_report(
         "Избегай сложного жаргона, дай 3-4 пункта про характер/ресурсы и 2-3 практических совета. "
         f"Дата: {birth_date}; Время: {time_info}; Место: {birth_place}."
     )
-    return openai_client.ask_gpt(prompt, role="астролог")
+    return await openai_client.ask_gpt(prompt, role="астролог")
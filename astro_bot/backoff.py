@@ -0,0 +1,23 @@
+"""Паузы между повторами HTTP-запросов (OpenAI, OpenCage).
+
+Экспоненциальный рост с полным джиттером: пауза выбирается случайно от нуля
+до base·2^attempt, но не больше cap, чтобы повторы многих клиентов после
+общего сбоя не приходили одновременно. Retry-After от сервера поднимает
+паузу до указанного значения (тоже не больше cap).
+"""
+
+from __future__ import annotations
+
+import random
+from typing import Optional
+
+
+def delay(attempt: int, retry_after: Optional[str] = None, *, base: float, cap: float) -> float:
+    """Пауза в секундах перед повтором номер attempt (с нуля)."""
+    seconds = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after:
+        try:
+            seconds = max(seconds, min(float(retry_after), cap))
+        except ValueError:
+            pass
+    return seconds
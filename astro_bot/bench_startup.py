@@ -0,0 +1,88 @@
+"""Бюджет холодного старта бота и API по `python -X importtime`.
+
+    python -m astro_bot.bench_startup
+    python -m astro_bot.bench_startup --repeat 7 --budget astro_api.main=500
+
+Каждая точка входа импортируется в чистом процессе несколько раз; берётся
+медиана суммарного времени импорта. Проверка не проходит (код выхода 1),
+если медиана больше бюджета или при старте подгрузился модуль из списка
+тяжёлых — они должны импортироваться лениво (см. astro_bot/warmup.py).
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+# точка входа → бюджет, мс (с запасом на медленные машины CI)
+BUDGETS_MS: Dict[str, float] = {
+    "astro_bot.bot": 350.0,
+    "astro_api.main": 700.0,
+}
+HEAVY_MODULES: Sequence[str] = ("kerykeion", "timezonefinder", "swisseph")
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def measure(module: str) -> Tuple[float, List[Tuple[float, str]]]:
+    """Импортировать module в чистом процессе: (суммарно мс, [(мс, модуль)])."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    total = 0.0
+    loaded: List[Tuple[float, str]] = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000
+        name = match.group(4)
+        loaded.append((cumulative_ms, name))
+        if name == module:
+            total = cumulative_ms
+    return total, loaded
+
+
+def heavy_imports(loaded: List[Tuple[float, str]]) -> List[str]:
+    return sorted({name for _, name in loaded if name.split(".")[0] in HEAVY_MODULES})
+
+
+def check(budgets: Dict[str, float], repeat: int, top: int = 5) -> bool:
+    ok = True
+    for module, budget in budgets.items():
+        runs = [measure(module) for _ in range(repeat)]
+        median = statistics.median(total for total, _ in runs)
+        loaded = runs[-1][1]
+        heavy = heavy_imports(loaded)
+        passed = median <= budget and not heavy
+        ok = ok and passed
+        print(f"{'OK  ' if passed else 'FAIL'} {module}: {median:.0f} мс (бюджет {budget:.0f} мс)")
+        for ms, name in sorted(loaded, reverse=True)[1:top + 1]:
+            print(f"       {ms:8.1f} мс  {name}")
+        if heavy:
+            print(f"       тяжёлые модули при старте: {', '.join(heavy)}")
+    return ok
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Проверка бюджета холодного старта")
+    parser.add_argument("--repeat", type=int, default=5, help="запусков на точку входа (медиана)")
+    parser.add_argument("--budget", action="append", default=[], metavar="MODULE=MS", help="переопределить бюджет")
+    args = parser.parse_args(argv)
+
+    budgets = dict(BUDGETS_MS)
+    for item in args.budget:
+        module, _, ms = item.partition("=")
+        budgets[module] = float(ms)
+    return 0 if check(budgets, max(1, args.repeat)) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,10 @@
 """Простой echo-бот на базе python-telegram-bot."""
-import asyncio
 import datetime as dt
 import json
 import logging
 import sys
-from typing import Optional
+import time
+from typing import AsyncIterator, Optional
 
 from telegram import (
     Update,
@@ -14,6 +14,7 @@ from telegram import (
     InlineKeyboardMarkup,
     MenuButtonWebApp,
 )
+from telegram.error import BadRequest
 from telegram.ext import (
     Application,
     ApplicationBuilder,
@@ -24,11 +25,13 @@ from telegram.ext import (
     filters,
 )
 
-from astro_bot import config, db, repositories, openai_client, natal_engine
+from astro_bot import chart_engine, config, db, geocoder, repositories, openai_client, natal_engine, warmup, wheel_janitor
 
 logger = logging.getLogger(__name__)
 ASKING_QUESTION = 1
 NATAL_DATE, NATAL_TIME, NATAL_PLACE = range(2, 5)
+# Telegram ограничивает частоту правок сообщения, поэтому обновляем не чаще раза в секунду
+STREAM_EDIT_INTERVAL = 1.0
 
 BOT_COMMANDS = [
     BotCommand("start", "Приветствие"),
@@ -121,14 +124,12 @@ async def receive_question(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     db_conn = context.application.bot_data.get("db_conn")
 
     try:
-        answer = openai_client.ask_gpt(question_text)
+        answer = await stream_reply(update.message, openai_client.stream_gpt(question_text))
     except openai_client.OpenAIError as exc:
         logger.error("Ошибка OpenAI: %s", exc)
         await update.message.reply_text("Не удалось получить ответ от модели. Попробуйте позже.")
         return ConversationHandler.END
 
-    await update.message.reply_text(answer)
-
     if db_conn is None:
         logger.warning("Пропущено логирование запроса: нет соединения с БД")
         return ConversationHandler.END
@@ -232,14 +233,15 @@ async def natal_place(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     birth_place = data.get("place", "")
 
     try:
-        result = await asyncio.to_thread(
-            natal_engine.generate_natal_chart,
-            birth_date_str=birth_date,
-            birth_time_str=birth_time,
-            place_query=birth_place,
-            db_conn=db_conn,
-            user_identifier=str(user_id),
-            charts_dir=config.get_charts_dir(),
+        location = await geocoder.resolve(db_conn, birth_place)
+        # расчёт и круг — в воркере chart_engine; ждём результат, не занимая поток
+        result = await chart_engine.get_engine().run(
+            natal_engine.compute_natal,
+            str(user_id),
+            natal_engine.parse_birth_date(birth_date),
+            natal_engine.parse_birth_time(birth_time),
+            location,
+            config.get_charts_dir(),
         )
     except natal_engine.NatalError as exc:
         await update.message.reply_text(str(exc))
@@ -249,6 +251,7 @@ async def natal_place(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         await update.message.reply_text("Не удалось сформировать разбор. Попробуйте позже.")
         return ConversationHandler.END
 
+    wheel_janitor.touch(result.svg_path)
     for part in chunk_text(result.summary):
         await update.message.reply_text(part)
 
@@ -256,7 +259,7 @@ async def natal_place(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
         with result.svg_path.open("rb") as svg_file:
             await update.message.reply_document(
                 document=svg_file,
-                filename=result.svg_path.name,
+                filename="natal_chart.svg",
                 caption="Круг натальной карты (SVG)",
             )
     except Exception as exc:  # pylint: disable=broad-except
@@ -276,16 +279,17 @@ async def natal_place(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
 
     if config.get_openai_api_key():
         try:
-            llm_answer = openai_client.ask_gpt(
-                question=(
-                    "Сделай профессиональный астрологический разбор на основе фактических позиций:\n"
-                    f"{result.context_text}\n"
-                    "Дай 4-6 осмысленных пунктов без выдуманных позиций."
+            llm_answer = await stream_reply(
+                update.message,
+                openai_client.stream_gpt(
+                    question=(
+                        "Сделай профессиональный астрологический разбор на основе фактических позиций:\n"
+                        f"{result.context_text}\n"
+                        "Дай 4-6 осмысленных пунктов без выдуманных позиций."
+                    ),
+                    role="астролог",
                 ),
-                role="астролог",
             )
-            for part in chunk_text(llm_answer):
-                await update.message.reply_text(part)
             repositories.log_request(
                 conn=db_conn,
                 user_id=user_id,
@@ -322,6 +326,26 @@ async def set_commands(application: Application) -> None:
     except Exception as exc:  # pylint: disable=broad-except
         logger.warning("Не удалось установить кнопку меню WebApp: %s", exc)
 
+
+async def on_startup(application: Application) -> None:
+    """Меню команд, уборщик SVG-кругов, фоновый прогрев kerykeion/timezonefinder (бот уже отвечает)."""
+    await set_commands(application)
+    janitor = wheel_janitor.WheelJanitor(db.get_connection, config.get_charts_dir())
+    janitor.start()
+    application.bot_data["wheel_janitor"] = janitor
+    application.bot_data["warmup_task"] = warmup.warm_up_in_background()
+
+
+async def close_clients(application: Application) -> None:
+    """Дождаться прогрева, остановить уборщик кругов, закрыть пулы соединений OpenAI и геокодера."""
+    await warmup.stop_warm_up(application.bot_data.get("warmup_task"))
+    janitor = application.bot_data.get("wheel_janitor")
+    if janitor is not None:
+        await janitor.stop()
+    await openai_client.aclose()
+    await geocoder.aclose()
+
+
 async def history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Вывести последние N запросов пользователя."""
     user_id = ensure_user(update, context)
@@ -342,16 +366,7 @@ async def history(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             await update.message.reply_text("Введите число после /history, например /history 5.")
             return
 
-    rows = db_conn.execute(
-        """
-        SELECT type, input_payload, response_text, created_at
-        FROM requests
-        WHERE user_id = ?
-        ORDER BY created_at DESC
-        LIMIT ?
-        """,
-        (user_id, limit),
-    ).fetchall()
+    rows = repositories.list_requests(db_conn, user_id=user_id, limit=limit)
 
     if not rows:
         await update.message.reply_text("История пуста.")
@@ -407,6 +422,71 @@ def chunk_text(text: str, max_len: int = 3500) -> list[str]:
     return chunks
 
 
+def split_point(text: str, max_len: int) -> int:
+    """Где разрезать слишком длинный текст: по последнему переносу строки, иначе по max_len."""
+    cut = text.rfind("\n", 0, max_len)
+    return cut if cut > 0 else max_len
+
+
+async def _edit(message, text: str) -> None:
+    try:
+        await message.edit_text(text)
+    except BadRequest as exc:
+        # текст не изменился с прошлой правки — не ошибка
+        if "not modified" not in str(exc).lower():
+            raise
+
+
+async def stream_reply(
+    message,
+    deltas: AsyncIterator[str],
+    max_len: int = 3500,
+    interval: float = STREAM_EDIT_INTERVAL,
+) -> str:
+    """Показывать ответ по мере генерации, правя сообщение не чаще interval секунд.
+
+    Длинный ответ продолжается в новых сообщениях (по max_len символов).
+    Возвращает полный текст ответа.
+    """
+    parts: list[str] = []
+    sent = None
+    shown = ""
+    offset = 0  # начало текста текущего сообщения
+    last_edit = 0.0
+
+    async def flush(text: str) -> None:
+        nonlocal sent, shown, offset
+        while len(text) - offset > max_len:
+            cut = offset + split_point(text[offset:], max_len)
+            head = text[offset:cut].rstrip()
+            if sent is None:
+                await message.reply_text(head)
+            elif head != shown:
+                await _edit(sent, head)
+            sent, shown = None, ""
+            offset = cut
+            while offset < len(text) and text[offset] == "\n":
+                offset += 1
+        current = text[offset:].rstrip()
+        if not current or current == shown:
+            return
+        if sent is None:
+            sent = await message.reply_text(current)
+        else:
+            await _edit(sent, current)
+        shown = current
+
+    async for delta in deltas:
+        parts.append(delta)
+        now = time.monotonic()
+        if now - last_edit >= interval:
+            await flush("".join(parts))
+            last_edit = now
+    answer = "".join(parts).strip()
+    await flush(answer)
+    return answer
+
+
 def build_webapp_markup(url: str) -> InlineKeyboardMarkup:
     """Собрать inline-клавиатуру для открытия WebApp."""
     return InlineKeyboardMarkup(
@@ -465,14 +545,12 @@ def run_bot(token: str) -> None:
     application: Application = (
         ApplicationBuilder()
         .token(token)
-        .post_init(set_commands)
+        .post_init(on_startup)
+        .post_shutdown(close_clients)
         .build()
     )
 
-    # Подготовка каталога карт (очистка старых файлов)
-    natal_engine.cleanup_old_svgs(config.get_charts_dir())
-
-    # Инициализация БД и сохранение соединения в bot_data
+    # Миграции схемы (один раз при старте) и сохранение соединения в bot_data
     db_conn = db.get_connection()
     db.init_db(db_conn)
     application.bot_data["db_conn"] = db_conn
@@ -517,6 +595,7 @@ def run_bot(token: str) -> None:
     try:
         application.run_polling()
     finally:
+        chart_engine.shutdown_engine()
         db_conn.close()
 
 
@@ -0,0 +1,125 @@
+"""Пул процессов для расчёта карт.
+
+Swiss Ephemeris держит глобальное состояние, поэтому раньше все расчёты шли
+под одним замком и занимали одно ядро. Здесь каждый воркер — отдельный процесс
+со своим состоянием эфемерид, и пропускная способность растёт с числом ядер.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import logging
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from typing import Any, Callable, Optional
+
+from astro_bot import config
+
+logger = logging.getLogger(__name__)
+
+_engine: Optional["ChartEngine"] = None
+_engine_lock = Lock()
+
+
+def _init_worker() -> None:
+    """Прогреть kerykeion в воркере, чтобы первый расчёт не платил за импорт."""
+    import kerykeion  # noqa: F401  pylint: disable=import-outside-toplevel,unused-import
+
+
+class ChartEngine:
+    """Пул воркеров для расчётов Swiss Ephemeris.
+
+    workers=0 — расчёт в вызывающем потоке под общим замком (для отладки и тестов).
+    """
+
+    def __init__(self, workers: int, max_tasks_per_child: Optional[int] = None):
+        self.workers = max(0, workers)
+        self.max_tasks_per_child = max_tasks_per_child
+        self._inline_lock = Lock()
+        self._pool_lock = Lock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_init_worker,
+                    max_tasks_per_child=self.max_tasks_per_child,
+                )
+                logger.info(
+                    "Пул расчёта карт запущен: воркеров=%s, задач на воркер=%s",
+                    self.workers,
+                    self.max_tasks_per_child,
+                )
+            return self._executor
+
+    def _reset_executor(self) -> None:
+        with self._pool_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn: Callable[..., Any], /, *args, **kwargs) -> Future:
+        """Поставить расчёт в пул и вернуть Future.
+
+        fn и аргументы должны быть picklable (функции уровня модуля).
+        """
+        if self.workers == 0:
+            future: Future = Future()
+            try:
+                with self._inline_lock:
+                    future.set_result(fn(*args, **kwargs))
+            except BaseException as exc:  # pylint: disable=broad-except
+                future.set_exception(exc)
+            return future
+        try:
+            return self._get_executor().submit(fn, *args, **kwargs)
+        except BrokenProcessPool:
+            logger.warning("Пул расчёта карт сломан, пересоздаём")
+            self._reset_executor()
+            return self._get_executor().submit(fn, *args, **kwargs)
+
+    def warm_up(self) -> None:
+        """Запустить все воркеры заранее (каждый импортирует kerykeion в _init_worker)."""
+        if self.workers == 0:
+            _init_worker()
+            return
+        for future in [self.submit(_init_worker) for _ in range(self.workers)]:
+            future.result()
+
+    async def run(self, fn: Callable[..., Any], /, *args, **kwargs) -> Any:
+        """Асинхронно дождаться результата расчёта, не блокируя event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def shutdown(self, wait: bool = True) -> None:
+        with self._pool_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+
+def get_engine() -> ChartEngine:
+    """Вернуть общий пул (создаётся при первом обращении по настройкам из env)."""
+    global _engine  # pylint: disable=global-statement
+    with _engine_lock:
+        if _engine is None:
+            _engine = ChartEngine(
+                workers=config.get_engine_workers(),
+                max_tasks_per_child=config.get_engine_max_tasks_per_child(),
+            )
+        return _engine
+
+
+def shutdown_engine(wait: bool = True) -> None:
+    """Остановить общий пул (при завершении бота/API)."""
+    global _engine  # pylint: disable=global-statement
+    with _engine_lock:
+        engine, _engine = _engine, None
+    if engine is not None:
+        engine.shutdown(wait=wait)
+
+
+atexit.register(shutdown_engine, False)
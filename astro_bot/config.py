@@ -22,6 +22,25 @@ CHARTS_DIR_ENV: Final[str] = "ASTRO_BOT_CHARTS_DIR"
 WEBAPP_PUBLIC_URL_ENV: Final[str] = "WEBAPP_PUBLIC_URL"
 WEBAPP_MENU_TEXT_ENV: Final[str] = "WEBAPP_MENU_TEXT"
 OPENCAGE_API_KEY_ENV: Final[str] = "OPENCAGE_API_KEY"
+OPENAI_MAX_CONCURRENCY_ENV: Final[str] = "OPENAI_MAX_CONCURRENCY"
+OPENAI_MAX_RETRIES_ENV: Final[str] = "OPENAI_MAX_RETRIES"
+OPENAI_TIMEOUT_ENV: Final[str] = "OPENAI_TIMEOUT_SECONDS"
+OPENAI_BREAKER_THRESHOLD_ENV: Final[str] = "OPENAI_BREAKER_THRESHOLD"
+OPENAI_BREAKER_RESET_ENV: Final[str] = "OPENAI_BREAKER_RESET_SECONDS"
+OPENAI_CACHE_PATH_ENV: Final[str] = "OPENAI_CACHE_PATH"
+OPENAI_CACHE_TTL_ENV: Final[str] = "OPENAI_CACHE_TTL_SECONDS"
+OPENAI_CACHE_MAX_ENTRIES_ENV: Final[str] = "OPENAI_CACHE_MAX_ENTRIES"
+OPENAI_CACHE_MEMORY_SIZE_ENV: Final[str] = "OPENAI_CACHE_MEMORY_SIZE"
+GEO_NEGATIVE_TTL_ENV: Final[str] = "GEO_NEGATIVE_TTL_SECONDS"
+GEO_TIMEOUT_ENV: Final[str] = "GEO_TIMEOUT_SECONDS"
+GEO_MAX_RETRIES_ENV: Final[str] = "GEO_MAX_RETRIES"
+GAZETTEER_PATH_ENV: Final[str] = "ASTRO_BOT_GAZETTEER_PATH"
+ENGINE_WORKERS_ENV: Final[str] = "ASTRO_BOT_ENGINE_WORKERS"
+WARMUP_ENV: Final[str] = "ASTRO_BOT_WARMUP"
+WHEEL_MAX_AGE_DAYS_ENV: Final[str] = "ASTRO_BOT_WHEEL_MAX_AGE_DAYS"
+WHEEL_QUOTA_MB_ENV: Final[str] = "ASTRO_BOT_WHEEL_QUOTA_MB"
+WHEEL_JANITOR_INTERVAL_ENV: Final[str] = "ASTRO_BOT_WHEEL_JANITOR_INTERVAL_SECONDS"
+ENGINE_MAX_TASKS_ENV: Final[str] = "ASTRO_BOT_ENGINE_MAX_TASKS_PER_CHILD"
 
 # Значения по умолчанию
 DEFAULT_DB_PATH: Path = Path(__file__).resolve().parent.parent / "astro_bot.db"
@@ -29,7 +48,24 @@ DEFAULT_OPENAI_MODEL: str = "gpt-5.2"
 DEFAULT_TEMPERATURE: float = 0.7
 DEFAULT_USER_AGENT: str = "astro-bot (contact: set ASTRO_BOT_USER_AGENT)"
 DEFAULT_CHARTS_DIR: Path = Path(__file__).resolve().parent.parent / "data" / "charts"
+DEFAULT_GAZETTEER_PATH: Path = Path(__file__).resolve().parent.parent / "data" / "gazetteer.bin"
 DEFAULT_WEBAPP_MENU_TEXT: str = "Открыть AstroGlass"
+DEFAULT_ENGINE_MAX_TASKS_PER_CHILD: int = 500
+DEFAULT_OPENAI_MAX_CONCURRENCY: int = 8
+DEFAULT_OPENAI_MAX_RETRIES: int = 2
+DEFAULT_OPENAI_TIMEOUT: float = 30.0
+DEFAULT_OPENAI_BREAKER_THRESHOLD: int = 5
+DEFAULT_OPENAI_BREAKER_RESET: float = 30.0
+DEFAULT_OPENAI_CACHE_PATH: Path = Path(__file__).resolve().parent.parent / "llm_cache.db"
+DEFAULT_OPENAI_CACHE_TTL: float = 7 * 24 * 3600.0
+DEFAULT_OPENAI_CACHE_MAX_ENTRIES: int = 5000
+DEFAULT_OPENAI_CACHE_MEMORY_SIZE: int = 256
+DEFAULT_GEO_NEGATIVE_TTL: float = 24 * 3600.0
+DEFAULT_GEO_TIMEOUT: float = 8.0
+DEFAULT_GEO_MAX_RETRIES: int = 2
+DEFAULT_WHEEL_MAX_AGE_DAYS: float = 7.0
+DEFAULT_WHEEL_QUOTA_MB: float = 512.0
+DEFAULT_WHEEL_JANITOR_INTERVAL: float = 600.0
 
 
 def get_bot_token() -> Optional[str]:
@@ -58,6 +94,64 @@ def get_openai_temperature() -> float:
         return DEFAULT_TEMPERATURE
 
 
+def _get_number(env_name: str, default, cast, minimum):
+    raw = os.getenv(env_name)
+    if raw is None:
+        return default
+    try:
+        return max(minimum, cast(raw))
+    except ValueError:
+        return default
+
+
+def get_openai_max_concurrency() -> int:
+    """Сколько запросов к OpenAI одновременно (и соединений в пуле), по умолчанию 8."""
+    return _get_number(OPENAI_MAX_CONCURRENCY_ENV, DEFAULT_OPENAI_MAX_CONCURRENCY, int, 1)
+
+
+def get_openai_max_retries() -> int:
+    """Число повторов при сетевых ошибках/429/5xx, по умолчанию 2."""
+    return _get_number(OPENAI_MAX_RETRIES_ENV, DEFAULT_OPENAI_MAX_RETRIES, int, 0)
+
+
+def get_openai_timeout() -> float:
+    """Таймаут ответа OpenAI в секундах, по умолчанию 30."""
+    return _get_number(OPENAI_TIMEOUT_ENV, DEFAULT_OPENAI_TIMEOUT, float, 1.0)
+
+
+def get_openai_breaker_threshold() -> int:
+    """После скольких неудач подряд перестаём обращаться к OpenAI, по умолчанию 5."""
+    return _get_number(OPENAI_BREAKER_THRESHOLD_ENV, DEFAULT_OPENAI_BREAKER_THRESHOLD, int, 1)
+
+
+def get_openai_breaker_reset_seconds() -> float:
+    """Пауза breaker'а перед пробным запросом, по умолчанию 30 секунд."""
+    return _get_number(OPENAI_BREAKER_RESET_ENV, DEFAULT_OPENAI_BREAKER_RESET, float, 0.0)
+
+
+def get_openai_cache_path() -> Path:
+    """SQLite-файл кэша ответов OpenAI."""
+    env_value = os.getenv(OPENAI_CACHE_PATH_ENV)
+    if env_value:
+        return Path(env_value).expanduser()
+    return DEFAULT_OPENAI_CACHE_PATH
+
+
+def get_openai_cache_ttl() -> float:
+    """Сколько секунд хранить ответ в кэше (0 — кэш выключен), по умолчанию неделя."""
+    return _get_number(OPENAI_CACHE_TTL_ENV, DEFAULT_OPENAI_CACHE_TTL, float, 0.0)
+
+
+def get_openai_cache_max_entries() -> int:
+    """Максимум ответов в SQLite-кэше, по умолчанию 5000."""
+    return _get_number(OPENAI_CACHE_MAX_ENTRIES_ENV, DEFAULT_OPENAI_CACHE_MAX_ENTRIES, int, 1)
+
+
+def get_openai_cache_memory_size() -> int:
+    """Сколько ответов держать в памяти (LRU), по умолчанию 256."""
+    return _get_number(OPENAI_CACHE_MEMORY_SIZE_ENV, DEFAULT_OPENAI_CACHE_MEMORY_SIZE, int, 0)
+
+
 def get_db_path() -> Path:
     """Получить путь к базе данных, можно переопределить через ASTRO_BOT_DB_PATH."""
     env_value = os.getenv(DB_PATH_ENV)
@@ -76,6 +170,29 @@ def get_opencage_api_key() -> Optional[str]:
     return os.getenv(OPENCAGE_API_KEY_ENV)
 
 
+def get_geo_negative_ttl() -> float:
+    """Сколько секунд помнить, что место не найдено (0 — не помнить), по умолчанию сутки."""
+    return _get_number(GEO_NEGATIVE_TTL_ENV, DEFAULT_GEO_NEGATIVE_TTL, float, 0.0)
+
+
+def get_geo_timeout() -> float:
+    """Таймаут запроса к геокодеру в секундах, по умолчанию 8."""
+    return _get_number(GEO_TIMEOUT_ENV, DEFAULT_GEO_TIMEOUT, float, 1.0)
+
+
+def get_geo_max_retries() -> int:
+    """Число повторов запроса к геокодеру при сетевых ошибках/429/5xx, по умолчанию 2."""
+    return _get_number(GEO_MAX_RETRIES_ENV, DEFAULT_GEO_MAX_RETRIES, int, 0)
+
+
+def get_gazetteer_path() -> Path:
+    """Индекс оффлайн-справочника городов (собирается `python -m astro_bot.gazetteer`)."""
+    env_value = os.getenv(GAZETTEER_PATH_ENV)
+    if env_value:
+        return Path(env_value).expanduser()
+    return DEFAULT_GAZETTEER_PATH
+
+
 def get_charts_dir() -> Path:
     """Папка для сохранения SVG-карт."""
     env_value = os.getenv(CHARTS_DIR_ENV)
@@ -84,6 +201,49 @@ def get_charts_dir() -> Path:
     return DEFAULT_CHARTS_DIR
 
 
+def get_warmup_enabled() -> bool:
+    """Прогревать ли тяжёлые зависимости в фоне после старта (0 — нет), по умолчанию да."""
+    return os.getenv(WARMUP_ENV, "1").strip().lower() not in {"0", "false", "no", "off"}
+
+
+def get_wheel_max_age_days() -> float:
+    """Через сколько дней без обращений удалять SVG-круг (0 — не удалять по возрасту), по умолчанию 7."""
+    return _get_number(WHEEL_MAX_AGE_DAYS_ENV, DEFAULT_WHEEL_MAX_AGE_DAYS, float, 0.0)
+
+
+def get_wheel_quota_bytes() -> int:
+    """Предельный размер каталога кругов в байтах (ASTRO_BOT_WHEEL_QUOTA_MB, 0 — без квоты), по умолчанию 512 МиБ."""
+    return int(_get_number(WHEEL_QUOTA_MB_ENV, DEFAULT_WHEEL_QUOTA_MB, float, 0.0) * 1024 * 1024)
+
+
+def get_wheel_janitor_interval() -> float:
+    """Период фоновой уборки кругов в секундах, по умолчанию 10 минут."""
+    return _get_number(WHEEL_JANITOR_INTERVAL_ENV, DEFAULT_WHEEL_JANITOR_INTERVAL, float, 1.0)
+
+
+def get_engine_workers() -> int:
+    """Число процессов для расчёта карт (0 — считать в текущем процессе), по умолчанию по числу ядер."""
+    raw = os.getenv(ENGINE_WORKERS_ENV)
+    if raw is None:
+        return os.cpu_count() or 1
+    try:
+        return max(0, int(raw))
+    except ValueError:
+        return os.cpu_count() or 1
+
+
+def get_engine_max_tasks_per_child() -> Optional[int]:
+    """Сколько расчётов делает воркер до перезапуска (0 — без перезапуска)."""
+    raw = os.getenv(ENGINE_MAX_TASKS_ENV)
+    if raw is None:
+        return DEFAULT_ENGINE_MAX_TASKS_PER_CHILD
+    try:
+        value = int(raw)
+    except ValueError:
+        return DEFAULT_ENGINE_MAX_TASKS_PER_CHILD
+    return value if value > 0 else None
+
+
 def get_webapp_url() -> Optional[str]:
     """URL публичного WebApp (должен быть HTTPS для Telegram)."""
     url = os.getenv(WEBAPP_PUBLIC_URL_ENV)
@@ -6,7 +6,7 @@ import sqlite3
 from pathlib import Path
 from typing import Optional
 
-from astro_bot import config
+from astro_bot import config, geocoder, migrations, wheel_janitor
 
 
 def get_connection(db_path: Optional[Path] = None) -> sqlite3.Connection:
@@ -21,8 +21,7 @@ def get_connection(db_path: Optional[Path] = None) -> sqlite3.Connection:
     return conn
 
 
-def init_db(conn: sqlite3.Connection) -> None:
-    """Создать необходимые таблицы, если их нет."""
+def _create_base_tables(conn: sqlite3.Connection) -> None:
     conn.execute(
         """
         CREATE TABLE IF NOT EXISTS users (
@@ -60,4 +59,21 @@ def init_db(conn: sqlite3.Connection) -> None:
         );
         """
     )
-    conn.commit()
+
+
+def _create_indexes(conn: sqlite3.Connection) -> None:
+    # /history: запросы пользователя, новые первыми
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_requests_user_created ON requests(user_id, created_at)")
+
+
+MIGRATIONS = [
+    migrations.Migration(1, "users, requests, geo_cache", _create_base_tables),
+    migrations.Migration(2, "индекс requests по пользователю", _create_indexes),
+    migrations.Migration(3, "геокодер: места и алиасы вместо geo_cache", geocoder.create_tables),
+    migrations.Migration(4, "учёт SVG-кругов для уборщика", wheel_janitor.create_tables),
+]
+
+
+def init_db(conn: sqlite3.Connection) -> None:
+    """Привести схему к актуальной версии (вызывается один раз при старте)."""
+    migrations.migrate(conn, MIGRATIONS)
@@ -3,7 +3,9 @@
 from __future__ import annotations
 
 import argparse
+import asyncio
 import datetime as dt
+import json
 import sys
 
 from astro_bot import natal_engine
@@ -18,6 +20,7 @@ def main() -> int:
     parser.add_argument("--lat", type=float, help="Явно указать широту (если есть)")
     parser.add_argument("--lng", type=float, help="Явно указать долготу (если есть)")
     parser.add_argument("--tz", help="Явно указать tz (например, Europe/Moscow)")
+    parser.add_argument("--json", action="store_true", help="Вывести JSON карты (как в API)")
     args = parser.parse_args()
 
     if args.lat is not None and args.lng is not None and args.tz:
@@ -34,17 +37,22 @@ def main() -> int:
         # Для геокодинга потребуется соединение с БД и интернет
         from astro_bot import db  # импорт здесь, чтобы не тянуть его для статичных вызовов
 
+        from astro_bot import geocoder
+
         conn = db.get_connection()
         db.init_db(conn)
         result = natal_engine.generate_natal_chart(
-            birth_date_str=args.date,
-            birth_time_str=args.time,
-            place_query=args.place,
-            db_conn=conn,
+            birth_date=natal_engine.parse_birth_date(args.date),
+            birth_time=natal_engine.parse_birth_time(args.time),
+            location=asyncio.run(geocoder.resolve(conn, args.place)),
             user_identifier=args.user,
         )
 
+    if args.json:
+        print(json.dumps(result.payload, ensure_ascii=False, indent=2))
+        return 0
     print(result.summary)
+    print(f"Аспектов всего: {len(result.payload['aspects'])}")
     print(f"SVG: {result.svg_path}")
     return 0
 
@@ -0,0 +1,368 @@
+"""Оффлайн-справочник городов для геокодинга без OpenCage.
+
+Собирается из выгрузки GeoNames (cities15000.txt / cities5000.txt, TSV):
+
+    python -m astro_bot.gazetteer cities15000.txt data/gazetteer.bin
+
+Файл индекса открывается через mmap и в память целиком не читается:
+
+- заголовок: MAGIC, версия, число мест/ключей/часовых поясов, смещения секций;
+- места: записи фиксированной длины (координаты ×1e6, население, пояс, страна,
+  ссылка на название);
+- ключи: записи фиксированной длины, отсортированные по байтам
+  нормализованного названия (основное, ASCII и альтернативные), при равных
+  ключах — по убыванию населения; поиск — бинарный;
+- часовые пояса и строки (UTF-8).
+
+Ключи нормализуются той же функцией, что и кэш геокодера
+(geocoder.normalize_query), поэтому на вход lookup подаётся уже готовый ключ.
+"""
+
+from __future__ import annotations
+
+import argparse
+import mmap
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+MAGIC = b"AGZ1"
+FORMAT_VERSION = 1
+COORD_SCALE = 1_000_000
+
+# magic, версия, места, ключи, пояса, смещения: места, ключи, пояса, строки
+HEADER = struct.Struct("<4sHHIIIIIII")
+# lat, lng, население, пояс, страна, смещение и длина названия
+PLACE = struct.Struct("<iiIH2sIH")
+# смещение и длина ключа, смещение и длина исходного написания, номер места
+KEY = struct.Struct("<IHIHI")
+
+# столбцы cities*.txt GeoNames
+COL_NAME, COL_ASCIINAME, COL_ALTERNATES = 1, 2, 3
+COL_LAT, COL_LNG, COL_COUNTRY, COL_POPULATION, COL_TIMEZONE = 4, 5, 8, 14, 17
+
+
+# названия стран по-русски и по-английски (уже нормализованные: нижний регистр, «е» вместо «ё»)
+COUNTRY_NAMES: Dict[str, Tuple[str, ...]] = {
+    "RU": ("россия", "российская федерация", "рф", "russia", "russian federation"),
+    "UA": ("украина", "ukraine"),
+    "BY": ("беларусь", "белоруссия", "республика беларусь", "belarus"),
+    "KZ": ("казахстан", "kazakhstan"),
+    "UZ": ("узбекистан", "uzbekistan"),
+    "KG": ("киргизия", "кыргызстан", "kyrgyzstan"),
+    "TJ": ("таджикистан", "tajikistan"),
+    "TM": ("туркмения", "туркменистан", "turkmenistan"),
+    "AZ": ("азербайджан", "azerbaijan"),
+    "AM": ("армения", "armenia"),
+    "GE": ("грузия", "georgia"),
+    "MD": ("молдова", "молдавия", "moldova"),
+    "LT": ("литва", "lithuania"),
+    "LV": ("латвия", "latvia"),
+    "EE": ("эстония", "estonia"),
+    "GB": (
+        "великобритания", "англия", "соединенное королевство",
+        "united kingdom", "great britain", "britain", "england", "uk",
+    ),
+    "US": (
+        "сша", "соединенные штаты", "америка",
+        "usa", "united states", "united states of america", "america",
+    ),
+    "CA": ("канада", "canada"),
+    "FR": ("франция", "france"),
+    "DE": ("германия", "germany", "deutschland"),
+    "IT": ("италия", "italy"),
+    "ES": ("испания", "spain"),
+    "PT": ("португалия", "portugal"),
+    "NL": ("нидерланды", "голландия", "netherlands", "holland"),
+    "BE": ("бельгия", "belgium"),
+    "CH": ("швейцария", "switzerland"),
+    "AT": ("австрия", "austria"),
+    "PL": ("польша", "poland"),
+    "CZ": ("чехия", "czechia", "czech republic"),
+    "SK": ("словакия", "slovakia"),
+    "HU": ("венгрия", "hungary"),
+    "RO": ("румыния", "romania"),
+    "BG": ("болгария", "bulgaria"),
+    "RS": ("сербия", "serbia"),
+    "ME": ("черногория", "montenegro"),
+    "HR": ("хорватия", "croatia"),
+    "GR": ("греция", "greece"),
+    "CY": ("кипр", "cyprus"),
+    "TR": ("турция", "turkey", "turkiye"),
+    "IL": ("израиль", "israel"),
+    "AE": ("оаэ", "объединенные арабские эмираты", "uae", "united arab emirates"),
+    "EG": ("египет", "egypt"),
+    "FI": ("финляндия", "finland"),
+    "SE": ("швеция", "sweden"),
+    "NO": ("норвегия", "norway"),
+    "DK": ("дания", "denmark"),
+    "IE": ("ирландия", "ireland"),
+    "CN": ("китай", "кнр", "china"),
+    "JP": ("япония", "japan"),
+    "KR": ("южная корея", "корея", "south korea", "korea"),
+    "IN": ("индия", "india"),
+    "TH": ("таиланд", "тайланд", "thailand"),
+    "VN": ("вьетнам", "vietnam", "viet nam"),
+    "ID": ("индонезия", "indonesia"),
+    "MN": ("монголия", "mongolia"),
+    "AU": ("австралия", "australia"),
+    "NZ": ("новая зеландия", "new zealand"),
+    "BR": ("бразилия", "brazil"),
+    "AR": ("аргентина", "argentina"),
+    "MX": ("мексика", "mexico"),
+}
+# нормализованное название страны -> код ISO 3166-1 alpha-2
+COUNTRY_CODES: Dict[str, str] = {name: code for code, names in COUNTRY_NAMES.items() for name in names}
+
+
+def country_code(qualifier: str) -> Optional[str]:
+    """Код страны по нормализованному уточнению: название, алиас или сам код; None — не страна."""
+    code = COUNTRY_CODES.get(qualifier)
+    if code is None and len(qualifier) == 2 and qualifier.isascii() and qualifier.isalpha():
+        code = qualifier.upper()
+    return code
+
+
+class GazetteerError(Exception):
+    """Файл индекса повреждён или другой версии."""
+
+
+@dataclass(frozen=True)
+class Place:
+    name: str
+    country: str
+    lat: float
+    lng: float
+    tz_str: str
+    population: int
+
+    @property
+    def display_name(self) -> str:
+        return f"{self.name}, {self.country}" if self.country else self.name
+
+
+class Gazetteer:
+    """Индекс, открытый только на чтение; безопасен для чтения из нескольких потоков."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as fh:
+            try:
+                self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as exc:
+                raise GazetteerError(f"{self.path}: пустой файл") from exc
+        try:
+            (magic, version, _, self._n_places, self._n_keys, n_tz,
+             self._places_off, self._keys_off, tz_off, self._strings_off) = HEADER.unpack_from(self._mm, 0)
+        except struct.error as exc:
+            self._mm.close()
+            raise GazetteerError(f"{self.path}: слишком короткий файл") from exc
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self._mm.close()
+            raise GazetteerError(f"{self.path}: неизвестный формат индекса")
+        if not (
+            self._places_off + self._n_places * PLACE.size <= self._keys_off
+            and self._keys_off + self._n_keys * KEY.size <= tz_off <= self._strings_off <= len(self._mm)
+        ):
+            self._mm.close()
+            raise GazetteerError(f"{self.path}: файл обрезан")
+        tz_blob = self._mm[tz_off:self._strings_off].decode("utf-8")
+        self._timezones: List[str] = tz_blob.split("\n") if n_tz else []
+
+    def __len__(self) -> int:
+        return self._n_places
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def _string(self, offset: int, length: int) -> str:
+        start = self._strings_off + offset
+        return self._mm[start:start + length].decode("utf-8")
+
+    def _key_bytes(self, index: int) -> bytes:
+        offset, length, _, _, _ = KEY.unpack_from(self._mm, self._keys_off + index * KEY.size)
+        start = self._strings_off + offset
+        return self._mm[start:start + length]
+
+    def _entry(self, index: int) -> Tuple[str, int]:
+        _, _, name_off, name_len, place = KEY.unpack_from(self._mm, self._keys_off + index * KEY.size)
+        return self._string(name_off, name_len), place
+
+    def _place(self, index: int, name: Optional[str] = None) -> Place:
+        lat, lng, population, tz_index, country, name_off, name_len = PLACE.unpack_from(
+            self._mm, self._places_off + index * PLACE.size
+        )
+        return Place(
+            name=name or self._string(name_off, name_len),
+            country=country.decode("ascii").rstrip("\0"),
+            lat=lat / COORD_SCALE,
+            lng=lng / COORD_SCALE,
+            tz_str=self._timezones[tz_index] if tz_index < len(self._timezones) else "",
+            population=population,
+        )
+
+    def _lower_bound(self, target: bytes) -> int:
+        lo, hi = 0, self._n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def matches(self, key: str) -> Iterator[Place]:
+        """Все места с точно таким ключом, от самых крупных; название — в написании ключа."""
+        target = key.encode("utf-8")
+        index = self._lower_bound(target)
+        seen = set()
+        while index < self._n_keys and self._key_bytes(index) == target:
+            name, place = self._entry(index)
+            if place not in seen:
+                seen.add(place)
+                yield self._place(place, name)
+            index += 1
+
+    def lookup(self, key: str) -> Optional[Place]:
+        """Место по нормализованному запросу.
+
+        «Город» — самый крупный город с таким названием. «Город, Страна» (как
+        просит бот) — город в этой стране; страна — название по-русски или
+        по-английски («Россия», «UK») или код ISO («RU»), учитывается последняя
+        часть после запятой. Если город в названной стране не найден — None, и
+        запрос уходит в онлайн-геокодер; если уточнение не страна («Paris,
+        Texas», область) — самый крупный город с таким названием.
+        """
+        best = next(self.matches(key), None)
+        if best is not None or ", " not in key:
+            return best
+        name, _, rest = key.partition(", ")
+        country = country_code(rest.rpartition(", ")[2])
+        if country is None:
+            return next(self.matches(name), None)
+        return next((p for p in self.matches(name) if p.country == country), None)
+
+    def prefix(self, prefix: str, limit: int) -> List[Tuple[str, Place]]:
+        """До limit пар (ключ, место) с ключами, начинающимися с prefix, в порядке ключей."""
+        target = prefix.encode("utf-8")
+        index = self._lower_bound(target)
+        found: List[Tuple[str, Place]] = []
+        while index < self._n_keys and len(found) < limit:
+            key = self._key_bytes(index)
+            if not key.startswith(target):
+                break
+            name, place = self._entry(index)
+            found.append((key.decode("utf-8"), self._place(place, name)))
+            index += 1
+        return found
+
+
+_opened: Dict[Path, Optional[Gazetteer]] = {}
+_opened_lock = Lock()
+
+
+def get_gazetteer(path: Path) -> Optional[Gazetteer]:
+    """Открытый индекс по пути (один на процесс) или None, если файла нет."""
+    path = Path(path)
+    if path not in _opened:
+        with _opened_lock:
+            if path not in _opened:
+                _opened[path] = Gazetteer(path) if path.is_file() else None
+    return _opened[path]
+
+
+def _parse_rows(source: Path) -> Iterator[Tuple[List[str], str, str, float, float, int, str]]:
+    with open(source, encoding="utf-8") as fh:
+        for line in fh:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) <= COL_TIMEZONE:
+                continue
+            try:
+                lat, lng = float(cols[COL_LAT]), float(cols[COL_LNG])
+            except ValueError:
+                continue
+            names = [cols[COL_NAME], cols[COL_ASCIINAME]]
+            names += [n for n in cols[COL_ALTERNATES].split(",") if n]
+            population = int(cols[COL_POPULATION] or 0)
+            yield names, cols[COL_NAME], cols[COL_COUNTRY][:2], lat, lng, population, cols[COL_TIMEZONE]
+
+
+def build(source: Path, target: Path, normalize: Callable[[str], str]) -> int:
+    """Собрать индекс из выгрузки GeoNames; вернуть число мест."""
+    strings = bytearray()
+    string_offsets: Dict[str, Tuple[int, int]] = {}
+
+    def add_string(text: str) -> Tuple[int, int]:
+        ref = string_offsets.get(text)
+        if ref is None:
+            data = text.encode("utf-8")[:0xFFFF]
+            ref = string_offsets[text] = (len(strings), len(data))
+            strings.extend(data)
+        return ref
+
+    timezones: Dict[str, int] = {}
+    places = bytearray()
+    keys: List[Tuple[bytes, int, int, str]] = []
+    count = 0
+    for names, name, country, lat, lng, population, tz_str in _parse_rows(Path(source)):
+        tz_index = timezones.setdefault(tz_str, len(timezones))
+        name_off, name_len = add_string(name)
+        places += PLACE.pack(
+            round(lat * COORD_SCALE), round(lng * COORD_SCALE), min(population, 0xFFFFFFFF),
+            tz_index, country.encode("ascii", "replace").ljust(2, b"\0"), name_off, name_len,
+        )
+        seen = set()
+        for spelling in names:
+            key = normalize(spelling)
+            if key and key not in seen:
+                seen.add(key)
+                keys.append((key.encode("utf-8"), -population, count, spelling))
+        count += 1
+
+    keys.sort()
+    key_records = bytearray()
+    for key, _, place, spelling in keys:
+        key_off, key_len = add_string(key.decode("utf-8"))
+        spelling_off, spelling_len = add_string(spelling)
+        key_records += KEY.pack(key_off, key_len, spelling_off, spelling_len, place)
+
+    tz_blob = "\n".join(timezones).encode("utf-8")
+    places_off = HEADER.size
+    keys_off = places_off + len(places)
+    tz_off = keys_off + len(key_records)
+    strings_off = tz_off + len(tz_blob)
+    target = Path(target)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_suffix(target.suffix + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(HEADER.pack(
+            MAGIC, FORMAT_VERSION, 0, count, len(keys), len(timezones),
+            places_off, keys_off, tz_off, strings_off,
+        ))
+        fh.write(places)
+        fh.write(key_records)
+        fh.write(tz_blob)
+        fh.write(strings)
+    tmp.replace(target)
+    with _opened_lock:
+        _opened.pop(target, None)
+    return count
+
+
+def main() -> None:
+    from astro_bot import config
+    from astro_bot.geocoder import normalize_query
+
+    parser = argparse.ArgumentParser(description="Собрать оффлайн-справочник городов из выгрузки GeoNames")
+    parser.add_argument("source", help="cities15000.txt / cities5000.txt с download.geonames.org/export/dump/")
+    parser.add_argument("target", nargs="?", default=None, help="файл индекса (по умолчанию ASTRO_BOT_GAZETTEER_PATH)")
+    args = parser.parse_args()
+    target = Path(args.target) if args.target else config.get_gazetteer_path()
+    count = build(Path(args.source), target, normalize_query)
+    print(f"{target}: {count} мест, {target.stat().st_size // 1024} КиБ")
+
+
+if __name__ == "__main__":
+    main()
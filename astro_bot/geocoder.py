@@ -0,0 +1,287 @@
+"""Геокодинг мест рождения (общий для бота и API).
+
+- Запрос нормализуется (NFKC, casefold, ё→е, пробелы и запятые), поэтому
+  «москва», «Москва » и «МОСКВА» — один ключ.
+- Ключи — это алиасы канонического места (geo_aliases → geo_places): место
+  определяется координатами, так что «Moscow» и «Москва» после геокодинга
+  указывают на одну запись, а полное название места тоже становится алиасом.
+- До OpenCage запрос ищется в оффлайн-справочнике городов (astro_bot/gazetteer.py),
+  если его индекс собран: это доли миллисекунды и работает без ключа.
+- «Не найдено» тоже запоминается, на GEO_NEGATIVE_TTL_SECONDS.
+- OpenCage вызывается через общий keep-alive httpx.AsyncClient с повторами
+  без блокировки event loop; одинаковые одновременные запросы схлопываются.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import logging
+import re
+import sqlite3
+import time
+import unicodedata
+import weakref
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+import httpx
+
+from astro_bot import backoff, config, gazetteer, timezones
+from astro_bot.natal_engine import LocationResult, NatalError
+from astro_bot.single_flight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+OPENCAGE_URL = "https://api.opencagedata.com/geocode/v1/json"
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 4.0
+# координаты места в ключе уникальности: 1e-4° ≈ 11 м
+COORD_SCALE = 10_000
+
+NOT_FOUND_MESSAGE = "Место не найдено. Уточните город/страну."
+
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_flights = AsyncSingleFlight()
+
+
+def normalize_query(query: str) -> str:
+    """Ключ кэша для строки места: регистр, юникод-формы, ё/е и пробелы не важны."""
+    text = unicodedata.normalize("NFKC", query or "").casefold().replace("ё", "е")
+    text = re.sub(r"\s*,\s*", ", ", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(" ,.;")
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """Шаг миграции: места и алиасы; старый geo_cache переносится и удаляется."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS geo_places (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            display_name TEXT NOT NULL,
+            lat REAL NOT NULL,
+            lng REAL NOT NULL,
+            tz_str TEXT NOT NULL,
+            lat_key INTEGER NOT NULL,
+            lng_key INTEGER NOT NULL,
+            created_at TEXT,
+            UNIQUE (lat_key, lng_key)
+        );
+        """
+    )
+    # place_id NULL — «не найдено» до expires_at
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS geo_aliases (
+            key TEXT PRIMARY KEY,
+            place_id INTEGER,
+            expires_at REAL,
+            updated_at TEXT,
+            FOREIGN KEY(place_id) REFERENCES geo_places(id)
+        );
+        """
+    )
+    legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'geo_cache'").fetchone()
+    if legacy:
+        rows = conn.execute("SELECT query, lat, lng, tz_str, display_name FROM geo_cache").fetchall()
+        for query, lat, lng, tz_str, display_name in rows:
+            location = LocationResult(
+                query=query, display_name=display_name or query, lat=lat, lng=lng, tz_str=tz_str
+            )
+            _store(conn, [query, location.display_name], location)
+        conn.execute("DROP TABLE geo_cache")
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _store(conn: sqlite3.Connection, keys: Iterable[str], location: LocationResult) -> LocationResult:
+    """Записать место и алиасы (без commit); вернуть каноническое место.
+
+    Алиасы пишутся через INSERT OR REPLACE: каждая запись получает новый rowid,
+    по нему индекс подсказок API (astro_api/place_index.py) дочитывает новые.
+    """
+    lat_key = round(location.lat * COORD_SCALE)
+    lng_key = round(location.lng * COORD_SCALE)
+    conn.execute(
+        """
+        INSERT INTO geo_places (display_name, lat, lng, tz_str, lat_key, lng_key, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(lat_key, lng_key) DO NOTHING
+        """,
+        (location.display_name, location.lat, location.lng, location.tz_str, lat_key, lng_key, _now()),
+    )
+    place = conn.execute(
+        "SELECT id, display_name, lat, lng, tz_str FROM geo_places WHERE lat_key = ? AND lng_key = ?",
+        (lat_key, lng_key),
+    ).fetchone()
+    now = _now()
+    conn.executemany(
+        """
+        INSERT OR REPLACE INTO geo_aliases (key, place_id, expires_at, updated_at) VALUES (?, ?, NULL, ?)
+        """,
+        [(key, place[0], now) for key in {normalize_query(k) for k in keys} if key],
+    )
+    return LocationResult(query=location.query, display_name=place[1], lat=place[2], lng=place[3], tz_str=place[4])
+
+
+def remember(conn: sqlite3.Connection, keys: Iterable[str], location: LocationResult) -> LocationResult:
+    """Сохранить место под несколькими алиасами; вернуть каноническое место."""
+    place = _store(conn, keys, location)
+    conn.commit()
+    return place
+
+
+def remember_not_found(conn: sqlite3.Connection, key: str) -> None:
+    ttl = config.get_geo_negative_ttl()
+    if ttl <= 0:
+        return
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO geo_aliases (key, place_id, expires_at, updated_at) VALUES (?, NULL, ?, ?)
+        """,
+        (key, time.time() + ttl, _now()),
+    )
+    conn.commit()
+
+
+def lookup(conn: sqlite3.Connection, key: str) -> Optional[LocationResult]:
+    """Место по нормализованному ключу; NatalError, если недавно не нашлось; None — нужно геокодить."""
+    row = conn.execute(
+        """
+        SELECT a.place_id, a.expires_at, p.display_name, p.lat, p.lng, p.tz_str
+        FROM geo_aliases a LEFT JOIN geo_places p ON p.id = a.place_id
+        WHERE a.key = ?
+        """,
+        (key,),
+    ).fetchone()
+    if row is None:
+        return None
+    place_id, expires_at, display_name, lat, lng, tz_str = row
+    if place_id is None:
+        if expires_at is not None and expires_at > time.time():
+            raise NatalError(NOT_FOUND_MESSAGE)
+        return None
+    return LocationResult(query=key, display_name=display_name, lat=lat, lng=lng, tz_str=tz_str)
+
+
+def offline_index() -> Optional[gazetteer.Gazetteer]:
+    """Оффлайн-справочник или None, если его нет или файл повреждён (тогда — онлайн-геокодер)."""
+    try:
+        return gazetteer.get_gazetteer(config.get_gazetteer_path())
+    except gazetteer.GazetteerError as exc:
+        logger.warning("Оффлайн-справочник недоступен: %s", exc)
+        return None
+
+
+def lookup_offline(key: str) -> Optional[LocationResult]:
+    """Место из оффлайн-справочника по нормализованному ключу (None — нет индекса или места)."""
+    index = offline_index()
+    place = index.lookup(key) if index is not None else None
+    if place is None:
+        return None
+    tz_str = place.tz_str or timezones.timezone_at(place.lat, place.lng)
+    if not tz_str:
+        return None
+    return LocationResult(query=key, display_name=place.display_name, lat=place.lat, lng=place.lng, tz_str=tz_str)
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Keep-alive клиент на event loop (как в openai_client)."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(config.get_geo_timeout(), connect=5.0),
+            headers={"User-Agent": config.get_user_agent()},
+        )
+        _clients[loop] = client
+    return client
+
+
+async def aclose() -> None:
+    """Закрыть клиент текущего event loop (при остановке бота/API)."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def geocode_opencage(query: str, api_key: str) -> Optional[LocationResult]:
+    """Запрос к OpenCage; None — место не найдено, NatalError — геокодер недоступен."""
+    params = {"q": query, "key": api_key, "limit": 1, "no_annotations": 1}
+    client = _get_client()
+    retries = config.get_geo_max_retries()
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            resp = await client.get(OPENCAGE_URL, params=params)
+        except httpx.HTTPError as exc:
+            logger.warning("Ошибка сети при геокодинге (попытка %s): %s", attempt + 1, exc)
+        else:
+            if resp.status_code == 200:
+                data = resp.json()
+                break
+            if resp.status_code not in RETRY_STATUSES:
+                logger.error("OpenCage вернул статус %s: %s", resp.status_code, resp.text[:200])
+                raise NatalError("Геокодер недоступен. Попробуйте ещё раз.")
+            retry_after = resp.headers.get("Retry-After")
+        if attempt < retries:
+            await asyncio.sleep(backoff.delay(attempt, retry_after, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS))
+    else:
+        raise NatalError("Геокодер недоступен. Попробуйте ещё раз.")
+
+    results = data.get("results") if isinstance(data, dict) else None
+    if not results:
+        return None
+    first = results[0]
+    geometry = first.get("geometry") or {}
+    lat = geometry.get("lat")
+    lng = geometry.get("lng")
+    if lat is None or lng is None:
+        return None
+
+    # при холодном старте timezone_at строит TimezoneFinder — не в цикле событий
+    tz_str = await asyncio.to_thread(timezones.timezone_at, float(lat), float(lng))
+    if not tz_str:
+        raise NatalError("Не удалось определить часовую зону для этого места.")
+    return LocationResult(
+        query=query,
+        display_name=first.get("formatted") or query,
+        lat=float(lat),
+        lng=float(lng),
+        tz_str=tz_str,
+    )
+
+
+def _lookup_cached(conn: sqlite3.Connection, key: str) -> Optional[LocationResult]:
+    return lookup(conn, key) or lookup_offline(key)
+
+
+async def resolve(conn: sqlite3.Connection, query: str) -> LocationResult:
+    """Место рождения по строке пользователя: кэш (алиасы), справочник, иначе OpenCage.
+
+    SQLite, справочник и timezonefinder синхронные, поэтому выполняются в
+    потоке (asyncio.to_thread), а не в цикле событий бота или API.
+    """
+    display_query = " ".join((query or "").split())
+    key = normalize_query(query)
+    if not key:
+        raise NatalError("Место рождения не задано.")
+
+    cached = await asyncio.to_thread(_lookup_cached, conn, key)
+    if cached:
+        return dataclasses.replace(cached, query=display_query)
+
+    api_key = config.get_opencage_api_key()
+    if not api_key:
+        raise NatalError("Не задан OPENCAGE_API_KEY для геокодинга.")
+    # общий результат без соединения: каждый ожидающий пишет в свою БД сам
+    location = await _flights.do(key, lambda: geocode_opencage(display_query, api_key))
+    if location is None:
+        await asyncio.to_thread(remember_not_found, conn, key)
+        raise NatalError(NOT_FOUND_MESSAGE)
+    place = await asyncio.to_thread(remember, conn, [key, location.display_name], location)
+    return dataclasses.replace(place, query=display_query)
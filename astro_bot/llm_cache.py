@@ -0,0 +1,206 @@
+"""Кэш ответов OpenAI: LRU в памяти + SQLite с TTL и ограничением размера.
+
+Ключ — хэш от модели, температуры, системного и пользовательского промпта,
+поэтому повторный запрос инсайтов по той же карте или тот же разбор натала
+возвращается мгновенно и без обращения к API.
+
+Из async-кода кэш вызывается через aget/aput: попадание в память отдаётся
+сразу, а обращения к SQLite идут в потоке, не блокируя event loop. Чтение
+из кэша не пишет в БД: время обращения копится в памяти и сбрасывается
+одним UPDATE в транзакции следующего put (перед вытеснением по LRU).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Optional
+
+from astro_bot import config
+
+logger = logging.getLogger(__name__)
+
+KEY_VERSION = 1
+
+
+def cache_key(payload: dict) -> str:
+    """Отпечаток запроса к Chat Completions (model, temperature, messages)."""
+    canonical = {
+        "v": KEY_VERSION,
+        "model": payload.get("model"),
+        "temperature": payload.get("temperature"),
+        "messages": payload.get("messages"),
+    }
+    raw = json.dumps(canonical, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Двухуровневый кэш ответов. Потокобезопасен; SQLite открывается лениво."""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self._db_path = db_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._memory: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._touched: Dict[str, float] = {}
+        self._lock = Lock()
+        self.hits_memory = 0
+        self.hits_db = 0
+        self.misses = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        return config.get_openai_cache_ttl() > 0
+
+    def _get_conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            path = self._db_path or config.get_openai_cache_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: str, response: str, created_at: float) -> None:
+        maxsize = config.get_openai_cache_memory_size()
+        if maxsize <= 0:
+            return
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > maxsize:
+            self._memory.popitem(last=False)
+
+    def _from_memory(self, key: str, now: float, ttl: float) -> Optional[str]:
+        cached = self._memory.get(key)
+        if cached is None:
+            return None
+        response, created_at = cached
+        if now - created_at >= ttl:
+            del self._memory[key]
+            return None
+        self._memory.move_to_end(key)
+        self._touched[key] = now
+        self.hits_memory += 1
+        return response
+
+    def get(self, key: str) -> Optional[str]:
+        """Ответ из кэша или None (просроченные записи не возвращаются)."""
+        if not self.enabled():
+            return None
+        now = time.time()
+        ttl = config.get_openai_cache_ttl()
+        with self._lock:
+            response = self._from_memory(key, now, ttl)
+            if response is not None:
+                return response
+            try:
+                row = self._get_conn().execute(
+                    "SELECT response, created_at FROM llm_cache WHERE key = ? AND created_at > ?",
+                    (key, now - ttl),
+                ).fetchone()
+            except sqlite3.Error as exc:
+                logger.warning("Кэш OpenAI недоступен: %s", exc)
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._remember(key, row[0], row[1])
+            self._touched[key] = now
+            self.hits_db += 1
+            return row[0]
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get для async-кода: память — сразу, SQLite — в потоке."""
+        if not self.enabled():
+            return None
+        with self._lock:
+            response = self._from_memory(key, time.time(), config.get_openai_cache_ttl())
+        if response is not None:
+            return response
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, response: str) -> None:
+        """put для async-кода (запись в SQLite — в потоке)."""
+        if self.enabled() and response:
+            await asyncio.to_thread(self.put, key, response)
+
+    def _flush_touches(self, conn: sqlite3.Connection) -> None:
+        touched, self._touched = self._touched, {}
+        if touched:
+            conn.executemany(
+                "UPDATE llm_cache SET last_access = MAX(last_access, ?) WHERE key = ?",
+                [(ts, key) for key, ts in touched.items()],
+            )
+
+    def put(self, key: str, response: str) -> None:
+        """Сохранить ответ; заодно удалить просроченные и самые давно читанные записи сверх лимита."""
+        if not self.enabled() or not response:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, response, now)
+            try:
+                conn = self._get_conn()
+                self._flush_touches(conn)
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_access) VALUES (?, ?, ?, ?)",
+                    (key, response, now, now),
+                )
+                conn.execute("DELETE FROM llm_cache WHERE created_at <= ?", (now - config.get_openai_cache_ttl(),))
+                conn.execute(
+                    """
+                    DELETE FROM llm_cache WHERE key IN (
+                        SELECT key FROM llm_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (config.get_openai_cache_max_entries(),),
+                )
+                conn.commit()
+            except sqlite3.Error as exc:
+                logger.warning("Не удалось сохранить ответ в кэш OpenAI: %s", exc)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits_memory": self.hits_memory,
+                "hits_db": self.hits_db,
+                "misses": self.misses,
+                "memory_entries": len(self._memory),
+            }
+
+    def reset(self) -> None:
+        """Закрыть SQLite, очистить память и счётчики (например, после смены OPENAI_CACHE_PATH)."""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_touches(self._conn)
+                    self._conn.commit()
+                except sqlite3.Error as exc:
+                    logger.warning("Не удалось сохранить время обращений к кэшу OpenAI: %s", exc)
+                self._conn.close()
+                self._conn = None
+            self._touched.clear()
+            self._memory.clear()
+            self.hits_memory = self.hits_db = self.misses = 0
+
+
+cache = LLMCache()
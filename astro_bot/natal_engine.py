@@ -1,29 +1,22 @@
-"""Натальная карта: геокодинг, расчёт и рендер SVG."""
+"""Натальная карта: расчёт и рендер SVG.
+
+kerykeion импортируется внутри функций расчёта: импорт модуля дешёвый, и
+API/бот начинают принимать запросы, не дожидаясь тяжёлых зависимостей
+(их заранее подгружает astro_bot/warmup.py).
+"""
 
 from __future__ import annotations
 
 import datetime as dt
 import logging
-import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Sequence
-from threading import Lock
-
-import requests
-from kerykeion import (
-    AstrologicalSubjectFactory,
-    ChartDataFactory,
-    ChartDrawer,
-    to_context,
-)
-from timezonefinder import TimezoneFinder
+from typing import Any, Optional, Sequence
 
-from astro_bot import config, repositories
+from astro_bot import chart_engine, config, timezones, wheel_store
 
 logger = logging.getLogger(__name__)
 
-OPENCAGE_URL = "https://api.opencagedata.com/geocode/v1/json"
 ACTIVE_POINTS: Sequence[str] = [
     "Sun",
     "Moon",
@@ -49,11 +42,10 @@ ACTIVE_POINTS: Sequence[str] = [
     "Descendant",
     "Imum_Coeli",
 ]
+HOUSES_SYSTEM_IDENTIFIER = "P"
+# заголовок круга вместо имени: одна и та же карта у разных пользователей — один файл
+WHEEL_TITLE = "Birth Chart"
 MAJOR_ASPECTS = {"conjunction", "opposition", "trine", "square", "sextile"}
-CHART_CLEANUP_DAYS = 7
-
-tz_finder = TimezoneFinder()
-natal_lock = Lock()
 
 
 class NatalError(Exception):
@@ -69,25 +61,47 @@ class LocationResult:
     tz_str: str
 
 
+@dataclass
+class ChartBundle:
+    """Всё, что получается из одного расчёта карты.
+
+    Эфемериды и аспекты считаются один раз; SVG, сводка, контекст для LLM
+    и JSON для API читают данные отсюда.
+    """
+
+    subject: Any
+    chart_data: Any
+    aspects: list
+    location: LocationResult
+    birth_date: dt.date
+    birth_time: Optional[dt.time]
+    summary: str
+    context_text: str
+    payload: dict
+    svg_path: Optional[Path] = None
+
+
+@dataclass
+class NatalChart:
+    """Результат compute_natal: только то, что читают вызывающие.
+
+    Возвращается из воркера chart_engine, поэтому без моделей kerykeion —
+    их pickle в разы больше самих данных.
+    """
+
+    payload: dict
+    summary: str
+    context_text: str
+    svg_path: Optional[Path] = None
+
+
 @dataclass
 class NatalResult:
     summary: str
     svg_path: Path
     context_text: str
     location: LocationResult
-
-
-def cleanup_old_svgs(charts_dir: Path, days: int = CHART_CLEANUP_DAYS) -> None:
-    """Удалить старые SVG-чарты."""
-    if not charts_dir.exists():
-        return
-    cutoff = time.time() - days * 86400
-    for path in charts_dir.glob("*.svg"):
-        try:
-            if path.stat().st_mtime < cutoff:
-                path.unlink()
-        except OSError:
-            continue
+    payload: Optional[dict] = None
 
 
 def parse_birth_date(date_str: str) -> dt.date:
@@ -109,96 +123,17 @@ def parse_birth_time(time_str: Optional[str]) -> Optional[dt.time]:
         raise NatalError("Время должно быть в формате ЧЧ:ММ или напишите «не знаю».") from exc
 
 
-def resolve_location(query: str, conn) -> LocationResult:
-    """Геокодинг места рождения с кэшем в БД (только OpenCage)."""
-    norm_query = query.strip()
-    if not norm_query:
-        raise NatalError("Место рождения не задано.")
-
-    cached = repositories.get_cached_location(conn, norm_query)
-    if cached:
-        return LocationResult(
-            query=norm_query,
-            display_name=cached["display_name"] or norm_query,
-            lat=cached["lat"],
-            lng=cached["lng"],
-            tz_str=cached["tz_str"],
-        )
-
-    location = geocode_opencage_required(norm_query)
-    repositories.upsert_cached_location(
-        conn,
-        query=norm_query,
-        lat=location.lat,
-        lng=location.lng,
-        tz_str=location.tz_str,
-        display_name=location.display_name,
-    )
-    return location
-
-
-def geocode_opencage_required(query: str) -> LocationResult:
-    """Геокодинг через OpenCage, обязательно с ключом."""
-    oc_key = config.get_opencage_api_key()
-    if not oc_key:
-        raise NatalError("Не задан OPENCAGE_API_KEY для геокодинга.")
-    return geocode_opencage(query, oc_key)
-
-
-def geocode_opencage(query: str, api_key: str) -> LocationResult:
-    """Геокодинг через OpenCage."""
-    params = {"q": query, "key": api_key, "limit": 1, "no_annotations": 1}
-    last_exc = None
-    for attempt in range(3):
-        if attempt > 0:
-            time.sleep(0.5 + attempt * 0.5)
-        try:
-            resp = requests.get(OPENCAGE_URL, params=params, timeout=8)
-            resp.raise_for_status()
-            data = resp.json()
-            break
-        except requests.Timeout as exc:
-            last_exc = exc
-            continue
-        except requests.RequestException as exc:
-            last_exc = exc
-            break
-    else:
-        raise NatalError("Геокодер недоступен. Попробуйте ещё раз.") from last_exc
-
-    results = data.get("results") if isinstance(data, dict) else None
-    if not results:
-        raise NatalError("Место не найдено. Уточните город/страду.")
-    first = results[0]
-    geometry = first.get("geometry") or {}
-    lat = geometry.get("lat")
-    lng = geometry.get("lng")
-    if lat is None or lng is None:
-        raise NatalError("Не удалось определить координаты.")
-
-    display_name = first.get("formatted") or query
-    tz_str = tz_finder.timezone_at(lat=float(lat), lng=float(lng))
-    if not tz_str:
-        raise NatalError("Не удалось определить часовую зону для этого места.")
-
-    return LocationResult(
-        query=query,
-        display_name=display_name,
-        lat=float(lat),
-        lng=float(lng),
-        tz_str=tz_str,
-    )
-
-
-
 def build_subject(
     name: str,
     birth_date: dt.date,
     birth_time: Optional[dt.time],
     location: LocationResult,
 ):
+    from kerykeion import AstrologicalSubjectFactory
+
     hour = birth_time.hour if birth_time else 12
     minute = birth_time.minute if birth_time else 0
+    local = dt.datetime.combine(birth_date, dt.time(hour, minute))
     return AstrologicalSubjectFactory.from_birth_data(
         name=name,
         year=birth_date.year,
@@ -209,18 +144,30 @@ def build_subject(
         lng=location.lng,
         lat=location.lat,
         tz_str=location.tz_str,
-        houses_system_identifier="P",
+        houses_system_identifier=HOUSES_SYSTEM_IDENTIFIER,
         active_points=list(ACTIVE_POINTS),
         online=False,
+        is_dst=timezones.is_dst(location.tz_str, local),
     )
 
 
-def render_svg(subject, charts_dir: Path, filename: str) -> Path:
-    charts_dir.mkdir(parents=True, exist_ok=True)
-    chart_data = ChartDataFactory.create_natal_chart_data(subject)
-    drawer = ChartDrawer(chart_data)
-    drawer.save_svg(output_path=charts_dir, filename=filename)
-    return charts_dir / f"{filename}.svg"
+def natal_wheel_key(subject) -> str:
+    """Ключ круга в wheel_store: имя на круге не рисуется, поэтому в ключ не входит."""
+    return wheel_store.wheel_key("natal", wheel_store.subject_key(subject))
+
+
+def render_svg(chart_data, charts_dir: Path) -> Path:
+    """Нарисовать круг карты по уже посчитанным данным (ChartBundle.chart_data).
+
+    Если такой круг уже есть в хранилище, рендер пропускается.
+    """
+    from kerykeion import ChartDrawer
+
+    return wheel_store.ensure_svg(
+        charts_dir,
+        natal_wheel_key(chart_data.subject),
+        lambda: ChartDrawer(chart_data, theme=wheel_store.THEME, custom_title=WHEEL_TITLE),
+    )
 
 
 def format_position(point) -> str:
@@ -272,15 +219,20 @@ def format_aspect(aspect_obj) -> str:
     return f"{aspect_obj.p1_name} — {aspect_obj.p2_name}: {name} (орб {orb}°)"
 
 
-def build_summary(subject, aspects, location: LocationResult, birth_date: dt.date, birth_time: Optional[dt.time]) -> str:
+def build_summary_header(location: LocationResult, birth_date: dt.date, birth_time: Optional[dt.time]) -> str:
+    """Шапка сводки: всё, что зависит от ввода пользователя, а не от эфемерид."""
     time_part = birth_time.strftime("%H:%M") if birth_time else "неизвестно"
-    header = (
+    return (
         f"Натальная карта\n"
         f"Дата: {birth_date.strftime('%d.%m.%Y')}, Время: {time_part}\n"
         f"Место: {location.display_name}\n"
         f"Система домов: Placidus\n"
     )
 
+
+def build_summary(subject, aspects, location: LocationResult, birth_date: dt.date, birth_time: Optional[dt.time]) -> str:
+    header = build_summary_header(location, birth_date, birth_time)
+
     angles = [
         subject.ascendant,
         subject.medium_coeli,
@@ -360,33 +312,118 @@ def build_summary(subject, aspects, location: LocationResult, birth_date: dt.dat
     return "\n".join(parts)
 
 
+def build_chart_payload(chart_data, location: LocationResult, birth_date: dt.date, birth_time: Optional[dt.time]) -> dict:
+    """JSON-представление карты для API/БД."""
+    subject_dump = chart_data.subject.model_dump()
+    aspects_dump = [a.model_dump() for a in chart_data.aspects]
+    return {
+        "subject": subject_dump,
+        "aspects": aspects_dump,
+        "location": {
+            "display_name": location.display_name,
+            "lat": location.lat,
+            "lng": location.lng,
+            "tz_str": location.tz_str,
+        },
+        "birth_date": birth_date.isoformat(),
+        "birth_time": birth_time.isoformat() if birth_time else None,
+    }
+
+
+def build_chart_bundle(
+    name: str,
+    birth_date: dt.date,
+    birth_time: Optional[dt.time],
+    location: LocationResult,
+) -> ChartBundle:
+    """Один проход: subject → chart_data (с аспектами) → сводка, контекст и payload."""
+    from kerykeion import ChartDataFactory, to_context
+
+    subject = build_subject(
+        name=name,
+        birth_date=birth_date,
+        birth_time=birth_time,
+        location=location,
+    )
+    chart_data = ChartDataFactory.create_natal_chart_data(subject)
+    aspects = list(chart_data.aspects)
+    return ChartBundle(
+        subject=subject,
+        chart_data=chart_data,
+        aspects=aspects,
+        location=location,
+        birth_date=birth_date,
+        birth_time=birth_time,
+        summary=build_summary(subject, aspects, location, birth_date, birth_time),
+        context_text=to_context(subject),
+        payload=build_chart_payload(chart_data, location, birth_date, birth_time),
+    )
+
+
+def chart_data_from_payload(payload: dict):
+    """Восстановить chart_data из сохранённого payload без обращения к эфемеридам."""
+    from kerykeion import ChartDataFactory
+    from kerykeion.schemas.kr_models import AstrologicalSubjectModel
+
+    subject = AstrologicalSubjectModel.model_validate(payload["subject"])
+    return ChartDataFactory.create_natal_chart_data(subject)
+
+
+def render_payload_svg(payload: dict, charts_dir: Path) -> Path:
+    """Нарисовать круг по сохранённому payload; выполняется в воркере chart_engine."""
+    existing = wheel_store.wheel_path(charts_dir, natal_wheel_key(payload["subject"]))
+    if existing.exists():
+        return existing
+    return render_svg(chart_data_from_payload(payload), charts_dir)
+
+
+def compute_natal(
+    name: str,
+    birth_date: dt.date,
+    birth_time: Optional[dt.time],
+    location: LocationResult,
+    charts_dir: Optional[Path] = None,
+) -> NatalChart:
+    """Полный расчёт одной карты; выполняется в воркере chart_engine.
+
+    Без charts_dir SVG не рисуется; уже нарисованный круг берётся из wheel_store.
+    """
+    bundle = build_chart_bundle(name, birth_date, birth_time, location)
+    svg_path = render_svg(bundle.chart_data, charts_dir) if charts_dir is not None else None
+    return NatalChart(
+        payload=bundle.payload,
+        summary=bundle.summary,
+        context_text=bundle.context_text,
+        svg_path=svg_path,
+    )
+
+
 def generate_natal_chart(
     *,
-    birth_date_str: str,
-    birth_time_str: Optional[str],
-    place_query: str,
-    db_conn,
+    birth_date: dt.date,
+    birth_time: Optional[dt.time],
+    location: LocationResult,
     user_identifier: str,
     charts_dir: Optional[Path] = None,
 ) -> NatalResult:
+    """Расчёт и SVG для уже найденного места (геокодинг — astro_bot.geocoder)."""
     charts_dir = charts_dir or config.get_charts_dir()
-    cleanup_old_svgs(charts_dir, CHART_CLEANUP_DAYS)
-
-    birth_date = parse_birth_date(birth_date_str)
-    birth_time = parse_birth_time(birth_time_str)
-    location = resolve_location(place_query, db_conn)
-    with natal_lock:
-        subject = build_subject(
-            name=user_identifier,
-            birth_date=birth_date,
-            birth_time=birth_time,
-            location=location,
-        )
-        svg_path = render_svg(subject, charts_dir, f"natal_{user_identifier}_{int(time.time())}")
-        chart_data = ChartDataFactory.create_natal_chart_data(subject)
-        summary = build_summary(subject, chart_data.aspects, location, birth_date, birth_time)
-        context_text = to_context(subject)
-    return NatalResult(summary=summary, svg_path=svg_path, context_text=context_text, location=location)
+
+    chart = chart_engine.get_engine().submit(
+        compute_natal,
+        user_identifier,
+        birth_date,
+        birth_time,
+        location,
+        charts_dir,
+    ).result()
+    return NatalResult(
+        summary=chart.summary,
+        svg_path=chart.svg_path,
+        context_text=chart.context_text,
+        location=location,
+        payload=chart.payload,
+    )
 
 
 def generate_natal_chart_from_location(
@@ -400,9 +437,6 @@ def generate_natal_chart_from_location(
     user_identifier: str,
     charts_dir: Optional[Path] = None,
 ) -> NatalResult:
-    charts_dir = charts_dir or config.get_charts_dir()
-    cleanup_old_svgs(charts_dir, CHART_CLEANUP_DAYS)
-
     location = LocationResult(
         query=place_label,
         display_name=place_label,
@@ -410,15 +444,10 @@ def generate_natal_chart_from_location(
         lng=lng,
         tz_str=tz_str,
     )
-    with natal_lock:
-        subject = build_subject(
-            name=user_identifier,
-            birth_date=birth_date,
-            birth_time=birth_time,
-            location=location,
-        )
-        svg_path = render_svg(subject, charts_dir, f"natal_{user_identifier}_{int(time.time())}")
-        chart_data = ChartDataFactory.create_natal_chart_data(subject)
-        summary = build_summary(subject, chart_data.aspects, location, birth_date, birth_time)
-        context_text = to_context(subject)
-    return NatalResult(summary=summary, svg_path=svg_path, context_text=context_text, location=location)
+    return generate_natal_chart(
+        birth_date=birth_date,
+        birth_time=birth_time,
+        location=location,
+        user_identifier=user_identifier,
+        charts_dir=charts_dir,
+    )
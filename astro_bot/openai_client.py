@@ -1,68 +1,319 @@
-"""Обертка для запросов к OpenAI Chat Completions API."""
+"""Асинхронная обертка для запросов к OpenAI Chat Completions API.
+
+Один keep-alive пул соединений (httpx.AsyncClient) на event loop, ограничение
+числа одновременных запросов, повторы с джиттером и circuit breaker, чтобы
+при недоступности OpenAI не копить зависшие запросы. Одинаковые запросы
+отвечаются из кэша (см. llm_cache).
+"""
 
 from __future__ import annotations
 
+import asyncio
+import json
 import logging
-from typing import Optional
+import time
+import weakref
+from contextlib import aclosing
+from dataclasses import dataclass
+from threading import Lock
+from typing import AsyncIterator, Optional
 
-import requests
+import httpx
 
-from astro_bot import config
+from astro_bot import backoff, config
+from astro_bot.llm_cache import cache, cache_key
 
 logger = logging.getLogger(__name__)
 
 OPENAI_URL = "https://api.openai.com/v1/chat/completions"
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
 
 
 class OpenAIError(Exception):
     """Базовая ошибка работы с OpenAI API."""
 
 
-def ask_gpt(question: str, role: str = "астролог/коуч/психолог") -> str:
-    """
-    Отправить вопрос в OpenAI и вернуть ответ.
+class CircuitOpenError(OpenAIError):
+    """OpenAI недавно много раз подряд не отвечал — запросы временно не отправляем."""
 
-    :param question: текст вопроса пользователя
-    :param role: стиль ответа
-    """
-    api_key = config.get_openai_api_key()
-    if not api_key:
-        raise OpenAIError("Не задан OPENAI_API_KEY")
 
-    model = config.get_openai_model()
-    temperature = config.get_openai_temperature()
+class CircuitBreaker:
+    """Простой breaker: после N ошибок подряд — пауза, затем одна пробная попытка."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_in_flight = False
+        self._trial_id = 0
+        self._lock = Lock()
+
+    def acquire(self) -> Optional[int]:
+        """None — отказ; 0 — обычный вызов; >0 — номер пробной попытки (half-open)."""
+        with self._lock:
+            if self._opened_at is None:
+                return 0
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return None
+            self._trial_in_flight = True  # half-open
+            self._trial_id += 1
+            return self._trial_id
+
+    def allow(self) -> bool:
+        return self.acquire() is not None
+
+    def release(self, trial: int) -> None:
+        """Пробная попытка закончилась без результата (отмена, закрытый поток) — освободить слот.
+
+        Вызывается в finally: после record_success/record_failure слот уже свободен,
+        а номер не даёт снять флаг чужой, более поздней пробной попытки.
+        """
+        with self._lock:
+            if trial and trial == self._trial_id:
+                self._trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
 
+@dataclass
+class _LoopState:
+    client: httpx.AsyncClient
+    semaphore: asyncio.Semaphore
+
+
+_states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+_breaker: Optional[CircuitBreaker] = None
+_breaker_lock = Lock()
+
+
+def get_breaker() -> CircuitBreaker:
+    """Общий breaker; создаётся при первом запросе по настройкам из env."""
+    global _breaker  # pylint: disable=global-statement
+    with _breaker_lock:
+        if _breaker is None:
+            _breaker = CircuitBreaker(
+                failure_threshold=config.get_openai_breaker_threshold(),
+                reset_timeout=config.get_openai_breaker_reset_seconds(),
+            )
+        return _breaker
+
+
+def reset_breaker() -> None:
+    """Забыть breaker: следующий запрос создаст новый по текущим настройкам."""
+    global _breaker  # pylint: disable=global-statement
+    with _breaker_lock:
+        _breaker = None
+
+
+def _get_state() -> _LoopState:
+    """Пул соединений и семафор привязаны к event loop, поэтому держим их по одному на loop."""
+    loop = asyncio.get_running_loop()
+    state = _states.get(loop)
+    if state is None or state.client.is_closed:
+        limit = config.get_openai_max_concurrency()
+        state = _LoopState(
+            client=httpx.AsyncClient(
+                timeout=httpx.Timeout(config.get_openai_timeout(), connect=10.0),
+                limits=httpx.Limits(max_connections=limit, max_keepalive_connections=limit),
+            ),
+            semaphore=asyncio.Semaphore(limit),
+        )
+        _states[loop] = state
+    return state
+
+
+async def aclose() -> None:
+    """Закрыть пул соединений текущего event loop (при остановке бота/API)."""
+    loop = asyncio.get_running_loop()
+    state = _states.pop(loop, None)
+    if state is not None:
+        await state.client.aclose()
+
+
+def build_request(question: str, role: str) -> dict:
+    """Тело запроса к Chat Completions."""
     system_prompt = (
         "Ты отвечаешь как дружелюбный астролог/коуч/психолог. "
         "Давай краткие, понятные ответы без сложного жаргона."
     )
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-    }
-    payload = {
-        "model": model,
-        "temperature": temperature,
+    return {
+        "model": config.get_openai_model(),
+        "temperature": config.get_openai_temperature(),
         "messages": [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": f"Стиль: {role}. Вопрос: {question}"},
         ],
     }
 
+
+def _auth_headers() -> dict:
+    api_key = config.get_openai_api_key()
+    if not api_key:
+        raise OpenAIError("Не задан OPENAI_API_KEY")
+    return {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+def _check_status(status_code: int, text: str, headers) -> Optional[str]:
+    """Разобрать неуспешный статус: для ретраябельных вернуть Retry-After, иначе бросить OpenAIError."""
+    logger.error("OpenAI вернул статус %s: %s", status_code, text)
+    if status_code not in RETRY_STATUSES:
+        # ошибка запроса (ключ, модель) ничего не говорит о здоровье OpenAI: не успех и не сбой,
+        # пробную попытку освободит release в _post/stream_gpt
+        raise OpenAIError(f"Ошибка OpenAI: {status_code}")
+    return headers.get("Retry-After")
+
+
+async def _post(payload: dict) -> dict:
+    """POST с повторами, ограничением параллелизма и breaker'ом; вернуть JSON ответа."""
+    headers = _auth_headers()
+    breaker = get_breaker()
+    trial = breaker.acquire()
+    if trial is None:
+        raise CircuitOpenError("OpenAI временно недоступен, попробуйте позже")
+    try:
+        return await _post_attempts(payload, headers)
+    finally:
+        breaker.release(trial)
+
+
+async def _post_attempts(payload: dict, headers: dict) -> dict:
+    state = _get_state()
+    retries = config.get_openai_max_retries()
+    last_error: Optional[OpenAIError] = None
+    for attempt in range(retries + 1):
+        retry_after = None
+        try:
+            async with state.semaphore:
+                response = await state.client.post(OPENAI_URL, json=payload, headers=headers)
+        except httpx.HTTPError as exc:
+            logger.warning("Ошибка сети при обращении к OpenAI (попытка %s): %s", attempt + 1, exc)
+            last_error = OpenAIError(f"Ошибка сети: {exc}")
+        else:
+            if response.status_code == 200:
+                get_breaker().record_success()
+                return response.json()
+            retry_after = _check_status(response.status_code, response.text, response.headers)
+            last_error = OpenAIError(f"Ошибка OpenAI: {response.status_code}")
+        if attempt < retries:
+            await asyncio.sleep(backoff.delay(attempt, retry_after, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS))
+
+    get_breaker().record_failure()
+    raise last_error or OpenAIError("OpenAI не ответил")
+
+
+def _parse_stream_line(line: str) -> Optional[str]:
+    """Строка SSE от OpenAI -> кусок текста ответа (или None)."""
+    if not line.startswith("data:"):
+        return None
+    data = line[len("data:"):].strip()
+    if not data or data == "[DONE]":
+        return None
     try:
-        response = requests.post(OPENAI_URL, json=payload, headers=headers, timeout=30)
-    except requests.RequestException as exc:
-        logger.exception("Ошибка сети при обращении к OpenAI")
-        raise OpenAIError(f"Ошибка сети: {exc}") from exc
+        return json.loads(data)["choices"][0]["delta"].get("content")
+    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+        logger.warning("Неожиданный фрагмент потока OpenAI: %s", data[:200])
+        return None
 
-    if response.status_code != 200:
-        logger.error("OpenAI вернул статус %s: %s", response.status_code, response.text)
-        raise OpenAIError(f"Ошибка OpenAI: {response.status_code}")
 
-    data = response.json()
+async def stream_gpt(question: str, role: str = "астролог/коуч/психолог") -> AsyncIterator[str]:
+    """Как ask_gpt, но отдаёт ответ кусками по мере генерации.
+
+    Повторы возможны только до первого полученного фрагмента. Ответ из кэша
+    отдаётся одним фрагментом; полный новый ответ попадает в кэш.
+    """
+    request = build_request(question, role)
+    key = cache_key(request)
+    cached = await cache.aget(key)
+    if cached is not None:
+        yield cached
+        return
+
+    payload = {**request, "stream": True}
+    headers = _auth_headers()
+    breaker = get_breaker()
+    trial = breaker.acquire()
+    if trial is None:
+        raise CircuitOpenError("OpenAI временно недоступен, попробуйте позже")
+    try:
+        async with aclosing(_stream_attempts(key, payload, headers)) as deltas:
+            async for delta in deltas:
+                yield delta
+    finally:
+        # отмена или закрытый генератор (GeneratorExit) не должны оставить breaker в half-open
+        breaker.release(trial)
+
+
+async def _stream_attempts(key: str, payload: dict, headers: dict) -> AsyncIterator[str]:
+    state = _get_state()
+    retries = config.get_openai_max_retries()
+    last_error: Optional[OpenAIError] = None
+    for attempt in range(retries + 1):
+        retry_after = None
+        started = False
+        try:
+            async with state.semaphore:
+                async with state.client.stream("POST", OPENAI_URL, json=payload, headers=headers) as response:
+                    if response.status_code == 200:
+                        parts = []
+                        async for line in response.aiter_lines():
+                            delta = _parse_stream_line(line)
+                            if delta:
+                                started = True
+                                parts.append(delta)
+                                yield delta
+                        get_breaker().record_success()
+                        await cache.aput(key, "".join(parts).strip())
+                        return
+                    body = (await response.aread()).decode("utf-8", errors="replace")
+                    retry_after = _check_status(response.status_code, body, response.headers)
+                    last_error = OpenAIError(f"Ошибка OpenAI: {response.status_code}")
+        except httpx.HTTPError as exc:
+            logger.warning("Ошибка сети в потоке OpenAI (попытка %s): %s", attempt + 1, exc)
+            last_error = OpenAIError(f"Ошибка сети: {exc}")
+            if started:
+                break
+        if attempt < retries:
+            await asyncio.sleep(backoff.delay(attempt, retry_after, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS))
+
+    get_breaker().record_failure()
+    raise last_error or OpenAIError("OpenAI не ответил")
+
+
+async def ask_gpt(question: str, role: str = "астролог/коуч/психолог") -> str:
+    """
+    Отправить вопрос в OpenAI и вернуть ответ.
+
+    :param question: текст вопроса пользователя
+    :param role: стиль ответа
+    """
+    request = build_request(question, role)
+    key = cache_key(request)
+    cached = await cache.aget(key)
+    if cached is not None:
+        return cached
+
+    data = await _post(request)
     try:
-        return data["choices"][0]["message"]["content"].strip()
+        answer = data["choices"][0]["message"]["content"].strip()
     except (KeyError, IndexError, TypeError) as exc:
         logger.exception("Неожиданный формат ответа OpenAI: %s", data)
         raise OpenAIError("Неожиданный ответ OpenAI") from exc
+    await cache.aput(key, answer)
+    return answer
@@ -0,0 +1,34 @@
+"""Схлопывание одинаковых одновременных вызовов (single flight).
+
+Пока вызов с некоторым ключом выполняется, повторные вызовы с тем же ключом
+не запускают работу заново, а ждут и получают тот же результат (или ту же
+ошибку). После завершения ключ освобождается — результат не кэшируется.
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class AsyncSingleFlight:
+    """Общая задача на ключ в пределах event loop.
+
+    Работа идёт в отдельной задаче под asyncio.shield: отмена одного из
+    ожидающих (клиент закрыл соединение) не отменяет её для остальных.
+    """
+
+    def __init__(self):
+        self._futures: Dict[Tuple[asyncio.AbstractEventLoop, Hashable], "asyncio.Future[Any]"] = {}
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        slot = (asyncio.get_running_loop(), key)
+        future = self._futures.get(slot)
+        if future is None:
+            future = asyncio.ensure_future(factory())
+            self._futures[slot] = future
+            future.add_done_callback(lambda _: self._futures.pop(slot, None))
+        return await asyncio.shield(future)
+
+    def in_flight(self) -> int:
+        return len(self._futures)
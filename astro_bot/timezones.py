@@ -0,0 +1,78 @@
+"""Часовые пояса: пояс по координатам и смещение от UTC.
+
+- TimezoneFinder создаётся при первом запросе, а не при импорте: процессам,
+  которые не геокодят (воркеры расчёта, health-check), он не нужен.
+  Грубую сетку отдельно не строим: у TimezoneFinder уже есть индекс ячеек,
+  где пояс однозначен, а точная проверка полигонов идёт только у границ.
+- Ответы кэшируются (LRU) по координатам, округлённым до 1e-4° (≈ 11 м);
+  пояс ищется для округлённой точки, так что кэш не зависит от порядка запросов.
+- Местное время переводится в UTC через zoneinfo; неоднозначный и пропущенный
+  час трактуются как fold=0, и тот же выбор передаётся kerykeion флагом is_dst.
+"""
+
+from __future__ import annotations
+
+import atexit
+import datetime as dt
+from functools import lru_cache
+from threading import Lock
+from typing import Any, Optional
+from zoneinfo import ZoneInfo
+
+COORD_DIGITS = 4
+COORD_CACHE_SIZE = 4096
+
+_finder: Any = None
+_finder_lock = Lock()
+
+
+def get_finder():
+    """Общий TimezoneFinder; создаётся при первом вызове."""
+    global _finder
+    if _finder is None:
+        with _finder_lock:
+            if _finder is None:
+                from timezonefinder import TimezoneFinder
+
+                _finder = TimezoneFinder()
+                # освобождаем до выгрузки модулей, иначе __del__ timezonefinder падает на выходе
+                atexit.register(_release_finder)
+    return _finder
+
+
+def _release_finder() -> None:
+    global _finder
+    _finder = None
+
+
+@lru_cache(maxsize=COORD_CACHE_SIZE)
+def _timezone_at(lat: float, lng: float) -> Optional[str]:
+    return get_finder().timezone_at(lat=lat, lng=lng)
+
+
+def timezone_at(lat: float, lng: float) -> Optional[str]:
+    """IANA-пояс для точки (None — открытое море или вне данных)."""
+    return _timezone_at(round(float(lat), COORD_DIGITS), round(float(lng), COORD_DIGITS))
+
+
+def utc_offset(tz_str: str, local: dt.datetime) -> dt.timedelta:
+    """Смещение от UTC для наивного местного времени (в неоднозначный час — первое, fold=0)."""
+    return local.replace(tzinfo=ZoneInfo(tz_str)).utcoffset()
+
+
+def to_utc(tz_str: str, local: dt.datetime) -> dt.datetime:
+    """Наивное местное время → aware-время в UTC."""
+    return (local - utc_offset(tz_str, local)).replace(tzinfo=dt.timezone.utc)
+
+
+def is_dst(tz_str: str, local: dt.datetime) -> bool:
+    """Флаг летнего времени для kerykeion (pytz), согласованный с to_utc.
+
+    pytz смотрит на него только в неоднозначный и несуществующий час перехода:
+    там он выбирает то же смещение, что и to_utc (fold=0), вместо исключения.
+    """
+    return bool(local.replace(tzinfo=ZoneInfo(tz_str)).dst())
+
+
+def clear_caches() -> None:
+    _timezone_at.cache_clear()
@@ -0,0 +1,75 @@
+"""Прогрев тяжёлых зависимостей после старта бота/API.
+
+Модули проекта импортируют kerykeion и timezonefinder лениво, поэтому процесс
+начинает принимать запросы сразу. Чтобы первый расчёт не платил за эти
+импорты, warm_up_in_background запускается из startup-хука уже после того,
+как сервер готов: импорт идёт в отдельном потоке и не блокирует event loop.
+При остановке процесса stop_warm_up дожидается этого потока: отменой задачи
+его не прервать, и без ожидания он успевал бы после shutdown_engine заново
+поднять пул расчёта.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+import time
+from typing import Optional
+
+from astro_bot import chart_engine, config, gazetteer, timezones
+
+logger = logging.getLogger(__name__)
+
+_stop = threading.Event()
+
+
+def _import_kerykeion() -> None:
+    import kerykeion  # noqa: F401  pylint: disable=import-outside-toplevel,unused-import
+
+
+def warm_up(stop: Optional[threading.Event] = None) -> float:
+    """Подгрузить kerykeion, TimezoneFinder, справочник и воркеры расчёта; вернуть секунды.
+
+    Если stop выставлен, оставшиеся шаги пропускаются.
+    """
+    started = time.perf_counter()
+    steps = (
+        _import_kerykeion,
+        timezones.get_finder,
+        lambda: gazetteer.get_gazetteer(config.get_gazetteer_path()),
+        lambda: chart_engine.get_engine().warm_up(),
+    )
+    for step in steps:
+        if stop is not None and stop.is_set():
+            break
+        step()
+    return time.perf_counter() - started
+
+
+async def _run() -> None:
+    try:
+        seconds = await asyncio.to_thread(warm_up, _stop)
+    except Exception:  # pylint: disable=broad-except
+        logger.warning("Прогрев зависимостей не удался", exc_info=True)
+        return
+    if _stop.is_set():
+        logger.info("Прогрев прерван остановкой через %.2f с", seconds)
+        return
+    logger.info("Зависимости прогреты за %.2f с", seconds)
+
+
+def warm_up_in_background() -> Optional["asyncio.Task[None]"]:
+    """Запустить прогрев фоновой задачей (если не выключен ASTRO_BOT_WARMUP=0)."""
+    if not config.get_warmup_enabled():
+        return None
+    _stop.clear()
+    return asyncio.get_running_loop().create_task(_run())
+
+
+async def stop_warm_up(task: Optional["asyncio.Task[None]"]) -> None:
+    """Прервать прогрев и дождаться его потока (до остановки пула расчёта)."""
+    if task is None:
+        return
+    _stop.set()
+    await task
@@ -0,0 +1,290 @@
+"""Фоновая уборка SVG-кругов: учёт файлов в БД, вытеснение по возрасту и квоте.
+
+Раньше каждый расчёт обходил весь каталог карт (glob + stat), и время росло
+с числом файлов. Теперь:
+
+- если бот и API пишут в один каталог кругов, убирает его один процесс: тот,
+  кто держит блокировку .wheel_janitor.lock в каталоге (первый запустившийся;
+  если он остановится, блокировку на следующем проходе возьмёт другой).
+  Учёт ведётся в таблице wheel_files его БД (путь, размер вместе со сжатыми
+  вариантами, время последнего обращения), так что квота одна на каталог;
+- отдача круга лишь отмечает обращение (touch) временем доступа файла
+  (atime), без БД; так отметку видит уборщик любого процесса;
+- раз в ASTRO_BOT_WHEEL_JANITOR_INTERVAL_SECONDS фоновая задача обходит
+  каталог и пишет в таблицу только изменения (новые круги другого процесса и
+  старых версий, продлённые обращения, исчезнувшие файлы), затем удаляет
+  круги, к которым не обращались дольше
+  ASTRO_BOT_WHEEL_MAX_AGE_DAYS, а затем самые давние, пока суммарный
+  размер больше ASTRO_BOT_WHEEL_QUOTA_MB (LRU).
+
+Обход идёт в фоновом потоке и не стоит на пути запросов. Удалённый круг API
+перерисует при следующем обращении (см. astro_api/wheels.py).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from contextlib import suppress
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from astro_bot import config, wheel_store
+
+try:
+    import fcntl
+except ImportError:  # не POSIX: блокировки нет, каждый процесс убирает свой каталог сам
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH = 500
+LOCK_NAME = ".wheel_janitor.lock"
+
+
+
+def create_tables(conn: sqlite3.Connection) -> None:
+    """Шаг миграции: таблица учёта файлов кругов."""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS wheel_files (
+            path TEXT PRIMARY KEY,
+            bytes INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        );
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_wheel_files_last_access ON wheel_files(last_access)")
+
+
+def _files(svg_path: Path) -> List[Path]:
+    return [svg_path, *(wheel_store.variant_path(svg_path, encoding) for encoding in wheel_store.ENCODING_SUFFIXES)]
+
+
+def _size(svg_path: Path) -> int:
+    total = 0
+    for path in _files(svg_path):
+        try:
+            total += path.stat().st_size
+        except OSError:
+            continue
+    return total
+
+
+def _accessed_at(stat: os.stat_result) -> float:
+    # atime ставит touch (и само чтение файла), mtime — запись; берём более позднее
+    return max(stat.st_atime, stat.st_mtime)
+
+
+def track(conn: sqlite3.Connection, svg_path: Path, *, now: Optional[float] = None) -> None:
+    """Зарегистрировать только что отрисованный круг в таблице этого процесса.
+
+    Если каталог убирает другой процесс, строка ему не нужна: он учтёт круг
+    при обходе, а лишние строки убирает scan, когда этот процесс станет владельцем.
+    """
+    now = time.time() if now is None else now
+    conn.execute(
+        """
+        INSERT INTO wheel_files (path, bytes, created_at, last_access) VALUES (?, ?, ?, ?)
+        ON CONFLICT(path) DO UPDATE SET bytes = excluded.bytes, last_access = excluded.last_access
+        """,
+        (str(svg_path), _size(Path(svg_path)), now, now),
+    )
+    conn.commit()
+
+
+def touch(svg_path: Path) -> None:
+    """Отметить обращение к кругу: atime файла (mtime не трогаем — от него ETag старых файлов).
+
+    Отметка на диске видна уборщику в любом процессе: scan переносит её в
+    таблицу, а _delete не удаляет круг, к которому обратились во время прохода.
+    """
+    with suppress(OSError):
+        os.utime(svg_path, ns=(time.time_ns(), os.stat(svg_path).st_mtime_ns))
+
+
+def scan(conn: sqlite3.Connection, charts_dir: Path) -> int:
+    """Обойти каталог и обновить только то, что изменилось с прошлого прохода.
+
+    Новые круги (другого процесса, старых версий) учитываются, у известных
+    продлевается обращение по atime/mtime, строки исчезнувших файлов удаляются.
+    Вернуть число впервые учтённых кругов.
+    """
+    if not charts_dir.exists():
+        return 0
+    known = dict(conn.execute("SELECT path, last_access FROM wheel_files"))
+    added, accessed = [], []
+    for svg_path in charts_dir.rglob("*.svg"):
+        path = str(svg_path)
+        try:
+            stat = svg_path.stat()
+        except OSError:
+            continue
+        last_access = known.pop(path, None)
+        if last_access is None:
+            added.append((path, _size(svg_path), stat.st_mtime, _accessed_at(stat)))
+        elif _accessed_at(stat) > last_access:
+            accessed.append((_accessed_at(stat), path))
+    conn.executemany(
+        "INSERT INTO wheel_files (path, bytes, created_at, last_access) VALUES (?, ?, ?, ?)", added
+    )
+    conn.executemany("UPDATE wheel_files SET last_access = ? WHERE path = ?", accessed)
+    # оставшиеся в known удалены не нами (другим владельцем каталога или вручную)
+    conn.executemany("DELETE FROM wheel_files WHERE path = ?", [(path,) for path in known])
+    conn.commit()
+    return len(added)
+
+
+def _used_since(path: str, started: float) -> bool:
+    """Обращались ли к кругу во время прохода (touch после его начала)."""
+    try:
+        return _accessed_at(os.stat(path)) >= started
+    except OSError:
+        return False
+
+
+def _delete(conn: sqlite3.Connection, rows: Iterable[Tuple[str, int]], started: float) -> Tuple[int, int]:
+    files = freed = 0
+    paths = []
+    used = []
+    for path, size in rows:
+        # круг только что отдали (строка charts.wheel_path на него ссылается) — не удаляем,
+        # а переносим в конец очереди; если всё же удалим, API его перерисует
+        if _used_since(path, started):
+            used.append((time.time(), path))
+            continue
+        # сначала .svg: пока он есть, сжатые варианты на месте (write_svg пишет их первыми)
+        for file_path in _files(Path(path)):
+            try:
+                file_path.unlink()
+            except FileNotFoundError:
+                continue
+            except OSError as exc:
+                logger.warning("Не удалось удалить %s: %s", file_path, exc)
+                continue
+        paths.append((path,))
+        files += 1
+        freed += size
+    conn.executemany("DELETE FROM wheel_files WHERE path = ?", paths)
+    conn.executemany("UPDATE wheel_files SET last_access = MAX(last_access, ?) WHERE path = ?", used)
+    return files, freed
+
+
+def sweep(
+    conn: sqlite3.Connection,
+    *,
+    max_age_seconds: float,
+    quota_bytes: int,
+    now: Optional[float] = None,
+) -> Tuple[int, int]:
+    """Один проход уборки по таблице; вернуть (удалено кругов, освобождено байт)."""
+    started = time.time()
+    now = started if now is None else now
+    removed = freed = 0
+    if max_age_seconds > 0:
+        while True:
+            rows = conn.execute(
+                "SELECT path, bytes FROM wheel_files WHERE last_access < ? ORDER BY last_access LIMIT ?",
+                (now - max_age_seconds, DELETE_BATCH),
+            ).fetchall()
+            if not rows:
+                break
+            files, size = _delete(conn, rows, started)
+            removed, freed = removed + files, freed + size
+            if not files:  # остались только круги, к которым обратились во время прохода
+                break
+    if quota_bytes > 0:
+        total = conn.execute("SELECT COALESCE(SUM(bytes), 0) FROM wheel_files").fetchone()[0]
+        while total > quota_bytes:
+            victims = []
+            excess = total - quota_bytes
+            for path, size in conn.execute(
+                "SELECT path, bytes FROM wheel_files ORDER BY last_access LIMIT ?", (DELETE_BATCH,)
+            ):
+                victims.append((path, size))
+                excess -= size
+                if excess <= 0:
+                    break
+            if not victims:
+                break
+            files, size = _delete(conn, victims, started)
+            removed, freed = removed + files, freed + size
+            # пропущенные (занятые) круги ушли в конец очереди; вычитаем только удалённое
+            total -= size
+            if not files:
+                break
+    conn.commit()
+    return removed, freed
+
+
+class WheelJanitor:
+    """Периодическая уборка в фоне; каждый проход — в потоке со своим соединением."""
+
+    def __init__(self, connect: Callable[[], sqlite3.Connection], charts_dir: Path):
+        self.connect = connect
+        self.charts_dir = charts_dir
+        self._task: Optional[asyncio.Task] = None
+        self._lock_file = None
+
+    def _acquire(self) -> bool:
+        """Взять (или удержать) блокировку каталога; False — каталог убирает другой процесс."""
+        if self._lock_file is None:
+            self.charts_dir.mkdir(parents=True, exist_ok=True)
+            lock_file = open(self.charts_dir / LOCK_NAME, "a+b")  # pylint: disable=consider-using-with
+            if fcntl is not None:
+                try:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    lock_file.close()
+                    return False
+            self._lock_file = lock_file
+        return True
+
+    def _release(self) -> None:
+        lock_file, self._lock_file = self._lock_file, None
+        if lock_file is not None:
+            lock_file.close()
+
+    def run_once(self) -> Tuple[int, int]:
+        """Один проход, если каталог убирает этот процесс; иначе (0, 0)."""
+        if not self._acquire():
+            return 0, 0
+        conn = self.connect()
+        try:
+            adopted = scan(conn, self.charts_dir)
+            if adopted:
+                logger.info("Учтено кругов без записи в wheel_files: %s", adopted)
+            return sweep(
+                conn,
+                max_age_seconds=config.get_wheel_max_age_days() * 86400,
+                quota_bytes=config.get_wheel_quota_bytes(),
+            )
+        finally:
+            conn.close()
+
+    async def _loop(self) -> None:
+        interval = config.get_wheel_janitor_interval()
+        while True:
+            try:
+                removed, freed = await asyncio.to_thread(self.run_once)
+                if removed:
+                    logger.info("Удалено кругов: %s (%s КиБ)", removed, freed // 1024)
+            except Exception:  # pylint: disable=broad-except
+                logger.exception("Ошибка уборки кругов")
+            await asyncio.sleep(interval)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        self._release()
+
@@ -0,0 +1,147 @@
+"""Хранилище SVG-кругов: контентная адресация, шардирование, сжатые варианты.
+
+Имя файла — sha256 от того, что нарисовано на круге (момент рождения в UTC,
+координаты, часовой пояс, система домов, набор точек, подписи), темы и
+версии kerykeion. Одинаковая карта у разных пользователей, в боте и в API
+рисуется один раз: если файл уже есть, рендер пропускается.
+
+Файлы раскладываются по подкаталогам ab/cd/<hash>.svg, чтобы в одном
+каталоге не копились сотни тысяч записей. Рядом пишутся .svg.gz и (если
+установлен brotli) .svg.br, чтобы API отдавало уже сжатые байты.
+Запись атомарная: временный файл + os.replace, сначала сжатые варианты,
+последним — .svg, так что существующий .svg означает готовый комплект.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # brotli — необязательная зависимость
+    brotli = None
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = 9
+
+THEME = "classic"
+# меняется, когда меняется то, как мы рисуем круг (заголовок, параметры ChartDrawer)
+LAYOUT_VERSION = 1
+
+# Content-Encoding -> суффикс файла
+ENCODING_SUFFIXES: Dict[str, str] = {"br": ".br", "gzip": ".gz"}
+
+# поля субъекта, от которых зависит рисунок (имя — только если оно рисуется)
+SUBJECT_FIELDS = (
+    "iso_formatted_utc_datetime",
+    "lat",
+    "lng",
+    "tz_str",
+    "houses_system_identifier",
+    "zodiac_type",
+    "sidereal_mode",
+    "perspective_type",
+    "active_points",
+)
+
+
+@lru_cache(maxsize=1)
+def _kerykeion_version() -> str:
+    from importlib.metadata import PackageNotFoundError, version  # pylint: disable=import-outside-toplevel
+
+    try:
+        return version("kerykeion")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def _field(subject: Any, name: str) -> Any:
+    value = subject.get(name) if isinstance(subject, dict) else getattr(subject, name, None)
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, (list, tuple)):
+        return [str(item) for item in value]
+    return None if value is None else str(value)
+
+
+def subject_key(subject: Any, *, with_name: bool = False) -> Dict[str, Any]:
+    """Входы рисунка для субъекта kerykeion (модель или её model_dump())."""
+    key = {name: _field(subject, name) for name in SUBJECT_FIELDS}
+    if with_name:
+        key["name"] = _field(subject, "name")
+    return key
+
+
+def wheel_key(kind: str, *subjects: Dict[str, Any], theme: str = THEME) -> str:
+    """sha256 от вида круга, входов субъектов, темы и версии рендера."""
+    material = {
+        "kind": kind,
+        "subjects": list(subjects),
+        "theme": theme,
+        "layout": LAYOUT_VERSION,
+        "kerykeion": _kerykeion_version(),
+    }
+    raw = json.dumps(material, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def wheel_path(charts_dir: Path, key: str) -> Path:
+    """charts_dir/ab/cd/<key>.svg."""
+    return charts_dir / key[:2] / key[2:4] / f"{key}.svg"
+
+
+def key_from_path(svg_path) -> Optional[str]:
+    """Ключ круга по пути из хранилища; None для файлов старых версий (natal_<имя>_<jd>.svg)."""
+    if not svg_path:
+        return None
+    stem = Path(svg_path).stem
+    if len(stem) != 64 or any(ch not in "0123456789abcdef" for ch in stem):
+        return None
+    return stem
+
+
+def variant_path(svg_path: Path, encoding: str) -> Path:
+    """Путь к сжатому варианту SVG для данного Content-Encoding."""
+    return svg_path.with_name(svg_path.name + ENCODING_SUFFIXES[encoding])
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _encoded(raw: bytes) -> Iterable[tuple]:
+    # mtime=0 — одинаковый SVG даёт одинаковые байты .gz
+    yield "gzip", gzip.compress(raw, compresslevel=GZIP_LEVEL, mtime=0)
+    if brotli is not None:
+        yield "br", brotli.compress(raw, quality=BROTLI_QUALITY)
+
+
+def write_svg(svg_text: str, svg_path: Path) -> Path:
+    """Атомарно записать SVG и его gzip/brotli варианты, вернуть svg_path."""
+    svg_path.parent.mkdir(parents=True, exist_ok=True)
+    raw = svg_text.encode("utf-8")
+    for encoding, data in _encoded(raw):
+        _write_atomic(variant_path(svg_path, encoding), data)
+    _write_atomic(svg_path, raw)
+    return svg_path
+
+
+def ensure_svg(charts_dir: Path, key: str, draw: Callable[[], Any]) -> Path:
+    """Вернуть круг по ключу; draw() (ChartDrawer) вызывается, только если файла ещё нет."""
+    svg_path = wheel_path(charts_dir, key)
+    if svg_path.exists():
+        return svg_path
+    return write_svg(draw().generate_svg_string(minify=True), svg_path)
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import asyncio
+import datetime as dt
 import json
 import importlib
 import os
@@ -12,9 +14,9 @@ from unittest.mock import patch
 
 from fastapi.testclient import TestClient
 
-from astro_api import db
+from astro_api import db, wheels
 from astro_api.main import app
-from astro_bot import natal_engine
+from astro_bot import chart_engine, natal_engine, wheel_store
 
 
 class ApiAskInsightsTest(unittest.TestCase):
@@ -81,6 +83,36 @@ class ApiAskInsightsTest(unittest.TestCase):
         self.assertTrue(data["history"])
         self.assertEqual(data["history"][-1]["question"], "Что по солнцу?")
 
+    def test_ask_stream_endpoint(self):
+        async def fake_stream(question, role="астролог"):
+            for piece in ("Солнце ", "в Овне"):
+                yield piece
+
+        with patch("astro_bot.openai_client.stream_gpt", new=fake_stream):
+            resp = self.client.post("/api/ask/stream", json={"chart_id": self.chart_id, "question": "Солнце?"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.headers["content-type"].startswith("text/event-stream"))
+        events = [block.split("\n") for block in resp.text.strip().split("\n\n")]
+        self.assertEqual([e[0] for e in events], ["event: delta", "event: delta", "event: done"])
+        done = json.loads(events[-1][1][len("data: "):])
+        self.assertEqual(done["answer"], "Солнце в Овне")
+        self.assertEqual(done["history"][-1]["question"], "Солнце?")
+
+        conn = db.get_connection()
+        stored = db.list_chat_messages(conn, chart_id=self.chart_id, limit=1)
+        conn.close()
+        self.assertEqual(stored[0]["answer"], "Солнце в Овне")
+
+    def test_insights_stream_reports_error(self):
+        async def failing_stream(question, role="астролог"):
+            raise RuntimeError("boom")
+            yield  # pragma: no cover
+
+        with patch("astro_bot.openai_client.stream_gpt", new=failing_stream):
+            resp = self.client.get(f"/api/insights/{self.chart_id}/stream")
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("event: error", resp.text)
+
     def test_recent_charts(self):
         resp = self.client.get("/api/charts/recent?limit=3")
         self.assertEqual(resp.status_code, 200)
@@ -122,6 +154,100 @@ class ApiAskInsightsTest(unittest.TestCase):
         self.assertEqual(data["chart_id"], 99)
         self.assertIn("wheel_url", data)
 
+    def test_wheel_rendered_lazily_on_first_get(self):
+        location = natal_engine.LocationResult(
+            query="Moscow",
+            display_name="Moscow",
+            lat=55.75,
+            lng=37.61,
+            tz_str="Europe/Moscow",
+        )
+        bundle = natal_engine.build_chart_bundle("123", dt.date(1990, 3, 12), dt.time(10, 30), location)
+        conn = db.get_connection()
+        chart_id = db.insert_chart(
+            conn,
+            profile_id=self.profile_id,
+            chart_json=json.dumps(bundle.payload),
+            wheel_path=None,
+            summary=bundle.summary,
+        )
+        os.environ["WEBAPP_DIST_DIR"] = str(Path(self.tempdir.name) / "dist")
+        try:
+            with patch("astro_bot.chart_engine.get_engine", return_value=chart_engine.ChartEngine(workers=0)):
+                resp = self.client.get(f"/api/natal/{chart_id}/wheel.svg", headers={"Accept-Encoding": "gzip"})
+        finally:
+            os.environ.pop("WEBAPP_DIST_DIR", None)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["content-encoding"], "gzip")
+        self.assertEqual(resp.headers["content-type"], "image/svg+xml")
+        self.assertIn("<svg", resp.text)
+        plain = self.client.get(f"/api/natal/{chart_id}/wheel.svg", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("content-encoding", plain.headers)
+        self.assertEqual(plain.text, resp.text)
+        wheel_path = db.get_chart(conn, chart_id)["wheel_path"]
+        conn.close()
+        self.assertTrue(wheel_path.startswith(str(Path(self.tempdir.name) / "charts")))
+
+    def test_missing_wheel_regenerated_from_profile(self):
+        # setUp chart_json is too sparse to draw, so the profile row is used
+        (Path(self.tempdir.name) / "wheel.svg").unlink()
+        os.environ["WEBAPP_DIST_DIR"] = str(Path(self.tempdir.name) / "dist")
+        try:
+            with patch("astro_bot.chart_engine.get_engine", return_value=chart_engine.ChartEngine(workers=0)):
+                resp = self.client.get(f"/api/natal/{self.chart_id}/wheel.svg")
+        finally:
+            os.environ.pop("WEBAPP_DIST_DIR", None)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("<svg", resp.text)
+        conn = db.get_connection()
+        self.assertTrue(Path(db.get_chart(conn, self.chart_id)["wheel_path"]).exists())
+        conn.close()
+
+    def test_choose_encoding(self):
+        svg_path = Path(self.tempdir.name) / "enc.svg"
+        wheel_store.write_svg("<svg></svg>", svg_path)
+        self.assertEqual(wheels.choose_encoding("gzip, deflate, br", svg_path), "br")
+        self.assertEqual(wheels.choose_encoding("gzip;q=1.0, br;q=0", svg_path), "gzip")
+        self.assertEqual(wheels.choose_encoding("*", svg_path), "br")
+        self.assertIsNone(wheels.choose_encoding("identity", svg_path))
+        self.assertIsNone(wheels.choose_encoding(None, svg_path))
+
+    def test_wheel_single_flight_shares_render(self):
+        calls = []
+
+        async def render():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return Path("wheel.svg")
+
+        async def run():
+            return await asyncio.gather(*(wheels.single_flight("natal:1", render) for _ in range(5)))
+
+        results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(set(results), {Path("wheel.svg")})
+
+    def test_wheel_render_outlives_cancelled_request(self):
+        (Path(self.tempdir.name) / "wheel.svg").unlink()
+        conn = db.get_connection()
+        row = db.get_chart(conn, self.chart_id)
+        conn.close()
+        charts_dir = Path(self.tempdir.name) / "charts"
+
+        async def run():
+            engine = chart_engine.ChartEngine(workers=0)
+            with patch("astro_bot.chart_engine.get_engine", return_value=engine):
+                request = asyncio.ensure_future(wheels.ensure_natal_wheel(row, charts_dir))
+                await asyncio.sleep(0)
+                request.cancel()  # client went away; the shared render keeps going
+                await asyncio.sleep(0)
+                return await wheels.ensure_natal_wheel(row, charts_dir)
+
+        wheel_path = asyncio.run(run())
+        conn = db.get_connection()
+        self.assertEqual(db.get_chart(conn, self.chart_id)["wheel_path"], str(wheel_path))
+        conn.close()
+
     def test_root_fallback_without_dist(self):
         # Force dist to non-existing dir and reload app module
         os.environ["WEBAPP_DIST_DIR"] = str(Path(self.tempdir.name) / "no_dist")
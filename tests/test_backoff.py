@@ -0,0 +1,24 @@
+"""Tests for the shared retry backoff of the OpenAI and OpenCage clients."""
+
+from __future__ import annotations
+
+import unittest
+
+from astro_bot import backoff
+
+
+class BackoffTest(unittest.TestCase):
+    def test_backoff_is_jittered_and_capped(self):
+        delays = {backoff.delay(10, base=0.5, cap=8.0) for _ in range(20)}
+        self.assertTrue(all(0 <= d <= 8.0 for d in delays))
+        self.assertGreater(len(delays), 1)
+        self.assertTrue(all(0 <= backoff.delay(0, base=0.5, cap=8.0) <= 0.5 for _ in range(20)))
+
+    def test_retry_after_raises_the_delay_up_to_the_cap(self):
+        self.assertGreaterEqual(backoff.delay(0, "3", base=0.5, cap=8.0), 3)
+        self.assertEqual(backoff.delay(0, "60", base=0.5, cap=4.0), 4.0)
+        self.assertLessEqual(backoff.delay(0, "Wed, 21 Oct 2026 07:28:00 GMT", base=0.5, cap=8.0), 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
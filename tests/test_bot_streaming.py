@@ -0,0 +1,49 @@
+"""Tests for progressive Telegram replies (stream_reply)."""
+
+from __future__ import annotations
+
+import asyncio
+import unittest
+
+from astro_bot import bot
+
+
+class FakeMessage:
+    def __init__(self, sent):
+        self.sent = sent
+        self.text = None
+
+    async def reply_text(self, text):
+        message = FakeMessage(self.sent)
+        message.text = text
+        self.sent.append(message)
+        return message
+
+    async def edit_text(self, text):
+        self.text = text
+
+
+async def _deltas(pieces):
+    for piece in pieces:
+        yield piece
+
+
+class StreamReplyTest(unittest.TestCase):
+    def test_edits_single_message_until_done(self):
+        sent = []
+        answer = asyncio.run(bot.stream_reply(FakeMessage(sent), _deltas(["Пер", "вый ", "ответ"]), interval=0))
+        self.assertEqual(answer, "Первый ответ")
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(sent[0].text, "Первый ответ")
+
+    def test_long_answer_continues_in_new_messages(self):
+        sent = []
+        pieces = [f"строка {i}\n" for i in range(40)]
+        answer = asyncio.run(bot.stream_reply(FakeMessage(sent), _deltas(pieces), max_len=100, interval=0))
+        self.assertGreater(len(sent), 1)
+        self.assertTrue(all(len(m.text) <= 100 for m in sent))
+        self.assertEqual("\n".join(m.text for m in sent), answer)
+
+
+if __name__ == "__main__":
+    unittest.main()
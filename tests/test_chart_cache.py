@@ -0,0 +1,110 @@
+"""Tests for the content-addressed natal chart cache."""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from astro_api import chart_cache, chart_store, db, natal_service
+from astro_bot import chart_engine, natal_engine
+
+
+MOSCOW = natal_engine.LocationResult(
+    query="Москва",
+    display_name="Москва, Россия",
+    lat=55.7558,
+    lng=37.6173,
+    tz_str="Europe/Moscow",
+)
+
+
+class ChartCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        os.environ.pop("OPENAI_API_KEY", None)
+        self.conn = db.get_connection()
+        db.init_db(self.conn)
+        chart_cache.clear_memory()
+        self.engine = chart_engine.ChartEngine(workers=0)
+
+    def tearDown(self):
+        self.conn.close()
+        chart_cache.clear_memory()
+        self.tempdir.cleanup()
+
+    def test_key_ignores_labels_and_tiny_coordinate_noise(self):
+        other = natal_engine.LocationResult(
+            query="Moscow",
+            display_name="Moscow, Russia",
+            lat=55.75581,
+            lng=37.61731,
+            tz_str="Europe/Moscow",
+        )
+        key = chart_cache.cache_key(dt.date(1990, 3, 12), dt.time(10, 30), MOSCOW)
+        self.assertEqual(key, chart_cache.cache_key(dt.date(1990, 3, 12), dt.time(10, 30), other))
+        self.assertNotEqual(key, chart_cache.cache_key(dt.date(1990, 3, 12), dt.time(10, 31), MOSCOW))
+
+    def _calc(self, user: str, telegram_user_id):
+        with patch("astro_api.natal_service.resolve_location", return_value=MOSCOW), patch(
+            "astro_bot.chart_engine.get_engine", return_value=self.engine
+        ):
+            return asyncio.run(
+                natal_service.calculate_natal_chart(
+                    birth_date_str="12.03.1990",
+                    birth_time_str="10:30",
+                    place_query="Москва",
+                    user_identifier=user,
+                    charts_dir=Path(self.tempdir.name) / "charts",
+                    telegram_user_id=telegram_user_id,
+                )
+            )
+
+    def test_second_user_skips_ephemeris(self):
+        first = self._calc("111", 111)
+        with patch("astro_bot.natal_engine.compute_natal", side_effect=AssertionError("recomputed")):
+            second = self._calc("222", 222)
+        self.assertNotEqual(first["chart_id"], second["chart_id"])
+        self.assertEqual(second["chart"]["subject"]["name"], "222")
+        self.assertEqual(len(second["chart"]["aspects"]), len(first["chart"]["aspects"]))
+        self.assertEqual(second["summary"], first["summary"])
+        self.assertTrue(second["context_text"].startswith('Chart for "222"'))
+        self.assertIsNone(second["wheel_path"])
+
+    def test_hit_does_not_leak_first_callers_identifier(self):
+        first = self._calc("user-111", 111)
+        self.assertTrue(all(a["p1_owner"] == "user-111" for a in first["chart"]["aspects"]))
+        second = self._calc("user-222", 222)
+        owners = {a[field] for a in second["chart"]["aspects"] for field in ("p1_owner", "p2_owner")}
+        self.assertEqual(owners, {"user-222"})
+        self.assertNotIn("user-111", json.dumps(second, ensure_ascii=False, default=str))
+        conn = db.get_connection()
+        stored = chart_store.decode_chart(db.get_chart(conn, second["chart_id"])["chart_json"])
+        conn.close()
+        self.assertNotIn("user-111", json.dumps(stored, ensure_ascii=False, default=str))
+
+    def test_sqlite_tier_survives_memory_reset(self):
+        self._calc("111", 111)
+        chart_cache.clear_memory()
+        key = chart_cache.cache_key(dt.date(1990, 3, 12), dt.time(10, 30), MOSCOW)
+        cached = chart_cache.get(
+            self.conn,
+            key,
+            name="guest",
+            location=MOSCOW,
+            birth_date=dt.date(1990, 3, 12),
+            birth_time=None,
+        )
+        self.assertIsNotNone(cached)
+        self.assertIn("Время: неизвестно", cached.summary)
+        self.assertIsNone(cached.payload["birth_time"])
+
+
+if __name__ == "__main__":
+    unittest.main()
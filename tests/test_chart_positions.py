@@ -0,0 +1,87 @@
+"""Tests for the normalized chart_positions table."""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from astro_api import chart_store, db
+from astro_bot import natal_engine
+
+
+MOSCOW = natal_engine.LocationResult(
+    query="Москва",
+    display_name="Москва, Россия",
+    lat=55.7558,
+    lng=37.6173,
+    tz_str="Europe/Moscow",
+)
+
+
+class ChartPositionsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.payload = natal_engine.build_chart_bundle("1", dt.date(1990, 3, 12), dt.time(10, 30), MOSCOW).payload
+        cls.no_time = natal_engine.build_chart_bundle("2", dt.date(1990, 3, 12), None, MOSCOW).payload
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        self.conn = db.get_connection()
+        db.init_db(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tempdir.cleanup()
+
+    def _insert(self, payload, *, with_positions=True) -> int:
+        return db.insert_chart(
+            self.conn,
+            profile_id=None,
+            chart_json=chart_store.encode_chart(payload),
+            wheel_path=None,
+            summary="s",
+            positions=chart_store.chart_positions(payload) if with_positions else (),
+        )
+
+    def test_positions_follow_the_payload(self):
+        rows = {row[0]: row for row in chart_store.chart_positions(self.payload)}
+        self.assertEqual(rows["Sun"][1], "Pis")
+        self.assertEqual(rows["Sun"][3], 11)
+        self.assertEqual(rows["Pluto"][4], 1)
+        self.assertIsNone(rows["First_House"][3])
+        # houses computed for noon are not recorded
+        self.assertTrue(all(row[3] is None for row in chart_store.chart_positions(self.no_time)))
+
+    def test_queries(self):
+        self._insert(self.payload)
+        self._insert(self.payload)
+        self._insert(self.no_time)
+        self.assertEqual(db.count_charts_with_position(self.conn, point="Sun", sign="Pis"), 3)
+        self.assertEqual(db.count_charts_with_position(self.conn, point="Moon", house=5), 2)
+        self.assertEqual(db.count_charts_with_position(self.conn, point="Pluto", retrograde=True), 3)
+        self.assertEqual(db.count_charts_with_position(self.conn, point="Sun", sign="Ari"), 0)
+        self.assertEqual(db.position_distribution(self.conn, point="Sun"), {"Pis": 3})
+        self.assertEqual(db.position_distribution(self.conn, point="Sun", by="house"), {11: 2})
+        self.assertEqual(len(db.list_charts_with_position(self.conn, point="Moon", sign="Lib", limit=2)), 2)
+        with self.assertRaises(ValueError):
+            db.position_distribution(self.conn, point="Sun", by="abs_pos")
+
+    def test_backfill_fills_only_missing_charts(self):
+        first = self._insert(self.payload, with_positions=False)
+        legacy = db.insert_chart(
+            self.conn, profile_id=None, chart_json=json.dumps(self.payload), wheel_path=None, summary="s"
+        )
+        self._insert(self.payload)
+        self.assertEqual(db.backfill_chart_positions(self.conn, batch_size=1), 2)
+        self.assertEqual(db.backfill_chart_positions(self.conn), 0)
+        self.assertEqual(db.count_charts_with_position(self.conn, point="Sun", sign="Pis"), 3)
+        self.assertIn(first, db.list_charts_with_position(self.conn, point="Moon", house=5))
+        self.assertIn(legacy, db.list_charts_with_position(self.conn, point="Moon", house=5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,210 @@
+"""Tests for the compact chart/synastry storage format."""
+
+from __future__ import annotations
+
+import datetime as dt
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+from kerykeion import ChartDataFactory
+from kerykeion.schemas.kr_models import AstrologicalSubjectModel, HouseComparisonModel
+
+from astro_api import chart_store, db, insights_service
+from astro_api.main import app
+from astro_bot import chart_engine, natal_engine
+
+
+MOSCOW = natal_engine.LocationResult(
+    query="Москва",
+    display_name="Москва, Россия",
+    lat=55.7558,
+    lng=37.6173,
+    tz_str="Europe/Moscow",
+)
+
+API_POINT_FIELDS = ("name", "sign", "sign_num", "position", "abs_pos", "house", "retrograde", "quality", "element")
+API_ASPECT_FIELDS = ("p1_name", "p2_name", "p1_owner", "p2_owner", "aspect", "aspect_degrees", "aspect_movement")
+
+
+class ChartStoreTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.bundle = natal_engine.build_chart_bundle("123", dt.date(1990, 3, 12), dt.time(10, 30), MOSCOW)
+        # JSON round trip: what legacy rows hold
+        cls.payload = json.loads(json.dumps(cls.bundle.payload, ensure_ascii=False))
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        self.conn = db.get_connection()
+        db.init_db(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tempdir.cleanup()
+
+    def assertPointsEqual(self, decoded: dict, original: dict):
+        for key, point in original.items():
+            if not isinstance(point, dict) or "abs_pos" not in point:
+                continue
+            for field in API_POINT_FIELDS:
+                if isinstance(point[field], float):
+                    self.assertAlmostEqual(decoded[key][field], point[field], places=5, msg=f"{key}.{field}")
+                else:
+                    self.assertEqual(decoded[key][field], point[field], f"{key}.{field}")
+
+    def test_chart_round_trip_keeps_api_fields(self):
+        stored = chart_store.encode_chart(self.payload)
+        self.assertTrue(chart_store.is_compact(stored))
+        self.assertLess(len(stored) * 10, len(json.dumps(self.payload, ensure_ascii=False).encode()))
+
+        decoded = chart_store.decode_chart(stored)
+        self.assertPointsEqual(decoded["subject"], self.payload["subject"])
+        self.assertEqual(decoded["subject"]["julian_day"], self.payload["subject"]["julian_day"])
+        self.assertEqual(decoded["location"], self.payload["location"])
+        self.assertEqual((decoded["birth_date"], decoded["birth_time"]), ("1990-03-12", "10:30:00"))
+        self.assertEqual(len(decoded["aspects"]), len(self.payload["aspects"]))
+        for got, expected in zip(decoded["aspects"], self.payload["aspects"]):
+            for field in API_ASPECT_FIELDS:
+                self.assertEqual(got[field], expected[field])
+            self.assertAlmostEqual(got["orbit"], expected["orbit"], places=5)
+            self.assertAlmostEqual(got["p2_abs_pos"], expected["p2_abs_pos"], places=5)
+        self.assertEqual(
+            insights_service.build_context_from_chart(decoded),
+            insights_service.build_context_from_chart(self.payload),
+        )
+
+    def test_legacy_json_and_empty_values_are_read(self):
+        self.assertEqual(chart_store.decode_chart(json.dumps(self.payload)), self.payload)
+        self.assertIsNone(chart_store.decode_chart(None))
+        self.assertIsNone(chart_store.decode_synastry(""))
+        with self.assertRaises(chart_store.ChartFormatError):
+            chart_store.decode_chart(chart_store.MAGIC + bytes([99]))
+
+    @staticmethod
+    def _synastry() -> dict:
+        first = natal_engine.build_subject(name="self", birth_date=dt.date(1990, 3, 12), birth_time=dt.time(10, 30), location=MOSCOW)
+        second = natal_engine.build_subject(name="partner", birth_date=dt.date(1992, 7, 1), birth_time=None, location=MOSCOW)
+        data = ChartDataFactory.create_synastry_chart_data(first, second, include_house_comparison=True)
+        return json.loads(
+            json.dumps(
+                {
+                    "first_subject": data.first_subject.model_dump(),
+                    "second_subject": data.second_subject.model_dump(),
+                    "aspects": [a.model_dump() for a in data.aspects],
+                    "house_comparison": data.house_comparison.model_dump(),
+                    "overlays": [{"point": "Sun", "house": "First_House"}],
+                }
+            )
+        )
+
+    def test_synastry_round_trip_keeps_public_shape(self):
+        synastry = self._synastry()
+        decoded = chart_store.decode_synastry(chart_store.encode_synastry(synastry))
+        self.assertEqual(decoded["overlays"], synastry["overlays"])
+        self.assertPointsEqual(decoded["second_subject"], synastry["second_subject"])
+        self.assertEqual(
+            [(a["p1_owner"], a["p1_name"], a["p2_owner"], a["p2_name"]) for a in decoded["aspects"]],
+            [(a["p1_owner"], a["p1_name"], a["p2_owner"], a["p2_name"]) for a in synastry["aspects"]],
+        )
+        for key in ("first_subject", "second_subject"):
+            model = AstrologicalSubjectModel.model_validate(decoded[key])
+            self.assertEqual((model.city, model.nation), (synastry[key]["city"], synastry[key]["nation"]))
+            self.assertAlmostEqual(model.sun.speed, synastry[key]["sun"]["speed"], places=5)
+
+        comparison = decoded["house_comparison"]
+        self.assertEqual(set(comparison), set(synastry["house_comparison"]))
+        for key, items in synastry["house_comparison"].items():
+            if not isinstance(items, list):
+                self.assertEqual(comparison[key], items)
+                continue
+            self.assertEqual(len(comparison[key]), len(items))
+            for got, expected in zip(comparison[key], items):
+                got, degree = dict(got), expected["point_degree"]
+                self.assertAlmostEqual(got.pop("point_degree"), degree, places=5)
+                self.assertEqual(got, {k: v for k, v in expected.items() if k != "point_degree"})
+        HouseComparisonModel.model_validate(comparison)
+
+    def test_api_returns_synastry_as_json_text(self):
+        synastry = self._synastry()
+        comp_id = db.insert_compatibility(
+            self.conn,
+            user_id="1",
+            self_profile_id=None,
+            partner_profile_id=None,
+            synastry_json=chart_store.encode_synastry(synastry),
+            score_json=None,
+            top_aspects_json=None,
+            wheel_path=None,
+        )
+        data = TestClient(app).get(f"/api/compatibility/{comp_id}").json()
+        self.assertIsInstance(data["synastry"], str)
+        served = json.loads(data["synastry"])
+        self.assertEqual(set(served), set(synastry))
+        self.assertEqual(
+            len(served["house_comparison"]["first_points_in_second_houses"]),
+            len(synastry["house_comparison"]["first_points_in_second_houses"]),
+        )
+        self.assertEqual(data["overlays"], synastry["overlays"])
+
+    def _insert_chart(self, chart_json) -> int:
+        return db.insert_chart(self.conn, profile_id=None, chart_json=chart_json, wheel_path=None, summary="s")
+
+    def test_migrate_rows_converts_text_and_keeps_unknown_shapes(self):
+        legacy_id = self._insert_chart(json.dumps(self.payload, ensure_ascii=False))
+        sparse_id = self._insert_chart(json.dumps({"subject": {"sun": {"name": "Sun", "sign": "Ari"}}, "aspects": []}))
+        compact_id = self._insert_chart(chart_store.encode_chart(self.payload))
+
+        counts = chart_store.migrate_rows(self.conn, batch_size=2)
+        self.assertEqual(counts["charts_converted"], 1)
+        self.assertEqual(counts["charts_skipped"], 1)
+        self.assertTrue(chart_store.is_compact(db.get_chart(self.conn, legacy_id)["chart_json"]))
+        self.assertIsInstance(db.get_chart(self.conn, sparse_id)["chart_json"], str)
+        self.assertTrue(chart_store.is_compact(db.get_chart(self.conn, compact_id)["chart_json"]))
+        # second run has nothing left to convert
+        self.assertEqual(chart_store.migrate_rows(self.conn)["charts_converted"], 0)
+
+    def test_api_serves_compact_rows_and_redraws_wheel_from_stored_subject(self):
+        chart_id = self._insert_chart(chart_store.encode_chart(self.payload))
+        comp_id = db.insert_compatibility(
+            self.conn,
+            user_id="1",
+            self_profile_id=None,
+            partner_profile_id=None,
+            synastry_json=chart_store.encode_synastry(self._synastry()),
+            score_json=None,
+            top_aspects_json=None,
+            wheel_path=None,
+        )
+        client = TestClient(app)
+        resp = client.get(f"/api/natal/{chart_id}")
+        self.assertEqual(resp.status_code, 200)
+        # the stored JSON text, as before the compact format
+        chart = json.loads(resp.json()["chart"])
+        self.assertEqual(chart["subject"]["sun"]["sign"], self.payload["subject"]["sun"]["sign"])
+        self.assertEqual(chart["location"]["display_name"], "Москва, Россия")
+
+        os.environ["WEBAPP_DIST_DIR"] = str(Path(self.tempdir.name) / "dist")
+        try:
+            # drawn from the decoded subjects: no ephemeris run, no profiles needed
+            with patch("astro_bot.chart_engine.get_engine", return_value=chart_engine.ChartEngine(workers=0)), patch(
+                "astro_bot.natal_engine.compute_natal", side_effect=AssertionError("recomputed")
+            ), patch("astro_api.compatibility_service.compute_synastry", side_effect=AssertionError("recomputed")):
+                wheel = client.get(f"/api/natal/{chart_id}/wheel.svg")
+                synastry_wheel = client.get(f"/api/compatibility/{comp_id}/wheel.svg")
+        finally:
+            os.environ.pop("WEBAPP_DIST_DIR", None)
+        for resp in (wheel, synastry_wheel):
+            self.assertEqual(resp.status_code, 200)
+            self.assertIn("<svg", resp.text)
+        stored = db.get_chart(self.conn, chart_id)["wheel_path"]
+        self.assertEqual(Path(stored).stem, natal_engine.natal_wheel_key(self.payload["subject"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,7 @@
 
 from __future__ import annotations
 
+import datetime as dt
 import json
 import os
 import tempfile
@@ -11,8 +12,9 @@ from unittest.mock import patch
 
 from fastapi.testclient import TestClient
 
-from astro_api import db
+from astro_api import compatibility_service, db
 from astro_api.main import app
+from astro_bot import chart_engine, natal_engine
 
 
 class CompatibilityApiTest(unittest.TestCase):
@@ -81,6 +83,54 @@ class CompatibilityApiTest(unittest.TestCase):
         self.assertEqual(resp2.status_code, 200)
         self.assertEqual(resp2.headers["content-type"], "image/svg+xml")
 
+    def test_missing_wheel_regenerated_from_synastry_json(self):
+        location = natal_engine.LocationResult(
+            query="Moscow",
+            display_name="Moscow",
+            lat=55.75,
+            lng=37.61,
+            tz_str="Europe/Moscow",
+        )
+        synastry_data, wheel_path = compatibility_service.compute_synastry(
+            "1",
+            dt.date(1990, 3, 12),
+            None,
+            location,
+            dt.date(1991, 1, 1),
+            dt.time(3, 0),
+            location,
+            Path(self.tempdir.name) / "old",
+        )
+        wheel_path.unlink()
+        conn = db.get_connection()
+        comp_id = db.insert_compatibility(
+            conn,
+            user_id="1",
+            self_profile_id=None,
+            partner_profile_id=None,
+            synastry_json=json.dumps(
+                {
+                    "first_subject": synastry_data.first_subject.model_dump(),
+                    "second_subject": synastry_data.second_subject.model_dump(),
+                }
+            ),
+            score_json=None,
+            top_aspects_json=None,
+            wheel_path=str(wheel_path),
+        )
+        os.environ["WEBAPP_DIST_DIR"] = str(Path(self.tempdir.name) / "dist")
+        try:
+            with patch("astro_bot.chart_engine.get_engine", return_value=chart_engine.ChartEngine(workers=0)):
+                resp = self.client.get(f"/api/compatibility/{comp_id}/wheel.svg")
+        finally:
+            os.environ.pop("WEBAPP_DIST_DIR", None)
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("<svg", resp.text)
+        new_path = Path(db.get_compatibility(conn, comp_id)["wheel_path"])
+        conn.close()
+        self.assertEqual(new_path.parents[2], Path(self.tempdir.name) / "charts")
+        self.assertTrue(new_path.exists())
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,70 @@
+"""Tests for the pooled SQLite access layer of the API."""
+
+from __future__ import annotations
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from astro_api import db
+
+
+class ConnectionPoolTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+
+    def tearDown(self):
+        db.close_pool()
+        self.tempdir.cleanup()
+
+    def test_connections_are_reused_and_tuned(self):
+        pool = db.open_pool()
+        with pool.connection() as conn:
+            first = id(conn)
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            self.assertEqual(conn.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            self.assertIsNotNone(conn.execute("SELECT 1 FROM charts LIMIT 1"))
+        with pool.connection() as conn:
+            self.assertEqual(id(conn), first)
+
+    def test_readers_do_not_wait_for_writer(self):
+        pool = db.open_pool()
+        with pool.connection() as writer, pool.connection() as reader:
+            self.assertIsNot(writer, reader)
+            writer.execute("BEGIN IMMEDIATE")
+            writer.execute("INSERT INTO chat_messages (chart_id, question) VALUES (1, 'q')")
+            # uncommitted write: the reader sees the last committed snapshot without blocking
+            self.assertEqual(reader.execute("SELECT COUNT(*) FROM chat_messages").fetchone()[0], 0)
+            writer.commit()
+            self.assertEqual(reader.execute("SELECT COUNT(*) FROM chat_messages").fetchone()[0], 1)
+
+    def test_open_transaction_is_rolled_back_on_release(self):
+        pool = db.open_pool()
+        with pool.connection() as conn:
+            conn.execute("INSERT INTO chat_messages (chart_id, question) VALUES (1, 'q')")
+        with pool.connection() as conn:
+            self.assertFalse(conn.in_transaction)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM chat_messages").fetchone()[0], 0)
+
+    def test_pool_follows_db_path(self):
+        pool = db.get_pool()
+        db.DB_PATH = Path(self.tempdir.name) / "other.db"
+        self.assertIsNot(db.get_pool(), pool)
+        self.assertTrue(db.DB_PATH.exists())
+
+
+    def test_pool_connects_to_its_own_path(self):
+        path = Path(self.tempdir.name) / "pooled.db"
+        pool = db.ConnectionPool(path, size=1)
+        try:
+            with pool.connection() as first, pool.connection() as second:  # second is opened on demand
+                for conn in (first, second):
+                    self.assertEqual(Path(conn.execute("PRAGMA database_list").fetchone()[2]), path)
+        finally:
+            pool.close()
+        self.assertFalse(db.DB_PATH.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
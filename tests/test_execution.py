@@ -0,0 +1,148 @@
+"""Tests for the execution stages (thread/process offload with bounded queues)."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from astro_api import db, execution
+from astro_api.main import app
+from astro_bot import natal_engine
+
+
+class StageTest(unittest.TestCase):
+    def test_thread_stage_runs_off_the_event_loop(self):
+        stage = execution.Stage("test", mode="thread", workers=1, queue=0)
+
+        async def main():
+            return threading.get_ident(), await stage.run(threading.get_ident)
+
+        try:
+            loop_thread, worker_thread = asyncio.run(main())
+        finally:
+            stage.shutdown()
+        self.assertNotEqual(loop_thread, worker_thread)
+        self.assertEqual(stage.in_flight, 0)
+
+    def test_full_queue_fails_fast(self):
+        stage = execution.Stage("test", mode="thread", workers=1, queue=1)
+        release = threading.Event()
+
+        async def main():
+            busy = [asyncio.ensure_future(stage.run(release.wait)) for _ in range(2)]
+            await asyncio.sleep(0)
+            with self.assertRaises(execution.StageOverloaded) as ctx:
+                await stage.run(release.wait)
+            release.set()
+            await asyncio.gather(*busy)
+            return ctx.exception
+
+        try:
+            exc = asyncio.run(main())
+        finally:
+            release.set()
+            stage.shutdown()
+        self.assertEqual(exc.stage, "test")
+        self.assertGreaterEqual(exc.retry_after, 1)
+        self.assertLessEqual(exc.retry_after, execution.MAX_RETRY_AFTER_SECONDS)
+        self.assertEqual(stage.in_flight, 0)
+
+    def test_cancelled_caller_keeps_counting_until_the_worker_finishes(self):
+        stage = execution.Stage("test", mode="thread", workers=1, queue=0)
+        started, release = threading.Event(), threading.Event()
+
+        def work():
+            started.set()
+            release.wait(5)
+
+        async def main():
+            request = asyncio.ensure_future(stage.run(work))
+            await asyncio.to_thread(started.wait, 5)
+            request.cancel()  # the client went away; the thread is still busy
+            await asyncio.gather(request, return_exceptions=True)
+            with self.assertRaises(execution.StageOverloaded):
+                await stage.run(work)
+            in_flight = stage.in_flight
+            release.set()
+            for _ in range(100):
+                if stage.in_flight == 0:
+                    break
+                await asyncio.sleep(0.01)
+            return in_flight
+
+        try:
+            self.assertEqual(asyncio.run(main()), 1)
+        finally:
+            release.set()
+            stage.shutdown()
+        self.assertEqual(stage.in_flight, 0)
+
+    def test_async_stage_limits_concurrency(self):
+        stage = execution.Stage("test", mode="async", workers=2, queue=10)
+        running = peak = 0
+
+        async def call():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        async def main():
+            await asyncio.gather(*(stage.run(call) for _ in range(6)))
+
+        asyncio.run(main())
+        self.assertEqual(peak, 2)
+
+
+class OverloadApiTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        os.environ.pop("OPENAI_API_KEY", None)
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_overloaded_stage_returns_503_with_retry_after(self):
+        with patch.object(execution.geo, "_in_flight", execution.geo.workers + execution.geo.queue):
+            resp = self.client.get("/api/geo/search?q=Moscow")
+        self.assertEqual(resp.status_code, 503)
+        self.assertGreaterEqual(int(resp.headers["retry-after"]), 1)
+        self.assertEqual(resp.json()["error"]["code"], "overloaded")
+
+    def test_overloaded_calc_is_not_reported_as_calc_error(self):
+        location = natal_engine.LocationResult(query="X", display_name="X", lat=55.75, lng=37.61, tz_str="Europe/Moscow")
+        with patch("astro_api.natal_service.resolve_location", return_value=location), patch.object(
+            execution.db, "_in_flight", execution.db.workers + execution.db.queue
+        ):
+            resp = self.client.post("/api/natal/calc", json={"birth_date": "01.01.2000", "place": "X"})
+        self.assertEqual(resp.status_code, 503)
+        self.assertIn("retry-after", resp.headers)
+
+
+    def test_lookups_before_streams_and_wheels_run_on_the_db_stage(self):
+        requests = (
+            ("post", "/api/ask/stream", {"json": {"chart_id": 1, "question": "?"}}),
+            ("get", "/api/insights/1/stream", {}),
+            ("get", "/api/natal/1/wheel.svg", {}),
+            ("get", "/api/compatibility/1/wheel.svg", {}),
+            ("get", "/api/geo/suggest?q=Mos", {}),
+        )
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "test"}), patch.object(
+            execution.db, "_in_flight", execution.db.workers + execution.db.queue
+        ):
+            for method, url, kwargs in requests:
+                resp = getattr(self.client, method)(url, **kwargs)
+                self.assertEqual(resp.status_code, 503, url)
+
+if __name__ == "__main__":
+    unittest.main()
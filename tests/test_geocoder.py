@@ -0,0 +1,291 @@
+"""Tests for the geocoder: normalized keys, aliases, negative cache, retries, offline gazetteer."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+
+from astro_bot import db as bot_db
+from astro_bot import gazetteer, geocoder, migrations
+from astro_bot.natal_engine import LocationResult, NatalError
+
+
+def _moscow(query: str) -> LocationResult:
+    return LocationResult(
+        query=query, display_name="Москва, Россия", lat=55.7558, lng=37.6173, tz_str="Europe/Moscow"
+    )
+
+
+class GeocoderTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.conn = bot_db.get_connection(Path(self.tempdir.name) / "geo.db")
+        bot_db.init_db(self.conn)
+        env = patch.dict(
+            os.environ,
+            {"OPENCAGE_API_KEY": "test", "ASTRO_BOT_GAZETTEER_PATH": str(Path(self.tempdir.name) / "none.bin")},
+        )
+        env.start()
+        self.addCleanup(env.stop)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tempdir.cleanup()
+
+    def resolve(self, query: str) -> LocationResult:
+        return asyncio.run(geocoder.resolve(self.conn, query))
+
+    def test_normalize_query(self):
+        key = geocoder.normalize_query("москва")
+        for variant in (" Москва ", "МОСКВА", "Москва.", "москва,"):
+            self.assertEqual(geocoder.normalize_query(variant), key)
+        self.assertEqual(geocoder.normalize_query("Королёв"), geocoder.normalize_query("королев"))
+        self.assertEqual(geocoder.normalize_query("Москва ,Россия"), "москва, россия")
+
+    def test_case_variants_share_one_request(self):
+        with patch("astro_bot.geocoder.geocode_opencage", side_effect=lambda q, k: _moscow(q)) as geocode:
+            first = self.resolve("Москва")
+            second = self.resolve("  МОСКВА ")
+            by_name = self.resolve("москва, россия")
+        self.assertEqual(geocode.call_count, 1)
+        self.assertEqual(second.query, "МОСКВА")
+        self.assertEqual({first.display_name, second.display_name, by_name.display_name}, {"Москва, Россия"})
+
+    def test_different_spellings_point_to_one_place(self):
+        with patch("astro_bot.geocoder.geocode_opencage", side_effect=lambda q, k: _moscow(q)):
+            self.resolve("Moscow")
+            self.resolve("Москва")
+        self.assertEqual(self.conn.execute("SELECT COUNT(*) FROM geo_places").fetchone()[0], 1)
+        place_ids = self.conn.execute("SELECT DISTINCT place_id FROM geo_aliases").fetchall()
+        self.assertEqual(len(place_ids), 1)
+
+    def test_not_found_is_cached_until_ttl(self):
+        with patch("astro_bot.geocoder.geocode_opencage", return_value=None) as geocode:
+            for _ in range(2):
+                with self.assertRaises(NatalError):
+                    self.resolve("Нигдешск")
+            self.assertEqual(geocode.call_count, 1)
+            with patch("astro_bot.geocoder.time.time", return_value=geocoder.time.time() + 2 * 86400):
+                with self.assertRaises(NatalError):
+                    self.resolve("Нигдешск")
+            self.assertEqual(geocode.call_count, 2)
+
+    def test_sqlite_and_timezone_work_runs_off_the_event_loop(self):
+        threads = {}
+
+        def record(name, fn):
+            def wrapper(*args, **kwargs):
+                threads[name] = threading.get_ident()
+                return fn(*args, **kwargs)
+
+            return wrapper
+
+        async def run():
+            threads["loop"] = threading.get_ident()
+            return await geocoder.resolve(self.conn, "Москва")
+
+        with patch("astro_bot.geocoder.geocode_opencage", side_effect=lambda q, k: _moscow(q)), patch.object(
+            geocoder, "lookup", record("lookup", geocoder.lookup)
+        ), patch.object(geocoder, "remember", record("remember", geocoder.remember)):
+            asyncio.run(run())
+        self.assertEqual(set(threads), {"loop", "lookup", "remember"})
+        self.assertNotIn(threads["loop"], (threads["lookup"], threads["remember"]))
+
+    def test_missing_api_key(self):
+        with patch.dict(os.environ, {"OPENCAGE_API_KEY": ""}):
+            with self.assertRaises(NatalError):
+                self.resolve("Москва")
+
+    def test_legacy_geo_cache_is_migrated(self):
+        conn = sqlite3.connect(Path(self.tempdir.name) / "legacy.db")
+        conn.execute(
+            "CREATE TABLE geo_cache (id INTEGER PRIMARY KEY AUTOINCREMENT, query TEXT UNIQUE, "
+            "lat REAL, lng REAL, tz_str TEXT, display_name TEXT, created_at TEXT)"
+        )
+        conn.execute(
+            "INSERT INTO geo_cache (query, lat, lng, tz_str, display_name) VALUES (?, ?, ?, ?, ?)",
+            ("Москва", 55.7558, 37.6173, "Europe/Moscow", "Москва, Россия"),
+        )
+        conn.commit()
+        bot_db.init_db(conn)
+        self.assertFalse(
+            conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'geo_cache'").fetchone()
+        )
+        self.assertEqual(migrations.current_version(conn), bot_db.MIGRATIONS[-1].version)
+        place = geocoder.lookup(conn, geocoder.normalize_query("МОСКВА"))
+        conn.close()
+        self.assertEqual(place.tz_str, "Europe/Moscow")
+
+
+FIXTURE = Path(__file__).parent / "fixtures" / "geonames_cities.txt"
+
+
+class GazetteerTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.path = Path(self.tempdir.name) / "gazetteer.bin"
+        self.assertEqual(gazetteer.build(FIXTURE, self.path, geocoder.normalize_query), 9)
+        self.index = gazetteer.Gazetteer(self.path)
+
+    def tearDown(self):
+        self.index.close()
+        for index in gazetteer._opened.values():
+            if index is not None:
+                index.close()
+        gazetteer._opened.clear()
+        self.tempdir.cleanup()
+
+    def test_names_and_alternate_names(self):
+        for query in ("Moscow", "москва", "MOSKVA", "Moskau"):
+            place = self.index.lookup(geocoder.normalize_query(query))
+            self.assertEqual((place.country, place.tz_str), ("RU", "Europe/Moscow"), query)
+        self.assertAlmostEqual(place.lat, 55.75222, places=5)
+        self.assertEqual(self.index.lookup("королев").name, "Королёв")
+        self.assertEqual(self.index.lookup("ленинград").display_name, "Ленинград, RU")
+        self.assertIsNone(self.index.lookup("атлантида"))
+
+    def test_ambiguous_names(self):
+        self.assertEqual(self.index.lookup("париж").country, "FR")
+        self.assertEqual(self.index.lookup("париж, us").tz_str, "America/Chicago")
+        self.assertEqual([p.country for p in self.index.matches("london")], ["GB", "CA"])
+        # not a country: the most populous city with that name
+        self.assertEqual(self.index.lookup("paris, texas").country, "FR")
+        # a named country without such a city goes to the online geocoder
+        self.assertIsNone(self.index.lookup("london, франция"))
+
+    def test_city_and_country_name(self):
+        cases = {
+            "Москва, Россия": ("RU", "Europe/Moscow"),
+            "Moscow, Russia": ("RU", "Europe/Moscow"),
+            "Париж, Франция": ("FR", "Europe/Paris"),
+            "Париж, США": ("US", "America/Chicago"),
+            "London, UK": ("GB", "Europe/London"),
+            "Лондон, Канада": ("CA", "America/Toronto"),
+            "Санкт-Петербург, Ленинградская область, Россия": ("RU", "Europe/Moscow"),
+            "Киев, Украина": ("UA", "Europe/Kyiv"),
+        }
+        for query, expected in cases.items():
+            place = self.index.lookup(geocoder.normalize_query(query))
+            self.assertEqual((place.country, place.tz_str), expected, query)
+
+    def test_prefix(self):
+        keys = [key for key, _ in self.index.prefix("лон", 10)]
+        self.assertEqual(keys, ["лондон", "лондон"])
+        self.assertEqual(len(self.index.prefix("", 3)), 3)
+
+    def test_resolve_uses_gazetteer_without_opencage(self):
+        conn = bot_db.get_connection(Path(self.tempdir.name) / "geo.db")
+        bot_db.init_db(conn)
+        env = {"OPENCAGE_API_KEY": "", "ASTRO_BOT_GAZETTEER_PATH": str(self.path)}
+        try:
+            with patch.dict(os.environ, env), patch("astro_bot.geocoder.geocode_opencage") as geocode:
+                place = asyncio.run(geocoder.resolve(conn, "Новосибирск"))
+        finally:
+            conn.close()
+        geocode.assert_not_called()
+        self.assertEqual((place.query, place.tz_str), ("Новосибирск", "Asia/Novosibirsk"))
+
+    def test_resolve_bot_prompt_format_without_opencage(self):
+        conn = bot_db.get_connection(Path(self.tempdir.name) / "geo.db")
+        bot_db.init_db(conn)
+        env = {"OPENCAGE_API_KEY": "", "ASTRO_BOT_GAZETTEER_PATH": str(self.path)}
+        try:
+            with patch.dict(os.environ, env), patch("astro_bot.geocoder.geocode_opencage") as geocode:
+                # «Город, Страна» — формат из подсказки бота
+                places = [asyncio.run(geocoder.resolve(conn, q)) for q in ("Москва, Россия", "London, UK")]
+        finally:
+            conn.close()
+        geocode.assert_not_called()
+        self.assertEqual([p.tz_str for p in places], ["Europe/Moscow", "Europe/London"])
+
+    def test_rejects_foreign_files(self):
+        bad = Path(self.tempdir.name) / "bad.bin"
+        bad.write_bytes(b"not an index" * 10)
+        with self.assertRaises(gazetteer.GazetteerError):
+            gazetteer.Gazetteer(bad)
+
+    def test_broken_index_falls_back_to_opencage(self):
+        conn = bot_db.get_connection(Path(self.tempdir.name) / "geo.db")
+        bot_db.init_db(conn)
+        truncated = Path(self.tempdir.name) / "truncated.bin"
+        truncated.write_bytes(self.path.read_bytes()[: gazetteer.HEADER.size + 10])
+        empty = Path(self.tempdir.name) / "empty.bin"
+        empty.write_bytes(b"")
+        try:
+            for broken, query in ((truncated, "Новосибирск"), (empty, "Омск")):
+                env = {"OPENCAGE_API_KEY": "test", "ASTRO_BOT_GAZETTEER_PATH": str(broken)}
+                with patch.dict(os.environ, env), patch(
+                    "astro_bot.geocoder.geocode_opencage", return_value=_moscow(query)
+                ) as geocode, self.assertLogs("astro_bot.geocoder", "WARNING"):
+                    place = asyncio.run(geocoder.resolve(conn, query))
+                geocode.assert_awaited_once()
+                self.assertEqual(place.tz_str, "Europe/Moscow")
+        finally:
+            conn.close()
+
+    def test_index_is_opened_once_across_threads(self):
+        opened = []
+        real = gazetteer.Gazetteer
+
+        def slow_open(path):
+            opened.append(path)
+            time.sleep(0.05)
+            return real(path)
+
+        with patch("astro_bot.gazetteer.Gazetteer", side_effect=slow_open):
+            threads = [threading.Thread(target=gazetteer.get_gazetteer, args=(self.path,)) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(opened), 1)
+
+
+class OpenCageRetryTest(unittest.TestCase):
+    def run_with(self, handler):
+        async def main():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                with patch("astro_bot.geocoder._get_client", return_value=client), patch(
+                    "astro_bot.geocoder.asyncio.sleep"
+                ) as sleep:
+                    result = await geocoder.geocode_opencage("Москва", "test")
+                    return result, sleep.await_count
+
+        return asyncio.run(main())
+
+    def test_retries_transient_errors(self):
+        statuses = iter([503, 429])
+
+        def handler(request):
+            status = next(statuses, 200)
+            if status != 200:
+                return httpx.Response(status, headers={"Retry-After": "1"})
+            return httpx.Response(
+                200, json={"results": [{"formatted": "Москва, Россия", "geometry": {"lat": 55.7558, "lng": 37.6173}}]}
+            )
+
+        result, sleeps = self.run_with(handler)
+        self.assertEqual(result.tz_str, "Europe/Moscow")
+        self.assertEqual(sleeps, 2)
+
+    def test_gives_up_after_max_retries(self):
+        with patch.dict(os.environ, {"GEO_MAX_RETRIES": "1"}):
+            with self.assertRaises(NatalError):
+                self.run_with(lambda request: httpx.Response(502))
+
+    def test_empty_results_mean_not_found(self):
+        result, _ = self.run_with(lambda request: httpx.Response(200, json={"results": []}))
+        self.assertIsNone(result)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+"""Tests for ETag / If-None-Match / Cache-Control on chart, wheel and compatibility GETs."""
+
+from __future__ import annotations
+
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from astro_api import db, http_cache
+from astro_api.main import app
+from astro_bot import wheel_store
+
+
+class MatchingEtagTest(unittest.TestCase):
+    def test_weak_comparison_lists_and_star(self):
+        self.assertEqual(http_cache.matching_etag('"a", W/"b"', ['"b"']), '"b"')
+        self.assertEqual(http_cache.matching_etag("*", ['"c"']), '"c"')
+        self.assertIsNone(http_cache.matching_etag('"a"', ['"b"']))
+        self.assertIsNone(http_cache.matching_etag(None, ['"b"']))
+        self.assertNotEqual(http_cache.make_etag("ab", "c"), http_cache.make_etag("a", "bc"))
+
+
+class ConditionalGetTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        os.environ["TELEGRAM_BOT_TOKEN"] = "dummy"
+        os.environ["OPENAI_API_KEY"] = "test"
+
+        self.key = wheel_store.wheel_key("natal", {"lat": 1.0})
+        self.wheel_path = wheel_store.write_svg("<svg></svg>", wheel_store.wheel_path(Path(self.tempdir.name), self.key))
+
+        conn = db.get_connection()
+        db.init_db(conn)
+        self.chart_id = db.insert_chart(
+            conn,
+            profile_id=None,
+            chart_json=json.dumps({"subject": {}, "aspects": []}),
+            wheel_path=str(self.wheel_path),
+            summary="Summary text",
+        )
+        self.comp_id = db.insert_compatibility(
+            conn,
+            user_id="1",
+            self_profile_id=None,
+            partner_profile_id=None,
+            synastry_json=json.dumps({"first_subject": {}, "second_subject": {}}),
+            score_json=None,
+            top_aspects_json=None,
+            wheel_path=str(self.wheel_path),
+        )
+        conn.close()
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_chart_revalidates_without_decoding(self):
+        resp = self.client.get(f"/api/natal/{self.chart_id}")
+        self.assertEqual(resp.status_code, 200)
+        etag = resp.headers["etag"]
+        self.assertEqual(resp.headers["cache-control"], http_cache.REVALIDATE)
+        self.assertEqual(resp.json()["wheel_url"], f"/api/natal/{self.chart_id}/wheel.svg?v={self.key}")
+
+        with patch("astro_api.chart_store.decode_chart") as decode:
+            resp = self.client.get(f"/api/natal/{self.chart_id}", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 304)
+        self.assertEqual(resp.headers["etag"], etag)
+        decode.assert_not_called()
+
+        conn = db.get_connection()
+        job_id = db.insert_job(conn, kind="summary", chart_id=self.chart_id, payload_json=None)
+        db.finish_job(conn, job_id, status=db.JOB_DONE, result="done")
+        conn.close()
+        resp = self.client.get(f"/api/natal/{self.chart_id}", headers={"If-None-Match": etag})
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotEqual(resp.headers["etag"], etag)
+
+    def test_versioned_wheel_is_immutable(self):
+        url = f"/api/natal/{self.chart_id}/wheel.svg"
+        resp = self.client.get(f"{url}?v={self.key}", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["etag"], f'"{self.key}-gzip"')
+        self.assertEqual(resp.headers["cache-control"], http_cache.IMMUTABLE)
+
+        resp = self.client.get(url, headers={"Accept-Encoding": "identity"})
+        self.assertEqual(resp.headers["etag"], f'"{self.key}"')
+        self.assertEqual(resp.headers["cache-control"], http_cache.REVALIDATE)
+
+    def test_wheel_304_does_not_touch_disk(self):
+        self.wheel_path.unlink()
+        for url in (f"/api/natal/{self.chart_id}/wheel.svg", f"/api/compatibility/{self.comp_id}/wheel.svg"):
+            with patch("astro_api.wheels.ensure_natal_wheel") as ensure_natal, patch(
+                "astro_api.wheels.ensure_compatibility_wheel"
+            ) as ensure_compat:
+                resp = self.client.get(f"{url}?v={self.key}", headers={"If-None-Match": f'"{self.key}-br"'})
+            self.assertEqual(resp.status_code, 304)
+            self.assertEqual(resp.headers["cache-control"], http_cache.IMMUTABLE)
+            ensure_natal.assert_not_called()
+            ensure_compat.assert_not_called()
+
+    def test_compatibility_revalidates(self):
+        resp = self.client.get(f"/api/compatibility/{self.comp_id}")
+        self.assertEqual(resp.status_code, 200)
+        with patch("astro_api.chart_store.decode_synastry") as decode:
+            resp = self.client.get(
+                f"/api/compatibility/{self.comp_id}", headers={"If-None-Match": resp.headers["etag"]}
+            )
+        self.assertEqual(resp.status_code, 304)
+        decode.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
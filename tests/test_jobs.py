@@ -0,0 +1,188 @@
+"""Tests for the persisted background job queue."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from astro_api import db, jobs
+from astro_api.main import app
+
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        os.environ["OPENAI_API_KEY"] = "test"
+        self.conn = db.get_connection()
+        db.init_db(self.conn)
+        self.chart_id = db.insert_chart(
+            self.conn,
+            profile_id=1,
+            chart_json=json.dumps({"subject": {}, "aspects": []}),
+            wheel_path=None,
+            summary="Summary text",
+        )
+
+    def tearDown(self):
+        self.conn.close()
+        self.tempdir.cleanup()
+
+    def _drain(self, queue: jobs.JobQueue):
+        async def run():
+            await queue.start()
+            try:
+                for _ in range(200):
+                    statuses = [j["status"] for j in jobs.describe_jobs(self.conn, self.chart_id)]
+                    if statuses and all(s in jobs.FINISHED_STATUSES for s in statuses):
+                        return statuses
+                    await asyncio.sleep(0.01)
+                self.fail("jobs did not finish")
+            finally:
+                await queue.stop()
+
+        return asyncio.run(run())
+
+    def test_chart_jobs_fill_llm_summary_and_insights(self):
+        jobs.enqueue_chart_jobs(self.conn, self.chart_id, "Sun: Aries")
+        jobs.enqueue_chart_jobs(self.conn, self.chart_id, "Sun: Aries")  # no duplicates
+        self.assertEqual(len(jobs.describe_jobs(self.conn, self.chart_id)), 2)
+
+        with patch("astro_bot.openai_client.ask_gpt", return_value="LLM text") as ask:
+            statuses = self._drain(jobs.JobQueue(workers=2))
+        self.assertEqual(statuses, [db.JOB_DONE, db.JOB_DONE])
+        self.assertEqual(ask.call_count, 2)
+        self.assertEqual(db.get_chart(self.conn, self.chart_id)["llm_summary"], "LLM text")
+        self.assertEqual(jobs.latest_result(self.conn, self.chart_id, jobs.KIND_INSIGHTS), "LLM text")
+
+    def test_interrupted_job_is_resumed_after_restart(self):
+        jobs.enqueue(self.conn, jobs.KIND_INSIGHTS, self.chart_id, {"chart_id": self.chart_id, "context_text": "x"})
+        db.claim_next_job(self.conn, owner="crashed", lease_seconds=0)  # died while running, lease ran out
+        with patch("astro_bot.openai_client.ask_gpt", return_value="resumed"):
+            statuses = self._drain(jobs.JobQueue(workers=1))
+        self.assertEqual(statuses, [db.JOB_DONE])
+
+    def test_job_leased_by_live_worker_is_not_rerun(self):
+        job_id = jobs.enqueue(
+            self.conn, jobs.KIND_INSIGHTS, self.chart_id, {"chart_id": self.chart_id, "context_text": "x"}
+        )
+        db.claim_next_job(self.conn, owner="other-process", lease_seconds=60)
+        queue = jobs.JobQueue(workers=1)
+
+        async def run():
+            await queue.start()
+            await asyncio.sleep(0.1)
+            await queue.stop()
+
+        with patch("astro_bot.openai_client.ask_gpt", return_value="twice") as ask:
+            asyncio.run(run())
+        ask.assert_not_called()
+        job = db.get_job(self.conn, job_id)
+        self.assertEqual((job["status"], job["lease_owner"]), (db.JOB_RUNNING, "other-process"))
+        # the live worker can renew and finish; a stranger can't
+        self.assertTrue(db.renew_job_lease(self.conn, job_id, owner="other-process", lease_seconds=60))
+        self.assertFalse(db.finish_job(self.conn, job_id, status=db.JOB_DONE, owner=queue.owner))
+        self.assertTrue(db.finish_job(self.conn, job_id, status=db.JOB_DONE, result="ok", owner="other-process"))
+
+    def test_lease_is_renewed_while_the_handler_runs(self):
+        jobs.enqueue(self.conn, jobs.KIND_INSIGHTS, self.chart_id, {"chart_id": self.chart_id, "context_text": "x"})
+
+        async def slow_answer(*args, **kwargs):
+            await asyncio.sleep(0.3)
+            return "slow"
+
+        with patch("astro_api.jobs.config.get_job_lease_seconds", return_value=0.15), patch("astro_bot.openai_client.ask_gpt", side_effect=slow_answer), patch.object(
+            db, "renew_job_lease", wraps=db.renew_job_lease
+        ) as renew:
+            statuses = self._drain(jobs.JobQueue(workers=1))
+        self.assertEqual(statuses, [db.JOB_DONE])
+        self.assertGreaterEqual(renew.call_count, 2)
+
+    def test_job_queued_from_db_stage_thread_wakes_idle_worker(self):
+        queue = jobs.JobQueue(workers=1)
+
+        async def run():
+            await queue.start()
+            try:
+                await asyncio.sleep(0.05)  # the worker found nothing and is waiting
+                with patch.object(jobs, "queue", queue):
+                    await asyncio.to_thread(jobs.enqueue_chart_jobs, self.conn, self.chart_id, "Sun: Aries")
+                for _ in range(100):
+                    statuses = [j["status"] for j in jobs.describe_jobs(self.conn, self.chart_id)]
+                    if all(s in jobs.FINISHED_STATUSES for s in statuses):
+                        return statuses
+                    await asyncio.sleep(0.01)
+                self.fail("worker was not woken up")
+            finally:
+                await queue.stop()
+
+        # well under POLL_SECONDS: only the wake-up can finish the jobs in time
+        with patch("astro_bot.openai_client.ask_gpt", return_value="LLM text"):
+            self.assertEqual(asyncio.run(run()), [db.JOB_DONE, db.JOB_DONE])
+
+    def test_stop_is_not_lost_when_a_wake_up_races_it(self):
+        async def run():
+            for _ in range(50):
+                queue = jobs.JobQueue(workers=2)
+                await queue.start()
+                await asyncio.sleep(0)
+                await asyncio.to_thread(queue.notify)
+                await asyncio.wait_for(queue.stop(), 2)
+                self.assertFalse(queue.running)
+
+        asyncio.run(run())
+
+    def test_stop_hands_a_running_job_back(self):
+        job_id = jobs.enqueue(
+            self.conn, jobs.KIND_INSIGHTS, self.chart_id, {"chart_id": self.chart_id, "context_text": "x"}
+        )
+        started = asyncio.Event()
+
+        async def hang(*args, **kwargs):
+            started.set()
+            await asyncio.sleep(60)
+
+        async def run():
+            queue = jobs.JobQueue(workers=1)
+            await queue.start()
+            await asyncio.wait_for(started.wait(), 2)
+            await asyncio.wait_for(queue.stop(), 2)
+
+        with patch("astro_bot.openai_client.ask_gpt", side_effect=hang):
+            asyncio.run(run())
+        job = db.get_job(self.conn, job_id)
+        self.assertEqual((job["status"], job["lease_owner"]), (db.JOB_QUEUED, None))
+
+    def test_failing_job_gives_up_after_max_attempts(self):
+        jobs.enqueue(self.conn, jobs.KIND_INSIGHTS, self.chart_id, {"chart_id": self.chart_id, "context_text": "x"})
+        with patch("astro_bot.openai_client.ask_gpt", side_effect=RuntimeError("down")) as ask:
+            statuses = self._drain(jobs.JobQueue(workers=1))
+        self.assertEqual(statuses, [db.JOB_ERROR])
+        self.assertEqual(ask.call_count, jobs.MAX_ATTEMPTS)
+        self.assertEqual(jobs.describe_jobs(self.conn, self.chart_id)[0]["error"], "down")
+
+    def test_api_exposes_jobs_and_reuses_insights_result(self):
+        job_id = jobs.enqueue(self.conn, jobs.KIND_INSIGHTS, self.chart_id, {"chart_id": self.chart_id, "context_text": "x"})
+        db.finish_job(self.conn, job_id, status=db.JOB_DONE, result="ready insights")
+        client = TestClient(app)
+
+        resp = client.get(f"/api/natal/{self.chart_id}/jobs")
+        self.assertEqual(resp.json()["jobs"][0]["status"], db.JOB_DONE)
+
+        stream = client.get(f"/api/natal/{self.chart_id}/jobs/stream")
+        self.assertIn("event: done", stream.text)
+
+        with patch("astro_bot.openai_client.ask_gpt", side_effect=AssertionError("called OpenAI")):
+            resp = client.get(f"/api/insights/{self.chart_id}")
+        self.assertEqual(resp.json()["insights"], "ready insights")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+"""Tests for the OpenAI response cache."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from astro_bot import llm_cache
+
+
+def _payload(prompt: str, temperature: float = 0.7) -> dict:
+    return {
+        "model": "gpt-test",
+        "temperature": temperature,
+        "messages": [{"role": "system", "content": "sys"}, {"role": "user", "content": prompt}],
+    }
+
+
+class LLMCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.cache = llm_cache.LLMCache(Path(self.tempdir.name) / "cache.db")
+
+    def tearDown(self):
+        self.cache.reset()
+        for name in ("OPENAI_CACHE_TTL_SECONDS", "OPENAI_CACHE_MAX_ENTRIES", "OPENAI_CACHE_MEMORY_SIZE"):
+            os.environ.pop(name, None)
+        self.tempdir.cleanup()
+
+    def test_key_covers_model_temperature_and_prompts(self):
+        key = llm_cache.cache_key(_payload("a"))
+        self.assertEqual(key, llm_cache.cache_key(_payload("a")))
+        self.assertNotEqual(key, llm_cache.cache_key(_payload("b")))
+        self.assertNotEqual(key, llm_cache.cache_key(_payload("a", temperature=0.2)))
+        self.assertNotEqual(key, llm_cache.cache_key({**_payload("a"), "model": "other"}))
+
+    def test_expired_entries_are_not_returned(self):
+        os.environ["OPENAI_CACHE_TTL_SECONDS"] = "60"
+        self.cache.put("k", "answer")
+        self.assertEqual(self.cache.get("k"), "answer")
+        with patch("astro_bot.llm_cache.time.time", return_value=10 ** 12):
+            self.assertIsNone(self.cache.get("k"))
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_size_limit_evicts_least_recently_used(self):
+        os.environ["OPENAI_CACHE_MAX_ENTRIES"] = "2"
+        os.environ["OPENAI_CACHE_MEMORY_SIZE"] = "0"
+        with patch("astro_bot.llm_cache.time.time", side_effect=[1.0, 2.0, 3.0, 4.0, 5.0, 6.0]):
+            self.cache.put("a", "A")  # 1
+            self.cache.put("b", "B")  # 2
+            self.assertEqual(self.cache.get("a"), "A")  # 3: a читали позже b
+            self.cache.put("c", "C")  # 4: вытесняет b
+            self.assertIsNone(self.cache.get("b"))  # 5
+            self.assertEqual(self.cache.get("a"), "A")  # 6
+
+
+    def test_hits_do_not_write_until_next_put(self):
+        os.environ["OPENAI_CACHE_MEMORY_SIZE"] = "0"
+        self.cache.put("k", "answer")
+        conn = self.cache._get_conn()
+        changes = conn.total_changes
+        self.assertEqual(self.cache.get("k"), "answer")
+        self.assertEqual(conn.total_changes, changes)
+        self.assertFalse(conn.in_transaction)
+        self.cache.put("other", "x")
+        self.assertEqual(self.cache._touched, {})
+
+    def test_async_access_goes_through_a_thread(self):
+        async def run():
+            with patch("astro_bot.llm_cache.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread:
+                await self.cache.aput("k", "answer")
+                self.assertEqual(await self.cache.aget("k"), "answer")  # память: без потока
+                self.cache._memory.clear()
+                self.assertEqual(await self.cache.aget("k"), "answer")
+            return to_thread.call_count
+
+        self.assertEqual(asyncio.run(run()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+"""Tests for versioned schema migrations."""
+
+from __future__ import annotations
+
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from astro_api import db
+from astro_api.main import app
+from astro_bot import db as bot_db
+from astro_bot import migrations
+
+
+class MigrationsTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+
+    def tearDown(self):
+        db.close_pool()
+        self.tempdir.cleanup()
+
+    def test_fresh_database_gets_latest_version(self):
+        conn = db.get_connection()
+        db.init_db(conn)
+        self.assertEqual(migrations.current_version(conn), db.MIGRATIONS[-1].version)
+        self.assertTrue(migrations.column_exists(conn, "charts", "llm_summary"))
+        db.init_db(conn)  # idempotent
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM schema_version").fetchone()[0], len(db.MIGRATIONS))
+        conn.close()
+
+    def test_legacy_database_is_upgraded(self):
+        conn = sqlite3.connect(db.DB_PATH)
+        conn.execute(
+            "CREATE TABLE charts (id INTEGER PRIMARY KEY AUTOINCREMENT, profile_id INTEGER, chart_json TEXT, wheel_path TEXT)"
+        )
+        conn.execute("INSERT INTO charts (chart_json) VALUES ('{}')")
+        conn.commit()
+        migrations.migrate(conn, db.MIGRATIONS)
+        for column in ("summary", "created_at", "llm_summary"):
+            self.assertTrue(migrations.column_exists(conn, "charts", column))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM charts").fetchone()[0], 1)
+        conn.close()
+
+    def test_failed_step_is_rolled_back(self):
+        def broken(conn):
+            conn.execute("CREATE TABLE half_done (id INTEGER)")
+            raise RuntimeError("boom")
+
+        conn = sqlite3.connect(db.DB_PATH)
+        steps = [
+            migrations.Migration(1, "ok", lambda c: c.execute("CREATE TABLE a (id INTEGER)")),
+            migrations.Migration(2, "broken", broken),
+        ]
+        with self.assertRaises(RuntimeError):
+            migrations.migrate(conn, steps)
+        self.assertEqual(migrations.current_version(conn), 1)
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertNotIn("half_done", tables)
+        conn.close()
+
+    def test_requests_run_no_migrations(self):
+        db.open_pool()
+        client = TestClient(app)
+        with patch("astro_bot.migrations.migrate", side_effect=AssertionError("DDL in request")):
+            self.assertEqual(client.get("/api/charts/recent").status_code, 200)
+            self.assertEqual(client.get("/api/natal/1").status_code, 404)
+
+    def test_bot_database(self):
+        conn = bot_db.get_connection(Path(self.tempdir.name) / "bot.db")
+        bot_db.init_db(conn)
+        self.assertEqual(migrations.current_version(conn), bot_db.MIGRATIONS[-1].version)
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
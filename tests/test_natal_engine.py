@@ -3,7 +3,7 @@ import tempfile
 from pathlib import Path
 import unittest
 
-from astro_bot import natal_engine
+from astro_bot import chart_engine, natal_engine
 
 
 class NatalEngineTest(unittest.TestCase):
@@ -32,6 +32,55 @@ class NatalEngineTest(unittest.TestCase):
             )
             self.assertTrue(res.svg_path.exists())
             self.assertIn("Sun", res.summary)
+            self.assertEqual(res.payload["location"]["display_name"], "Москва, Россия")
+
+    def test_chart_bundle_single_pass(self):
+        location = natal_engine.LocationResult(
+            query="Москва",
+            display_name="Москва",
+            lat=55.75,
+            lng=37.62,
+            tz_str="Europe/Moscow",
+        )
+        bundle = natal_engine.build_chart_bundle("testcase", dt.date(1990, 3, 12), None, location)
+        self.assertIs(bundle.chart_data.subject, bundle.subject)
+        self.assertEqual(len(bundle.payload["aspects"]), len(bundle.aspects))
+        self.assertEqual(bundle.payload["birth_time"], None)
+        self.assertEqual(bundle.payload["location"]["tz_str"], "Europe/Moscow")
+        self.assertIn("Sun", bundle.context_text)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            svg_path = natal_engine.render_svg(bundle.chart_data, Path(tmpdir))
+            self.assertTrue(svg_path.exists())
+
+    def test_chart_engine_pool_and_inline(self):
+        location = natal_engine.LocationResult(
+            query="Москва",
+            display_name="Москва",
+            lat=55.75,
+            lng=37.62,
+            tz_str="Europe/Moscow",
+        )
+        args = ("testcase", dt.date(1990, 3, 12), dt.time(10, 30), location)
+        inline = chart_engine.ChartEngine(workers=0)
+        pool = chart_engine.ChartEngine(workers=1, max_tasks_per_child=1)
+        try:
+            expected = inline.submit(natal_engine.compute_natal, *args).result()
+            first = pool.submit(natal_engine.compute_natal, *args).result(timeout=120)
+            # второй расчёт идёт уже в перезапущенном воркере
+            second = pool.submit(natal_engine.compute_natal, *args).result(timeout=120)
+        finally:
+            pool.shutdown()
+        self.assertIsNone(expected.svg_path)
+        # only plain data crosses the process boundary, not the kerykeion models
+        self.assertEqual(type(first), natal_engine.NatalChart)
+        self.assertEqual(first.payload, expected.payload)
+        self.assertEqual(first.summary, expected.summary)
+        self.assertEqual(second.context_text, expected.context_text)
+
+    def test_chart_engine_inline_propagates_errors(self):
+        engine = chart_engine.ChartEngine(workers=0)
+        with self.assertRaises(natal_engine.NatalError):
+            engine.submit(natal_engine.parse_birth_date, "bad").result()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,205 @@
+"""Tests for the async OpenAI client (mocked transport)."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+
+from astro_bot import backoff, llm_cache, openai_client
+
+
+def _ok(text: str) -> httpx.Response:
+    return httpx.Response(200, json={"choices": [{"message": {"content": f" {text} "}}]})
+
+
+class OpenAIClientTest(unittest.TestCase):
+    def setUp(self):
+        os.environ["OPENAI_API_KEY"] = "test"
+        self.tempdir = tempfile.TemporaryDirectory()
+        os.environ["OPENAI_CACHE_PATH"] = str(Path(self.tempdir.name) / "llm_cache.db")
+        llm_cache.cache.reset()
+        self.breaker = openai_client.CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        self.requests = []
+
+    def tearDown(self):
+        llm_cache.cache.reset()
+        os.environ.pop("OPENAI_CACHE_PATH", None)
+        os.environ.pop("OPENAI_CACHE_TTL_SECONDS", None)
+        self.tempdir.cleanup()
+
+    def _ask(self, responses, question="Вопрос"):
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return responses.pop(0)
+
+        async def run():
+            state = openai_client._LoopState(
+                client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                semaphore=asyncio.Semaphore(2),
+            )
+            with patch.object(openai_client, "_get_state", return_value=state), patch.object(
+                openai_client, "_breaker", self.breaker
+            ), patch.object(backoff, "delay", return_value=0):
+                try:
+                    return await openai_client.ask_gpt(question)
+                finally:
+                    await state.client.aclose()
+
+        return asyncio.run(run())
+
+    def test_retries_transient_errors(self):
+        answer = self._ask([httpx.Response(503), httpx.Response(429), _ok("ответ")])
+        self.assertEqual(answer, "ответ")
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(self.requests[0].headers["authorization"], "Bearer test")
+
+    def test_client_error_not_retried(self):
+        with self.assertRaises(openai_client.OpenAIError):
+            self._ask([httpx.Response(401), _ok("never")])
+        self.assertEqual(len(self.requests), 1)
+
+    def test_breaker_opens_after_consecutive_failures(self):
+        for _ in range(2):
+            with self.assertRaises(openai_client.OpenAIError):
+                self._ask([httpx.Response(500)] * 3)
+        sent = len(self.requests)
+        with self.assertRaises(openai_client.CircuitOpenError):
+            self._ask([_ok("never")])
+        self.assertEqual(len(self.requests), sent)
+
+    def test_client_error_on_half_open_trial_keeps_breaker_open(self):
+        self._half_open()
+        with self.assertRaises(openai_client.OpenAIError):
+            self._ask([httpx.Response(400)])
+        # health is still unknown: not closed, but the next trial may go out
+        self.assertIsNotNone(self.breaker._opened_at)
+        self.assertEqual(self.breaker._failures, 2)
+        self.assertTrue(self.breaker.allow())
+
+    def test_breaker_reads_config_when_first_used(self):
+        self.addCleanup(openai_client.reset_breaker)
+        openai_client.reset_breaker()
+        with patch.dict(os.environ, {"OPENAI_BREAKER_THRESHOLD": "7", "OPENAI_BREAKER_RESET_SECONDS": "12"}):
+            breaker = openai_client.get_breaker()
+        self.assertEqual((breaker.failure_threshold, breaker.reset_timeout), (7, 12.0))
+        self.assertIs(openai_client.get_breaker(), breaker)
+
+    def _half_open(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker._opened_at = time.monotonic() - 61
+
+    def _run_hanging(self, consume):
+        """Run consume() against an OpenAI that never answers (breaker patched in)."""
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            await asyncio.sleep(3600)
+
+        async def run():
+            state = openai_client._LoopState(
+                client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                semaphore=asyncio.Semaphore(2),
+            )
+            with patch.object(openai_client, "_get_state", return_value=state), patch.object(
+                openai_client, "_breaker", self.breaker
+            ):
+                try:
+                    await consume()
+                finally:
+                    await state.client.aclose()
+
+        asyncio.run(run())
+
+    def test_cancelled_half_open_trial_releases_breaker(self):
+        self._half_open()
+
+        async def consume():
+            task = asyncio.ensure_future(openai_client.ask_gpt("Вопрос"))
+            await asyncio.sleep(0.05)
+            self.assertFalse(self.breaker.allow())  # пробная попытка в полёте
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        self._run_hanging(consume)
+        self.assertTrue(self.breaker.allow())
+
+    def test_closed_stream_releases_half_open_trial(self):
+        self._half_open()
+        responses = [httpx.Response(200, text='data: {"choices": [{"delta": {"content": "a"}}]}\n\n' * 3)]
+
+        async def run():
+            state = openai_client._LoopState(
+                client=httpx.AsyncClient(transport=httpx.MockTransport(lambda request: responses.pop(0))),
+                semaphore=asyncio.Semaphore(2),
+            )
+            with patch.object(openai_client, "_get_state", return_value=state), patch.object(
+                openai_client, "_breaker", self.breaker
+            ):
+                stream = openai_client.stream_gpt("Вопрос")
+                self.assertEqual(await stream.__anext__(), "a")
+                await stream.aclose()  # клиент ушёл после первого фрагмента
+                await state.client.aclose()
+
+        asyncio.run(run())
+        self.assertTrue(self.breaker.allow())
+
+    def test_stream_yields_deltas_and_retries_before_first_chunk(self):
+        body = (
+            'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n'
+            'data: {"choices": [{"delta": {"content": "Сол"}}]}\n\n'
+            'data: {"choices": [{"delta": {"content": "нце"}}]}\n\n'
+            "data: [DONE]\n\n"
+        )
+        responses = [httpx.Response(503), httpx.Response(200, text=body)]
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.requests.append(request)
+            return responses.pop(0)
+
+        async def run():
+            state = openai_client._LoopState(
+                client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+                semaphore=asyncio.Semaphore(2),
+            )
+            with patch.object(openai_client, "_get_state", return_value=state), patch.object(
+                openai_client, "_breaker", self.breaker
+            ), patch.object(backoff, "delay", return_value=0):
+                try:
+                    return [delta async for delta in openai_client.stream_gpt("Вопрос")]
+                finally:
+                    await state.client.aclose()
+
+        self.assertEqual(asyncio.run(run()), ["Сол", "нце"])
+        self.assertEqual(len(self.requests), 2)
+        self.assertIn(b'"stream":true', self.requests[-1].content.replace(b" ", b""))
+
+    def test_repeated_prompt_served_from_cache(self):
+        self.assertEqual(self._ask([_ok("ответ")]), "ответ")
+        self.assertEqual(self._ask([]), "ответ")
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(llm_cache.cache.stats()["hits_memory"], 1)
+
+        llm_cache.cache.reset()  # память пуста — ответ берётся из SQLite
+        self.assertEqual(self._ask([]), "ответ")
+        self.assertEqual(llm_cache.cache.stats()["hits_db"], 1)
+
+        self._ask([_ok("другой")], question="Другой вопрос")
+        self.assertEqual(len(self.requests), 2)
+
+    def test_cache_disabled_with_zero_ttl(self):
+        os.environ["OPENAI_CACHE_TTL_SECONDS"] = "0"
+        self._ask([_ok("раз")])
+        self.assertEqual(self._ask([_ok("два")]), "два")
+        self.assertEqual(len(self.requests), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
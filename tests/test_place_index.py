@@ -0,0 +1,88 @@
+"""Tests for the place autocomplete index and /api/geo/suggest."""
+
+from __future__ import annotations
+
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from astro_api import db, place_index
+from astro_api.main import app
+from astro_bot import gazetteer, geocoder
+from astro_bot.natal_engine import LocationResult
+
+FIXTURE = Path(__file__).parent / "fixtures" / "geonames_cities.txt"
+
+
+class PlaceIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        gazetteer_path = Path(self.tempdir.name) / "gazetteer.bin"
+        gazetteer.build(FIXTURE, gazetteer_path, geocoder.normalize_query)
+        env = patch.dict(os.environ, {"ASTRO_BOT_GAZETTEER_PATH": str(gazetteer_path)})
+        env.start()
+        self.addCleanup(env.stop)
+        self.conn = db.get_connection()
+        db.init_db(self.conn)
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        self.conn.close()
+        db.close_pool()
+        for index in gazetteer._opened.values():
+            if index is not None:
+                index.close()
+        gazetteer._opened.clear()
+        self.tempdir.cleanup()
+
+    def remember(self, keys, display_name, lat, lng):
+        location = LocationResult(query=keys[0], display_name=display_name, lat=lat, lng=lng, tz_str="Europe/Moscow")
+        geocoder.remember(self.conn, keys, location)
+
+    def suggest(self, q: str, **params):
+        resp = self.client.get("/api/geo/suggest", params={"q": q, **params})
+        self.assertEqual(resp.status_code, 200)
+        return [item["display_name"] for item in resp.json()["suggestions"]]
+
+    def test_gazetteer_prefix_ranked_by_population(self):
+        self.assertEqual(self.suggest("Лон"), ["Лондон, GB", "Лондон, CA"])
+        self.assertEqual(self.suggest("пари", limit=1), ["Париж, FR"])
+        self.assertEqual(self.suggest("зззз"), [])
+
+    def test_cached_places_are_added_incrementally(self):
+        self.remember(["Мытищи", "Мытищи, Московская область, Россия"], "Мытищи, Московская область, Россия", 55.91, 37.73)
+        self.assertEqual(self.suggest("мыт"), ["Мытищи, Московская область, Россия"])
+        index = place_index.get_index(db.DB_PATH)
+        self.remember(["Мурманск"], "Мурманск, Россия", 68.97, 33.07)
+        self.assertEqual(self.suggest("му"), ["Мурманск, Россия"])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(index.refresh(self.conn), 0)
+
+    def test_cached_place_and_gazetteer_entry_are_merged(self):
+        self.remember(["Москва"], "Москва, Россия", 55.7558, 37.6173)
+        self.assertEqual(self.suggest("моск"), ["Москва, Россия"])
+
+    def test_missing_query(self):
+        resp = self.client.get("/api/geo/suggest")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_suggest_is_fast(self):
+        for i in range(2000):
+            self.remember([f"место {i}"], f"Место {i}", 40 + i / 100, 40 + i / 100)
+        index = place_index.get_index(db.DB_PATH)
+        index.refresh(self.conn)
+        started = time.perf_counter()
+        for _ in range(100):
+            index.refresh(self.conn)
+            self.assertEqual(len(index.suggest("место 1", limit=8)), 8)
+        self.assertLess((time.perf_counter() - started) / 100, 0.005)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+"""Hot queries must be answered from an index, not a full table scan."""
+
+from __future__ import annotations
+
+import re
+import tempfile
+import unittest
+from pathlib import Path
+
+from astro_api import db
+from astro_bot import db as bot_db
+from astro_bot import repositories
+
+# "SCAN charts" is a full scan; "SCAN c USING INDEX ..." / "SEARCH ..." are fine
+FULL_SCAN = re.compile(r"^SCAN \w+$")
+
+
+def query_plan(conn, call) -> list[str]:
+    """Run call(conn) and return EXPLAIN QUERY PLAN details of every SELECT it issued."""
+    statements: list[str] = []
+    conn.set_trace_callback(statements.append)
+    try:
+        call(conn)
+    finally:
+        conn.set_trace_callback(None)
+    details = []
+    for sql in statements:
+        if sql.lstrip().upper().startswith("SELECT"):
+            details.extend(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql))
+    return details
+
+
+class QueryPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        self.conn = db.get_connection()
+        db.init_db(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tempdir.cleanup()
+
+    def assertUsesIndex(self, conn, call, index: str):
+        details = query_plan(conn, call)
+        self.assertTrue(details)
+        self.assertFalse([d for d in details if FULL_SCAN.match(d)], details)
+        self.assertTrue(any(index in d for d in details), details)
+        self.assertFalse([d for d in details if "TEMP B-TREE" in d], details)
+
+    def test_find_profile(self):
+        self.assertUsesIndex(
+            self.conn,
+            lambda c: db.find_profile(
+                c,
+                telegram_user_id=1,
+                birth_date="2000-01-01",
+                birth_time=None,
+                time_unknown=True,
+                place_query="X",
+                lat=1.0,
+                lng=2.0,
+                tz_str="UTC",
+            ),
+            "idx_profiles_lookup",
+        )
+
+    def test_latest_chart_for_profile(self):
+        self.assertUsesIndex(self.conn, lambda c: db.get_latest_chart_for_profile(c, 1), "idx_charts_profile_created")
+
+    def test_recent_charts(self):
+        self.assertUsesIndex(self.conn, lambda c: db.list_recent_charts(c, 3), "idx_charts_created")
+
+    def test_chat_messages(self):
+        self.assertUsesIndex(self.conn, lambda c: db.list_chat_messages(c, chart_id=1), "idx_chat_messages_chart")
+
+    def test_jobs(self):
+        self.assertUsesIndex(self.conn, lambda c: db.list_jobs_for_chart(c, 1), "idx_jobs_chart_kind")
+
+    def test_chart_positions(self):
+        self.assertUsesIndex(
+            self.conn, lambda c: db.count_charts_with_position(c, point="Sun", sign="Ari"), "idx_chart_positions_sign"
+        )
+        self.assertUsesIndex(
+            self.conn, lambda c: db.count_charts_with_position(c, point="Moon", house=7), "idx_chart_positions_house"
+        )
+        self.assertUsesIndex(
+            self.conn, lambda c: db.position_distribution(c, point="Sun"), "idx_chart_positions_sign"
+        )
+        self.assertUsesIndex(
+            self.conn, lambda c: db.position_distribution(c, point="Moon", by="house"), "idx_chart_positions_house"
+        )
+
+    def test_bot_request_history(self):
+        conn = bot_db.get_connection(Path(self.tempdir.name) / "bot.db")
+        bot_db.init_db(conn)
+        try:
+            self.assertUsesIndex(
+                conn, lambda c: repositories.list_requests(c, user_id=1, limit=5), "idx_requests_user_created"
+            )
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,115 @@
+"""Tests for coalescing of identical concurrent calculations and geocodes."""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from astro_api import chart_cache, db, natal_service
+from astro_bot import chart_engine, geocoder, natal_engine
+from astro_bot import db as bot_db
+from astro_bot.single_flight import AsyncSingleFlight
+
+
+MOSCOW = natal_engine.LocationResult(
+    query="Москва",
+    display_name="Москва, Россия",
+    lat=55.7558,
+    lng=37.6173,
+    tz_str="Europe/Moscow",
+)
+
+
+class SingleFlightTest(unittest.TestCase):
+    def test_cancelled_waiter_does_not_cancel_the_shared_task(self):
+        flights = AsyncSingleFlight()
+        calls = []
+
+        async def factory():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "done"
+
+        async def main():
+            first = asyncio.ensure_future(flights.do("k", factory))
+            second = asyncio.ensure_future(flights.do("k", factory))
+            await asyncio.sleep(0)
+            first.cancel()
+            return await second
+
+        self.assertEqual(asyncio.run(main()), "done")
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(flights.in_flight(), 0)
+
+    def test_geocode_of_the_same_place_is_requested_once(self):
+        calls = []
+
+        async def slow_geocode(query, key):
+            calls.append(query)
+            await asyncio.sleep(0.05)
+            return MOSCOW
+
+        async def main(conn):
+            return await asyncio.gather(*(geocoder.resolve(conn, q) for q in ["Москва", "москва", " МОСКВА"]))
+
+        with tempfile.TemporaryDirectory() as tmp:
+            conn = bot_db.get_connection(Path(tmp) / "geo.db")
+            try:
+                bot_db.init_db(conn)
+                with patch.dict(
+                    os.environ, {"OPENCAGE_API_KEY": "test", "ASTRO_BOT_GAZETTEER_PATH": str(Path(tmp) / "none.bin")}
+                ), patch(
+                    "astro_bot.geocoder.geocode_opencage", side_effect=slow_geocode
+                ):
+                    results = asyncio.run(main(conn))
+            finally:
+                conn.close()
+        self.assertEqual(calls, ["Москва"])
+        self.assertEqual({r.display_name for r in results}, {MOSCOW.display_name})
+
+
+class CoalescedCalculationTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        chart_cache.clear_memory()
+
+    def tearDown(self):
+        db.close_pool()
+        chart_cache.clear_memory()
+        self.tempdir.cleanup()
+
+    def test_double_tap_stores_one_profile(self):
+        async def calc(place: str):
+            return await natal_service.calculate_natal_chart(
+                birth_date_str="12.03.1990",
+                birth_time_str="10:30",
+                place_query=place,
+                user_identifier="111",
+                charts_dir=Path(self.tempdir.name) / "charts",
+                telegram_user_id=111,
+            )
+
+        async def main():
+            return await asyncio.gather(calc("Москва"), calc(" Москва "), calc("Москва"))
+
+        with patch("astro_api.natal_service.resolve_location", return_value=MOSCOW) as resolve, patch(
+            "astro_bot.chart_engine.get_engine", return_value=chart_engine.ChartEngine(workers=0)
+        ):
+            results = asyncio.run(main())
+        self.assertEqual(resolve.call_count, 1)
+        self.assertEqual({r["chart_id"] for r in results}, {results[0]["chart_id"]})
+        conn = db.get_connection()
+        try:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0], 1)
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM charts").fetchone()[0], 1)
+        finally:
+            conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
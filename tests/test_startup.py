@@ -0,0 +1,60 @@
+"""Tests for lazy heavy imports, background warm-up and the cold-start benchmark.
+
+Millisecond budgets depend on the machine; they are checked by
+`python -m astro_bot.bench_startup` (a separate CI step), not here.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import io
+import os
+import subprocess
+import sys
+import unittest
+from unittest.mock import patch
+
+from astro_bot import bench_startup, chart_engine, warmup
+
+
+class LazyImportTest(unittest.TestCase):
+    def test_entry_points_do_not_load_heavy_modules(self):
+        code = (
+            "import sys, astro_api.main, astro_bot.bot; "
+            f"heavy = [m for m in {tuple(bench_startup.HEAVY_MODULES)!r} if m in sys.modules]; "
+            "assert not heavy, heavy"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_benchmark_fails_over_budget(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.assertEqual(bench_startup.main(["--repeat", "1", "--budget", "astro_bot.bot=0.001"]), 1)
+        self.assertIn("FAIL astro_bot.bot", out.getvalue())
+
+
+class WarmUpTest(unittest.TestCase):
+    def test_warm_up_loads_dependencies(self):
+        with patch("astro_bot.chart_engine.get_engine", return_value=chart_engine.ChartEngine(workers=0)):
+            seconds = warmup.warm_up()
+        self.assertGreaterEqual(seconds, 0)
+        self.assertIn("kerykeion", sys.modules)
+
+    def test_background_warm_up_can_be_disabled(self):
+        async def main():
+            return warmup.warm_up_in_background()
+
+        with patch.dict(os.environ, {"ASTRO_BOT_WARMUP": "0"}):
+            self.assertIsNone(asyncio.run(main()))
+
+    def test_stopped_warm_up_does_not_restart_the_pool(self):
+        async def main():
+            await warmup.stop_warm_up(warmup.warm_up_in_background())
+
+        with patch.dict(os.environ, {"ASTRO_BOT_WARMUP": "1"}), patch("astro_bot.chart_engine.get_engine") as get_engine:
+            asyncio.run(main())
+        get_engine.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""Tests for lazy timezone lookup and local-to-UTC conversion."""
+
+from __future__ import annotations
+
+import datetime as dt
+import subprocess
+import sys
+import unittest
+from unittest.mock import Mock, patch
+
+from astro_bot import natal_engine, timezones
+
+
+class TimezoneLookupTest(unittest.TestCase):
+    def setUp(self):
+        timezones.clear_caches()
+
+    def test_finder_is_not_built_on_import(self):
+        code = (
+            "import sys; import astro_bot.natal_engine, astro_bot.geocoder; from astro_bot import timezones; "
+            "assert timezones._finder is None; assert 'timezonefinder' not in sys.modules"
+        )
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_lookups_are_cached_by_rounded_coordinates(self):
+        finder = Mock()
+        finder.timezone_at.return_value = "Europe/Moscow"
+        with patch.object(timezones, "_finder", finder):
+            self.assertEqual(timezones.timezone_at(55.75581, 37.61731), "Europe/Moscow")
+            self.assertEqual(timezones.timezone_at(55.755812, 37.617309), "Europe/Moscow")
+        finder.timezone_at.assert_called_once_with(lat=55.7558, lng=37.6173)
+        timezones.clear_caches()
+        self.assertEqual(timezones.timezone_at(55.7558, 37.6173), "Europe/Moscow")
+
+
+class UtcOffsetTest(unittest.TestCase):
+    def setUp(self):
+        timezones.clear_caches()
+
+    def test_regular_day(self):
+        local = dt.datetime(1990, 3, 12, 10, 30)
+        self.assertEqual(timezones.utc_offset("Europe/Moscow", local), dt.timedelta(hours=3))
+        self.assertEqual(timezones.to_utc("Europe/Moscow", local), dt.datetime(1990, 3, 12, 7, 30, tzinfo=dt.timezone.utc))
+        self.assertFalse(timezones.is_dst("Europe/Moscow", local))
+        self.assertTrue(timezones.is_dst("Europe/Berlin", dt.datetime(2021, 7, 1, 12, 0)))
+
+    def test_transition_days(self):
+        ambiguous = dt.datetime(2021, 10, 31, 2, 30)
+        self.assertTrue(timezones.is_dst("Europe/Berlin", ambiguous))
+        self.assertEqual(timezones.to_utc("Europe/Berlin", ambiguous).hour, 0)
+        self.assertEqual(timezones.to_utc("Europe/Berlin", dt.datetime(2021, 10, 31, 12, 0)).hour, 11)
+        self.assertFalse(timezones.is_dst("Europe/Berlin", dt.datetime(2021, 3, 28, 2, 30)))
+        self.assertEqual(timezones.to_utc("Europe/Berlin", dt.datetime(2021, 3, 28, 12, 0)).hour, 10)
+
+    def test_ambiguous_birth_time_builds_a_subject(self):
+        location = natal_engine.LocationResult(
+            query="Berlin", display_name="Berlin", lat=52.52, lng=13.405, tz_str="Europe/Berlin"
+        )
+        subject = natal_engine.build_subject("Test", dt.date(2021, 10, 31), dt.time(2, 30), location)
+        self.assertTrue(subject.iso_formatted_utc_datetime.startswith("2021-10-31T00:30"))
+        skipped = natal_engine.build_subject("Test", dt.date(2021, 3, 28), dt.time(2, 30), location)
+        self.assertEqual(
+            skipped.iso_formatted_utc_datetime,
+            timezones.to_utc("Europe/Berlin", dt.datetime(2021, 3, 28, 2, 30)).isoformat(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+"""Tests for the background SVG janitor (tracked files, age and quota eviction)."""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from astro_api import chart_store, config, db
+from astro_api.main import app
+from astro_bot import chart_engine, natal_engine, wheel_janitor, wheel_store
+from astro_bot import db as bot_db
+
+DAY = 86400
+
+
+class WheelJanitorTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.charts_dir = Path(self.tempdir.name) / "charts"
+        self.db_path = Path(self.tempdir.name) / "bot.db"
+        self.conn = bot_db.get_connection(self.db_path)
+        bot_db.init_db(self.conn)
+
+    def tearDown(self):
+        self.conn.close()
+        self.tempdir.cleanup()
+
+    def wheel(self, name: str, size: int = 1000) -> Path:
+        return wheel_store.write_svg("<svg>" + "x" * size + "</svg>", self.charts_dir / f"{name}.svg")
+
+    def tracked(self):
+        return sorted(Path(row[0]).name for row in self.conn.execute("SELECT path FROM wheel_files"))
+
+    def test_evicts_by_last_access_age(self):
+        now = time.time()
+        old, fresh, touched = self.wheel("old"), self.wheel("fresh"), self.wheel("touched")
+        for path, days in ((old, 10), (fresh, 1), (touched, 10)):
+            self.age(path, days)
+        self.assertEqual(wheel_janitor.scan(self.conn, self.charts_dir), 3)
+        wheel_janitor.touch(touched)
+        wheel_janitor.scan(self.conn, self.charts_dir)
+
+        removed, freed = wheel_janitor.sweep(self.conn, max_age_seconds=7 * DAY, quota_bytes=0, now=now)
+        self.assertEqual(removed, 1)
+        self.assertGreater(freed, 1000)
+        self.assertFalse(old.exists())
+        self.assertFalse(wheel_store.variant_path(old, "gzip").exists())
+        self.assertTrue(fresh.exists() and touched.exists())
+        self.assertEqual(self.tracked(), ["fresh.svg", "touched.svg"])
+
+    def test_evicts_least_recently_used_over_quota(self):
+        now = time.time()
+        paths = [self.wheel(f"w{i}", size=10_000) for i in range(4)]
+        for i, path in enumerate(paths):
+            wheel_janitor.track(self.conn, path, now=now - 100 + i)
+        per_file = self.conn.execute("SELECT bytes FROM wheel_files LIMIT 1").fetchone()[0]
+
+        removed, _ = wheel_janitor.sweep(self.conn, max_age_seconds=0, quota_bytes=int(per_file * 2.5), now=now)
+        self.assertEqual(removed, 2)
+        self.assertEqual([p.exists() for p in paths], [False, False, True, True])
+
+    def test_quota_counts_only_what_was_removed(self):
+        now = time.time()
+        paths = [self.wheel(f"w{i}", size=10_000) for i in range(3)]
+        for i, path in enumerate(paths):
+            wheel_janitor.track(self.conn, path, now=now - 100 + i)
+        per_file = self.conn.execute("SELECT bytes FROM wheel_files LIMIT 1").fetchone()[0]
+        self.serve_during_pass(paths[0])
+
+        removed, freed = wheel_janitor.sweep(self.conn, max_age_seconds=0, quota_bytes=per_file, now=now)
+        # the oldest is in use and stays; the directory still ends up within the quota
+        self.assertEqual((removed, freed), (2, 2 * per_file))
+        self.assertEqual([p.exists() for p in paths], [True, False, False])
+        self.assertEqual(self.tracked(), ["w0.svg"])
+
+    def test_wheel_served_during_the_pass_is_kept(self):
+        now = time.time()
+        served, idle = self.wheel("served"), self.wheel("idle")
+        for path in (served, idle):
+            wheel_janitor.track(self.conn, path, now=now - 10 * DAY)
+        self.serve_during_pass(served)
+        removed, _ = wheel_janitor.sweep(self.conn, max_age_seconds=7 * DAY, quota_bytes=0, now=now)
+        self.assertEqual(removed, 1)
+        self.assertEqual((served.exists(), idle.exists()), (True, False))
+        last_access = self.conn.execute("SELECT last_access FROM wheel_files").fetchone()[0]
+        self.assertGreaterEqual(last_access, now)
+
+    def janitor(self, db_path: Path) -> wheel_janitor.WheelJanitor:
+        janitor = wheel_janitor.WheelJanitor(lambda: bot_db.get_connection(db_path), self.charts_dir)
+        self.addCleanup(janitor._release)
+        return janitor
+
+    def age(self, path: Path, days: float) -> None:
+        os.utime(path, (time.time() - days * DAY, time.time() - days * DAY))
+
+    @staticmethod
+    def serve_during_pass(path: Path) -> None:
+        # what touch() records when the API serves the wheel after the pass has started
+        os.utime(path, (time.time() + 60, path.stat().st_mtime))
+
+    def test_scan_writes_only_changes(self):
+        first, second = self.wheel("first"), self.wheel("second")
+        for path in (first, second):
+            self.age(path, 3)
+        self.assertEqual(wheel_janitor.scan(self.conn, self.charts_dir), 2)
+        changes = self.conn.total_changes
+        self.assertEqual(wheel_janitor.scan(self.conn, self.charts_dir), 0)
+        self.assertEqual(self.conn.total_changes, changes)
+
+        mtime = first.stat().st_mtime
+        wheel_janitor.touch(first)
+        self.assertEqual(first.stat().st_mtime, mtime)  # legacy files keep their stat-based ETag
+        wheel_janitor.scan(self.conn, self.charts_dir)
+        self.assertEqual(self.conn.total_changes, changes + 1)
+        last_access = dict(self.conn.execute("SELECT path, last_access FROM wheel_files"))
+        self.assertGreater(last_access[str(first)], time.time() - 60)
+        self.assertLess(last_access[str(second)], time.time() - DAY)
+
+        second.unlink()  # removed by the other process's janitor
+        wheel_janitor.scan(self.conn, self.charts_dir)
+        self.assertEqual(self.tracked(), ["first.svg"])
+
+    def test_adopts_untracked_files_on_every_pass(self):
+        legacy = self.wheel("legacy")
+        self.age(legacy, 30)
+        janitor = self.janitor(self.db_path)
+        with patch.dict(os.environ, {"ASTRO_BOT_WHEEL_MAX_AGE_DAYS": "7"}):
+            self.assertEqual(janitor.run_once()[0], 1)
+            # rendered by the other process after this one started
+            late = self.wheel("late")
+            self.age(late, 30)
+            self.assertEqual(janitor.run_once()[0], 1)
+        self.assertFalse(legacy.exists() or late.exists())
+
+    def test_shared_charts_dir_is_swept_by_one_process(self):
+        bot_janitor = self.janitor(self.db_path)
+        api_db = Path(self.tempdir.name) / "api.db"
+        api_conn = bot_db.get_connection(api_db)
+        bot_db.init_db(api_conn)
+        api_conn.close()
+        api_janitor = self.janitor(api_db)
+
+        served, idle = self.wheel("served", size=10_000), self.wheel("idle", size=10_000)
+        for path in (served, idle):
+            self.age(path, 1)
+        env = {"ASTRO_BOT_WHEEL_MAX_AGE_DAYS": "0", "ASTRO_BOT_WHEEL_QUOTA_MB": "0"}
+        with patch.dict(os.environ, env):
+            self.assertEqual(bot_janitor.run_once(), (0, 0))
+            self.assertIsNotNone(bot_janitor._lock_file)
+            # the dir is the bot's to sweep: the API's own table stays empty, the quota isn't doubled
+            self.assertEqual(api_janitor.run_once(), (0, 0))
+            self.assertIsNone(api_janitor._lock_file)
+            wheel_janitor.touch(served)  # served by the API process: recorded on the file
+            # room for one wheel: the one the API served recently stays
+            with patch.dict(os.environ, {"ASTRO_BOT_WHEEL_QUOTA_MB": str(15_000 / 1024 / 1024)}):
+                removed, _ = bot_janitor.run_once()
+        self.assertEqual(removed, 1)
+        self.assertEqual((served.exists(), idle.exists()), (True, False))
+        self.assertEqual(self.tracked(), ["served.svg"])
+
+        bot_janitor._release()  # the bot stopped: the API takes over on its next pass
+        with patch.dict(os.environ, env):
+            api_janitor.run_once()
+        self.assertIsNotNone(api_janitor._lock_file)
+
+    def test_background_loop_starts_and_stops(self):
+        janitor = wheel_janitor.WheelJanitor(lambda: bot_db.get_connection(self.db_path), self.charts_dir)
+
+        async def main():
+            janitor.start()
+            await asyncio.sleep(0.1)
+            await janitor.stop()
+
+        with patch.object(janitor, "run_once", return_value=(0, 0)) as run_once:
+            asyncio.run(main())
+        run_once.assert_called()
+
+
+class EvictedWheelTest(unittest.TestCase):
+    """A wheel the janitor removed is re-rendered on the next GET, at the same content-addressed path."""
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        db.DB_PATH = Path(self.tempdir.name) / "test.db"
+        dist = str(Path(self.tempdir.name) / "dist")
+        env = patch.dict(os.environ, {"TELEGRAM_BOT_TOKEN": "dummy", "OPENAI_API_KEY": "test", "WEBAPP_DIST_DIR": dist})
+        env.start()
+        self.addCleanup(env.stop)
+        engine = patch("astro_bot.chart_engine.get_engine", return_value=chart_engine.ChartEngine(workers=0))
+        engine.start()
+        self.addCleanup(engine.stop)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_get_re_renders_evicted_wheel(self):
+        location = natal_engine.LocationResult(
+            query="Москва", display_name="Москва, Россия", lat=55.7558, lng=37.6173, tz_str="Europe/Moscow"
+        )
+        charts_dir = config.get_charts_dir()
+        chart = natal_engine.compute_natal("1", dt.date(1990, 3, 12), dt.time(10, 30), location, charts_dir)
+        payload = json.loads(json.dumps(chart.payload, ensure_ascii=False))
+        conn = db.get_connection()
+        db.init_db(conn)
+        chart_id = db.insert_chart(
+            conn,
+            profile_id=None,
+            chart_json=chart_store.encode_chart(payload),
+            wheel_path=str(chart.svg_path),
+            summary="s",
+        )
+        wheel_janitor.track(conn, chart.svg_path, now=time.time() - 30 * DAY)
+        removed, _ = wheel_janitor.sweep(conn, max_age_seconds=7 * DAY, quota_bytes=0)
+        self.assertEqual(removed, 1)
+        self.assertFalse(chart.svg_path.exists())
+
+        key = wheel_store.key_from_path(chart.svg_path)
+        resp = TestClient(app).get(f"/api/natal/{chart_id}/wheel.svg?v={key}", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.headers["etag"], f'"{key}-gzip"')
+        self.assertIn("<svg", resp.text)
+        self.assertTrue(chart.svg_path.exists())
+        self.assertEqual(db.get_chart(conn, chart_id)["wheel_path"], str(chart.svg_path))
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM wheel_files").fetchone()[0], 1)
+        conn.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
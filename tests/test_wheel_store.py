@@ -0,0 +1,75 @@
+"""Tests for the content-addressed wheel store (keys, sharding, atomic writes, dedup)."""
+
+from __future__ import annotations
+
+import datetime as dt
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import Mock, patch
+
+from astro_api import compatibility_service
+from astro_bot import natal_engine, wheel_store
+
+MOSCOW = natal_engine.LocationResult(
+    query="Москва", display_name="Москва", lat=55.75, lng=37.62, tz_str="Europe/Moscow"
+)
+
+
+class WheelStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.charts_dir = Path(self.tempdir.name)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_paths_are_sharded_by_key(self):
+        key = wheel_store.wheel_key("natal", {"lat": 1.0})
+        self.assertEqual(len(key), 64)
+        path = wheel_store.wheel_path(self.charts_dir, key)
+        self.assertEqual(path.relative_to(self.charts_dir).parts, (key[:2], key[2:4], f"{key}.svg"))
+        self.assertNotEqual(key, wheel_store.wheel_key("natal", {"lat": 1.0}, theme="dark"))
+        self.assertNotEqual(key, wheel_store.wheel_key("synastry", {"lat": 1.0}))
+
+    def test_write_is_atomic_and_complete(self):
+        path = wheel_store.wheel_path(self.charts_dir, "ab" * 32)
+        wheel_store.write_svg("<svg></svg>", path)
+        self.assertEqual(path.read_text(), "<svg></svg>")
+        self.assertTrue(wheel_store.variant_path(path, "gzip").exists())
+        self.assertEqual(list(path.parent.glob("*.tmp")), [])
+
+    def test_ensure_svg_draws_only_once(self):
+        drawer = Mock()
+        drawer.generate_svg_string.return_value = "<svg></svg>"
+        draw = Mock(return_value=drawer)
+        first = wheel_store.ensure_svg(self.charts_dir, "cd" * 32, draw)
+        second = wheel_store.ensure_svg(self.charts_dir, "cd" * 32, draw)
+        self.assertEqual(first, second)
+        draw.assert_called_once()
+
+    def test_same_chart_for_different_users_is_rendered_once(self):
+        args = (dt.date(1990, 3, 12), dt.time(10, 30), MOSCOW, self.charts_dir)
+        with patch.object(wheel_store, "write_svg", wraps=wheel_store.write_svg) as write_svg:
+            first = natal_engine.compute_natal("user-zqx", *args)
+            second = natal_engine.compute_natal("guest", *args)
+            from_payload = natal_engine.render_payload_svg(first.payload, self.charts_dir)
+        self.assertEqual(first.svg_path, second.svg_path)
+        self.assertEqual(from_payload, first.svg_path)
+        self.assertEqual(write_svg.call_count, 1)
+        self.assertNotIn("user-zqx", first.svg_path.read_text())
+
+        other = natal_engine.compute_natal("111", dt.date(1990, 3, 12), dt.time(10, 31), MOSCOW, self.charts_dir)
+        self.assertNotEqual(other.svg_path, first.svg_path)
+
+    def test_synastry_key_includes_drawn_names(self):
+        first = natal_engine.build_subject("self", dt.date(1990, 3, 12), None, MOSCOW)
+        second = natal_engine.build_subject("partner", dt.date(1992, 5, 1), None, MOSCOW)
+        key = compatibility_service.synastry_wheel_key(first, second)
+        self.assertEqual(key, compatibility_service.synastry_wheel_key(first.model_dump(), second.model_dump()))
+        renamed = first.model_copy(update={"name": "42"})
+        self.assertNotEqual(key, compatibility_service.synastry_wheel_key(renamed, second))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -232,15 +232,10 @@ const doPlaceSuggest = debounce(async (query) => {
   placeLoading = true;
   render();
   try {
-    const res = await fetch(`/api/geo/search?q=${encodeURIComponent(query)}`);
+    const res = await fetch(`/api/geo/suggest?q=${encodeURIComponent(query)}`);
     const data = await res.json();
     if (data.ok) {
-      const item = { display_name: data.location.display_name };
-      // Автоподстановка единственного результата без списка
-      form.place = item.display_name;
-      placeSuggestions = [];
-      render();
-      return;
+      placeSuggestions = data.suggestions;
     } else {
       placeSuggestions = [];
     }
@@ -250,7 +245,7 @@ const doPlaceSuggest = debounce(async (query) => {
     placeLoading = false;
     render();
   }
-}, 700);
+}, 150);
 
 const doSelfPlaceSuggest = debounce(async (query) => {
   if (!query || query.length < 2) {
@@ -262,14 +257,10 @@ const doSelfPlaceSuggest = debounce(async (query) => {
   selfPlaceLoading = true;
   render();
   try {
-    const res = await fetch(`/api/geo/search?q=${encodeURIComponent(query)}`);
+    const res = await fetch(`/api/geo/suggest?q=${encodeURIComponent(query)}`);
     const data = await res.json();
     if (data.ok) {
-      const item = { display_name: data.location.display_name };
-      compatForm.self_place = item.display_name;
-      selfPlaceSuggestions = [];
-      render();
-      return;
+      selfPlaceSuggestions = data.suggestions;
     } else {
       selfPlaceSuggestions = [];
     }
@@ -279,7 +270,7 @@ const doSelfPlaceSuggest = debounce(async (query) => {
     selfPlaceLoading = false;
     render();
   }
-}, 700);
+}, 150);
 
 const doPartnerPlaceSuggest = debounce(async (query) => {
   if (!query || query.length < 2) {
@@ -291,14 +282,10 @@ const doPartnerPlaceSuggest = debounce(async (query) => {
   partnerPlaceLoading = true;
   render();
   try {
-    const res = await fetch(`/api/geo/search?q=${encodeURIComponent(query)}`);
+    const res = await fetch(`/api/geo/suggest?q=${encodeURIComponent(query)}`);
     const data = await res.json();
     if (data.ok) {
-      const item = { display_name: data.location.display_name };
-      compatForm.partner_place = item.display_name;
-      partnerPlaceSuggestions = [];
-      render();
-      return;
+      partnerPlaceSuggestions = data.suggestions;
     } else {
       partnerPlaceSuggestions = [];
     }
@@ -308,7 +295,7 @@ const doPartnerPlaceSuggest = debounce(async (query) => {
     partnerPlaceLoading = false;
     render();
   }
-}, 700);
+}, 150);
 
 async function submitForm() {
   error = "";
@@ -348,6 +335,7 @@ async function submitForm() {
     chartDetails = parseChart(data.chart);
     saveLastChart(result, chartDetails, insightsText, chatHistory);
     preloadCompatFromChart(data.chart);
+    watchJobs(data.chart_id);
   } catch (e) {
     error = e.message || "Ошибка запроса";
     debugEvents.push({ type: "error", msg: error, ts: Date.now() });
@@ -357,6 +345,32 @@ async function submitForm() {
   }
 }
 
+function applyJobs(chartId, jobs) {
+  if (!result || result.chart_id !== chartId) return;
+  for (const job of jobs || []) {
+    if (job.status !== "done" || !job.result) continue;
+    if (job.kind === "llm_summary") result.llm_summary = job.result;
+    if (job.kind === "insights" && !insightsText) insightsText = job.result;
+  }
+  saveLastChart(result, chartDetails, insightsText, chatHistory);
+  render();
+}
+
+// LLM summary and insights are generated in background jobs; the server pushes their status over SSE
+function watchJobs(chartId) {
+  if (!chartId || typeof EventSource === "undefined") return;
+  const source = new EventSource(`/api/natal/${chartId}/jobs/stream`);
+  source.addEventListener("jobs", (event) => {
+    try {
+      applyJobs(chartId, JSON.parse(event.data).jobs);
+    } catch {
+      /* ignore */
+    }
+  });
+  source.addEventListener("done", () => source.close());
+  source.onerror = () => source.close();
+}
+
 async function fetchInsights() {
   if (!result?.chart_id) {
     showToast("Сначала рассчитайте карту");